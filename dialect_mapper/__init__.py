@@ -1,4 +1,14 @@
-from .mapper import mapper_methods
-from .plotter import plotter_methods
+from .mapper import mapper_methods, dialect_resolution
 
-name = "dialect_mapper"
\ No newline at end of file
+name = "dialect_mapper"
+
+def __getattr__(attr):
+    # plotter_methods pulls in matplotlib and shapely, which take a long time to import and aren't
+    # needed just to map dialects, so the plotter is only imported the first time it's asked for
+    if attr == 'plotter_methods':
+        from .plotter import plotter_methods
+        return plotter_methods
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, attr))
+
+def __dir__():
+    return sorted(list(globals()) + ['plotter_methods'])
@@ -0,0 +1,119 @@
+"""
+Methods for adding dialects to Apache Arrow data (e.g. manifests read from Parquet with pyarrow)
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .mapper import mapper_methods
+
+class arrow_annotator:
+    '''
+    Maps arrow arrays of place names to dictionary encoded arrays of dialects.
+
+    Every chunk is dictionary encoded first so only the distinct places in the chunk are turned
+    into Python strings and looked up. The per-row work (mapping a row's place to its dialect)
+    is an arrow take(). Places are cached across chunks so each one is only resolved once, which
+    means a dataset larger than memory can be annotated one batch at a time with the same annotator.
+    '''
+    def __init__(self, mapper=None, outputs=('named', 'numeric', 'card4', 'card5'), resolve_ambigious='new', separator='|') -> None:
+        """
+        Args:
+            mapper (mapper_methods, optional): The mapper (with any corrections enabled) to use. A new one is created if None.
+            outputs (tuple, optional): Any of 'named', 'numeric', 'card4', and 'card5'. Defaults to all of them.
+            resolve_ambigious (str, optional): Whether to use the 'new' or 'old' municipality if a name is ambigious. Defaults to 'new'.
+            separator (str, optional): Joins the dialects of places that map to more than one (e.g. 'Agder'). Defaults to '|'.
+        """
+        self.mapper = mapper if mapper is not None else mapper_methods()
+        for output in outputs:
+            if output not in self.mapper.dataframe_outputs:
+                raise Exception('Unknown output {}. Please use one or more of {}'.format(output, list(self.mapper.dataframe_outputs)))
+        self.outputs = list(outputs)
+        self.resolve_ambigious = resolve_ambigious
+        self.separator = separator
+        self._resolved = {}
+        # the dictionary of each output grows as new labels are seen, codes never change
+        self._labels = {output: [] for output in self.outputs}
+        self._label_codes = {output: {} for output in self.outputs}
+
+    def _resolve(self, place):
+        # cached and quiet version of mapper_methods.resolve()
+        if not isinstance(place, str):
+            return None
+        key = self.mapper._key(place)
+        if key not in self._resolved:
+            tier = self.mapper._resolve_tier(place, self.resolve_ambigious)
+            self._resolved[key] = None if tier is None else self.mapper._format_resolution(*tier)
+        return self._resolved[key]
+
+    def _label_code(self, output: str, dialects):
+        if isinstance(dialects, list):
+            dialects = self.separator.join(dialects)
+        label_codes = self._label_codes[output]
+        if dialects not in label_codes:
+            label_codes[dialects] = len(self._labels[output])
+            self._labels[output].append(dialects)
+        return label_codes[dialects]
+
+    def _annotate_array(self, places: pa.Array) -> dict:
+        if pa.types.is_dictionary(places.type):
+            encoded = places
+        else:
+            encoded = pc.dictionary_encode(places)
+        resolutions = [self._resolve(place) for place in encoded.dictionary.to_pylist()]
+        annotated = {}
+        for output in self.outputs:
+            dialect_column = self.mapper.dataframe_outputs[output]
+            codes = pa.array(
+                [None if resolution is None else self._label_code(output, getattr(resolution, dialect_column)) for resolution in resolutions],
+                type=pa.int32()
+            )
+            # null places and places we can't find both come out as null
+            annotated[dialect_column] = pa.DictionaryArray.from_arrays(
+                pc.take(codes, encoded.indices),
+                pa.array(self._labels[output], type=pa.string())
+            )
+        return annotated
+
+    def annotate(self, places) -> dict:
+        """ Map an array of place names to dialects
+
+        Args:
+            places (pa.Array or pa.ChunkedArray): (Large)String or Dictionary array(s) of place names
+
+        Returns:
+            dict: named_dialect/numeric_dialect/cardinal_four/cardinal_five to dictionary encoded arrays,
+                chunked the same way as the input
+        """
+        if isinstance(places, pa.ChunkedArray):
+            chunks = [self._annotate_array(chunk) for chunk in places.chunks]
+            return {
+                self.mapper.dataframe_outputs[output]: pa.chunked_array(
+                    [chunk[self.mapper.dataframe_outputs[output]] for chunk in chunks],
+                    type=pa.dictionary(pa.int32(), pa.string())
+                )
+                for output in self.outputs
+            }
+        return self._annotate_array(places)
+
+    def annotate_table(self, table, column: str):
+        """ Add dialect columns to a pyarrow Table or RecordBatch
+
+        Args:
+            table (pa.Table or pa.RecordBatch): The data to annotate
+            column (str): The column holding the place names
+
+        Returns:
+            pa.Table or pa.RecordBatch: A new table/batch with the dialect columns appended
+        """
+        annotated = self.annotate(table.column(column))
+        names = table.schema.names + list(annotated)
+        if isinstance(table, pa.RecordBatch):
+            return pa.RecordBatch.from_arrays(table.columns + list(annotated.values()), names=names)
+        return pa.Table.from_arrays(table.columns + list(annotated.values()), names=names)
+
+def map_arrow(places, mapper=None, outputs=('named', 'numeric', 'card4', 'card5'), resolve_ambigious='new', separator='|') -> dict:
+    """ One off version of arrow_annotator.annotate(). Use an arrow_annotator directly when annotating
+        many batches so each place is only resolved once
+    """
+    return arrow_annotator(mapper, outputs, resolve_ambigious, separator).annotate(places)
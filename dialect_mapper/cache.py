@@ -0,0 +1,61 @@
+"""
+A bounded LRU cache for the answers of mapper_methods.get_named_dialect() and friends
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+# counters for sizing the cache. invalidations counts how often it was emptied because the corrections
+# or the dialect collapse were switched on/off
+cache_info = namedtuple('cache_info', ['hits', 'misses', 'evictions', 'invalidations', 'maxsize', 'currsize'])
+
+# returned by get() when a key isn't cached (None is a valid, cached, answer)
+missing = object()
+
+class resolution_cache:
+    '''
+    Least recently used cache holding at most maxsize answers. A maxsize of 0 turns it off
+    '''
+    def __init__(self, maxsize=4096) -> None:
+        if maxsize < 0:
+            raise Exception('The cache size must be 0 (off) or more, not {}'.format(maxsize))
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_counters()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return missing
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        if self.maxsize == 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+
+    def info(self) -> cache_info:
+        return cache_info(self.hits, self.misses, self.evictions, self.invalidations, self.maxsize, len(self._entries))
+
+    def reset_counters(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
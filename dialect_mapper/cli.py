@@ -0,0 +1,341 @@
+"""
+Command line interface to the mapper, e.g.
+
+    dialect-mapper annotate speakers.csv --column birthplace --corrections npsc -o speakers_with_dialects.csv
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from . import misses
+from . import tables
+from .mapper import mapper_methods
+
+correction_sets = ['nbtale', 'npsc', 'stortinget', 'ndc']
+
+def build_mapper(corrections=(), collapse=False, correction_files=(), fuzzy=False, miss_mode='silent') -> mapper_methods:
+    # a mapper_methods with the named correction sets (see correction_sets) enabled
+    # correction_files (two column CSVs) are registered under their path and applied after the named sets
+    mm = mapper_methods()
+    mm.set_miss_mode(miss_mode)
+    for correction_set in corrections:
+        if correction_set not in correction_sets:
+            raise Exception('Unknown correction set {}. Please use one or more of {}'.format(correction_set, correction_sets))
+        getattr(mm, 'enable_{}_corrections'.format(correction_set))()
+    for correction_file in correction_files:
+        if correction_file not in tables.correction_priorities:
+            tables.register_corrections(correction_file, correction_file)
+        mm.enable_corrections(correction_file)
+    if collapse:
+        mm.enable_fine_grained_dialect_collapse()
+    if fuzzy:
+        mm.enable_fuzzy_matching()
+    return mm
+
+class row_annotator:
+    '''
+    Adds dialect fields to rows (dicts) read from a metadata file. The dialects of each distinct
+    place are only looked up once and places that can't be found are left empty (None) and
+    passed on to the mapper's miss collector (see misses.py) with their row number
+    '''
+    def __init__(self, mapper: mapper_methods, column: str, outputs=('named', 'numeric', 'card4', 'card5'), resolve_ambigious='new') -> None:
+        for output in outputs:
+            if output not in mapper.dataframe_outputs:
+                raise Exception('Unknown output {}. Please use one or more of {}'.format(output, list(mapper.dataframe_outputs)))
+        self.mapper = mapper
+        self.column = column
+        self.dialect_columns = [mapper.dataframe_outputs[output] for output in outputs]
+        self.resolve_ambigious = resolve_ambigious
+        self.rows = 0
+        self.unresolved_rows = 0
+        self._resolved = {}
+
+    def dialects(self, place) -> dict:
+        # CSV has no nulls so blank places are treated as missing too
+        if not isinstance(place, str) or place.strip() == '':
+            return dict.fromkeys(self.dialect_columns)
+        key = self.mapper._key(place)
+        if key not in self._resolved:
+            tier = self.mapper._resolve_tier(place, self.resolve_ambigious)
+            if tier is None:
+                self._resolved[key] = dict.fromkeys(self.dialect_columns)
+            else:
+                resolution = self.mapper._format_resolution(*tier)
+                self._resolved[key] = {dialect_column: getattr(resolution, dialect_column) for dialect_column in self.dialect_columns}
+        # every row gets its own copy (of list answers too) so changing one row doesn't change the others
+        return {dialect_column: list(value) if isinstance(value, list) else value for dialect_column, value in self._resolved[key].items()}
+
+    def annotate(self, row: dict) -> dict:
+        place = row.get(self.column)
+        dialects = self.dialects(place)
+        self.rows += 1
+        if self.dialect_columns and dialects[self.dialect_columns[0]] is None:
+            self.unresolved_rows += 1
+            if isinstance(place, str) and place.strip() != '':
+                self.mapper.misses.record(
+                    misses.NOT_FOUND, place, 'ERROR: cannot find dialect for: {}'.format(place), {'column': self.column, 'row': self.rows}
+                )
+        row.update(dialects)
+        return row
+
+    def summary(self) -> str:
+        return 'annotated {} rows ({} distinct places, {} rows without a dialect)'.format(
+            self.rows, len(self._resolved), self.unresolved_rows
+        )
+
+def annotate_csv(in_f, out_f, annotator: row_annotator, separator='|', fieldnames=None) -> None:
+    # stream a CSV file, places with more than one dialect have them joined by separator
+    # if fieldnames is given the input has no header (e.g. a shard) and no header is written
+    reader = csv.DictReader(in_f, fieldnames=fieldnames)
+    if reader.fieldnames is None:
+        return
+    if annotator.column not in reader.fieldnames:
+        raise Exception('Column {} is not in the CSV header {}'.format(annotator.column, reader.fieldnames))
+    output_fieldnames = list(reader.fieldnames) + [c for c in annotator.dialect_columns if c not in reader.fieldnames]
+    writer = csv.DictWriter(out_f, fieldnames=output_fieldnames, lineterminator='\n')
+    if fieldnames is None:
+        writer.writeheader()
+    for row in reader:
+        annotator.annotate(row)
+        for dialect_column in annotator.dialect_columns:
+            if isinstance(row[dialect_column], list):
+                row[dialect_column] = separator.join(row[dialect_column])
+        writer.writerow(row)
+
+def annotate_jsonl(in_f, out_f, annotator: row_annotator) -> None:
+    # stream a JSON lines file, places with more than one dialect get a list and unknown places null
+    for line in in_f:
+        if not line.strip():
+            continue
+        out_f.write(json.dumps(annotator.annotate(json.loads(line)), ensure_ascii=False) + '\n')
+
+# ----------------- Parallel (sharded) annotation -----------------
+# Big files are split into byte ranges that start and end on line boundaries. Each shard is annotated
+# by a worker process into its own temporary file and the shards are then concatenated in order.
+# NB: this means CSV fields containing newlines are not supported in parallel mode
+
+_worker_annotator = None
+
+def _init_worker(corrections, collapse, correction_files, fuzzy, miss_mode, column, outputs, resolve_ambigious) -> None:
+    # load the mapping table (and corrections) once per worker process rather than once per shard
+    global _worker_annotator
+    _worker_annotator = row_annotator(build_mapper(corrections, collapse, correction_files, fuzzy, miss_mode), column, outputs=outputs, resolve_ambigious=resolve_ambigious)
+
+def _shard_lines(path: str, start: int, end: int):
+    # the lines starting in [start, end)
+    with open(path, 'rb') as in_f:
+        in_f.seek(start)
+        position = start
+        while position < end:
+            line = in_f.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line.decode('utf-8')
+
+def shard_offsets(path: str, n_shards: int, start=0) -> list:
+    # split [start, end of file) into about n_shards byte ranges that begin at the start of a line
+    size = os.path.getsize(path)
+    offsets = [start]
+    with open(path, 'rb') as in_f:
+        for shard in range(1, n_shards):
+            in_f.seek(max(start + (size - start) * shard // n_shards, offsets[-1]))
+            if in_f.tell() > start:
+                # move on to the start of the next line
+                in_f.seek(in_f.tell() - 1)
+                in_f.readline()
+            if in_f.tell() > offsets[-1] and in_f.tell() < size:
+                offsets.append(in_f.tell())
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+def _annotate_shard(path, start, end, file_format, fieldnames, separator, shard_path) -> tuple:
+    annotator = _worker_annotator
+    annotator.mapper.misses.clear()
+    rows, unresolved_rows = annotator.rows, annotator.unresolved_rows
+    shard_start = time.perf_counter()
+    with open(shard_path, 'w', newline='', encoding='utf-8') as out_f:
+        if file_format == 'jsonl':
+            annotate_jsonl(_shard_lines(path, start, end), out_f, annotator)
+        else:
+            annotate_csv(_shard_lines(path, start, end), out_f, annotator, separator=separator, fieldnames=fieldnames)
+    # the misses, with row numbers counted from the start of the shard
+    shard_misses = [_shift_row(record, -rows) for record in annotator.mapper.misses.records]
+    return annotator.rows - rows, annotator.unresolved_rows - unresolved_rows, time.perf_counter() - shard_start, shard_misses
+
+def _shift_row(record: misses.miss_record, rows: int) -> misses.miss_record:
+    if 'row' not in record.context:
+        return record
+    return record._replace(context={**record.context, 'row': record.context['row'] + rows})
+
+def annotate_parallel(path, out_f, file_format, column, workers, corrections=(), collapse=False, correction_files=(), fuzzy=False,
+                      outputs=('named', 'numeric', 'card4', 'card5'), resolve_ambigious='new', separator='|', shards_per_worker=4,
+                      collect_misses=False) -> dict:
+    """ Annotate a (large) CSV or JSONL file using a pool of worker processes
+
+    Args:
+        path (str): The file to annotate. It has to be a real (seekable) file
+        out_f (file): Where the annotated file is written, in the same order as the input
+        file_format (str): 'csv' or 'jsonl'
+        column (str): The column/field holding the place names
+        workers (int): The number of worker processes
+        shards_per_worker (int, optional): More shards than workers keeps all of the workers busy. Defaults to 4.
+        collect_misses (bool, optional): Whether to collect the places that can't be found (see misses.py). Defaults to False.
+        (the other arguments are the same as for build_mapper(), row_annotator(), and annotate_csv())
+
+    Returns:
+        dict: rows, unresolved_rows, workers, seconds, rows_per_second, rows_per_second_per_worker, and misses (a miss_collector)
+    """
+    collected_misses = misses.miss_collector('collect')
+    wall_start = time.perf_counter()
+    fieldnames = None
+    data_start = 0
+    if file_format == 'csv':
+        with open(path, newline='', encoding='utf-8') as in_f:
+            header = in_f.readline()
+        fieldnames = next(csv.reader([header]), None)
+        if fieldnames is None:
+            return {'rows': 0, 'unresolved_rows': 0, 'workers': workers, 'seconds': 0.0, 'rows_per_second': 0.0, 'rows_per_second_per_worker': 0.0, 'misses': collected_misses}
+        if column not in fieldnames:
+            raise Exception('Column {} is not in the CSV header {}'.format(column, fieldnames))
+        data_start = len(header.encode('utf-8'))
+        output_fieldnames = fieldnames + [mapper_methods.dataframe_outputs[o] for o in outputs if mapper_methods.dataframe_outputs[o] not in fieldnames]
+        csv.writer(out_f, lineterminator='\n').writerow(output_fieldnames)
+
+    rows = 0
+    unresolved_rows = 0
+    worker_seconds = 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(list(corrections), collapse, list(correction_files), fuzzy, 'collect' if collect_misses else 'silent', column, list(outputs), resolve_ambigious)
+        ) as executor:
+            shards = []
+            for shard_index, (start, end) in enumerate(shard_offsets(path, workers * shards_per_worker, start=data_start)):
+                shard_path = os.path.join(tmp_dir, 'shard_{}'.format(shard_index))
+                shards.append((shard_path, executor.submit(_annotate_shard, path, start, end, file_format, fieldnames, separator, shard_path)))
+            # merge in input order, deleting each shard as soon as it has been copied
+            for shard_path, future in shards:
+                shard_rows, shard_unresolved_rows, shard_seconds, shard_misses = future.result()
+                # merging in input order keeps the first seen context of each miss
+                collected_misses.merge([_shift_row(record, rows) for record in shard_misses])
+                rows += shard_rows
+                unresolved_rows += shard_unresolved_rows
+                worker_seconds += shard_seconds
+                with open(shard_path, newline='', encoding='utf-8') as shard_f:
+                    shutil.copyfileobj(shard_f, out_f)
+                os.remove(shard_path)
+    seconds = time.perf_counter() - wall_start
+    return {
+        'rows': rows,
+        'unresolved_rows': unresolved_rows,
+        'workers': workers,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else 0.0,
+        'rows_per_second_per_worker': rows / worker_seconds if worker_seconds > 0 else 0.0,
+        'misses': collected_misses
+    }
+
+def _detect_format(path: str) -> str:
+    if path.endswith('.jsonl') or path.endswith('.ndjson'):
+        return 'jsonl'
+    if path.endswith('.json'):
+        # usually a single JSON document (e.g. an array), which can't be annotated line by line
+        raise Exception('{} looks like a JSON file but only JSON lines (one object per line) can be annotated. Use --format jsonl if it is JSON lines'.format(path))
+    return 'csv'
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='dialect-mapper', description='Map Norwegian municipalities and counties to dialects')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    annotate = subparsers.add_parser('annotate', help='add dialect columns to a CSV or JSONL metadata file')
+    annotate.add_argument('input', help="CSV or JSONL file to annotate ('-' for stdin)")
+    annotate.add_argument('-o', '--output', default='-', help="where to write the annotated file (default: stdout)")
+    annotate.add_argument('-c', '--column', required=True, help='name of the column/field holding the place names')
+    annotate.add_argument('--format', choices=['csv', 'jsonl'], help='input/output format (default: guessed from the input file extension)')
+    annotate.add_argument('--corrections', nargs='+', default=[], choices=correction_sets, help='correction sets to enable')
+    annotate.add_argument('--corrections-file', nargs='+', default=[], help='your own corrections (CSV files of wrong name,right name) applied after --corrections')
+    annotate.add_argument('--outputs', nargs='+', default=['named', 'numeric', 'card4', 'card5'], choices=list(mapper_methods.dataframe_outputs), help='dialects to add')
+    annotate.add_argument('--resolve-ambigious', default='new', choices=['new', 'old'], help='how to resolve ambigious municipalities')
+    annotate.add_argument('--collapse', action='store_true', help='collapse the fine grained dialects (see enable_fine_grained_dialect_collapse)')
+    annotate.add_argument('--fuzzy', action='store_true', help='match misspelled places to the closest municipality/county (see enable_fuzzy_matching)')
+    annotate.add_argument('--separator', default='|', help='joins the dialects of places with more than one in CSV output')
+    annotate.add_argument('-w', '--workers', type=int, default=1, help='annotate with this many processes (input must be a file; CSV fields must not contain newlines)')
+    annotate.add_argument('--misses', help='write the places that could not be found (with counts and the first row they were seen on) to this CSV file')
+    annotate.add_argument('-q', '--quiet', action='store_true', help="don't print a summary to stderr")
+
+    subparsers.add_parser('build-snapshot', help='rebuild the pre-parsed mapping data snapshot shipped in mapping_data')
+    return parser
+
+def annotate_command(args) -> None:
+    file_format = args.format or _detect_format(args.input)
+    if args.workers > 1:
+        if args.input == '-':
+            raise Exception('--workers needs an input file, not stdin')
+        out_f = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+        try:
+            stats = annotate_parallel(
+                args.input, out_f, file_format, args.column, args.workers,
+                corrections=args.corrections, collapse=args.collapse, correction_files=args.corrections_file, fuzzy=args.fuzzy, outputs=args.outputs,
+                resolve_ambigious=args.resolve_ambigious, separator=args.separator, collect_misses=args.misses is not None
+            )
+        finally:
+            if out_f is not sys.stdout:
+                out_f.close()
+        if not args.quiet:
+            print(
+                'annotated {} rows ({} rows without a dialect) in {:.2f}s with {} workers: {:.0f} rows/s in total, {:.0f} rows/s per worker'.format(
+                    stats['rows'], stats['unresolved_rows'], stats['seconds'], stats['workers'], stats['rows_per_second'], stats['rows_per_second_per_worker']
+                ),
+                file=sys.stderr
+            )
+        _write_misses(args, stats['misses'])
+        return
+    annotator = row_annotator(
+        build_mapper(args.corrections, args.collapse, args.corrections_file, args.fuzzy, 'silent' if args.misses is None else 'collect'),
+        args.column,
+        outputs=args.outputs,
+        resolve_ambigious=args.resolve_ambigious
+    )
+    in_f = sys.stdin if args.input == '-' else open(args.input, newline='', encoding='utf-8')
+    out_f = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        if file_format == 'jsonl':
+            annotate_jsonl(in_f, out_f, annotator)
+        else:
+            annotate_csv(in_f, out_f, annotator, separator=args.separator)
+    finally:
+        if in_f is not sys.stdin:
+            in_f.close()
+        if out_f is not sys.stdout:
+            out_f.close()
+    if not args.quiet:
+        print(annotator.summary(), file=sys.stderr)
+    _write_misses(args, annotator.mapper.misses)
+
+def _write_misses(args, collected_misses: misses.miss_collector) -> None:
+    if args.misses is None:
+        return
+    with open(args.misses, 'w', newline='', encoding='utf-8') as misses_f:
+        collected_misses.to_csv(misses_f)
+    if not args.quiet:
+        print('wrote {} places that could not be found to {}'.format(len(collected_misses), args.misses), file=sys.stderr)
+
+def main(argv=None) -> None:
+    args = _parser().parse_args(argv)
+    if args.command == 'annotate':
+        annotate_command(args)
+    elif args.command == 'build-snapshot':
+        from .snapshot import build_snapshot
+        print('wrote {}'.format(build_snapshot()))
+
+if __name__ == '__main__':
+    main()
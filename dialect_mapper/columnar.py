@@ -0,0 +1,79 @@
+"""
+A columnar, integer coded copy of the mapping table
+"""
+
+import sys
+
+import numpy as np
+
+# codes used when a value isn't in a column's vocabulary or a place maps to more than one dialect
+# they are negative so that, with the two sentinels appended to the end of a code map, a single
+# numpy take() passes them through unchanged (see mapper_methods.get_dialect_codes)
+UNKNOWN_CODE = -1
+MULTIPLE_CODE = -2
+
+# Pickling a numpy array records the module path of numpy's internals, which moved in NumPy 2 (numpy._core), so an
+# array pickled under NumPy 2 can't be unpickled under NumPy 1. The pickled tables (see snapshot.py) store their
+# arrays as (dtype, bytes) instead and rebuild them (read-only) when they're unpickled
+def array_state(array: np.ndarray) -> tuple:
+    return (array.dtype.str, np.ascontiguousarray(array).tobytes())
+
+def array_from_state(state: tuple) -> np.ndarray:
+    dtype, data = state
+    return np.frombuffer(data, dtype=np.dtype(dtype))
+
+class columnar_table:
+    '''
+    Stores every column of the mapping CSV as a sorted vocabulary of (interned) strings plus a
+    numpy array holding, for every row, the position of the row's value in that vocabulary.
+    '''
+    def __init__(self, headers: list, rows: list) -> None:
+        vocabularies = {}
+        codes = {}
+        for column_index, column in enumerate(headers):
+            values = [sys.intern(row[column_index]) for row in rows]
+            vocabularies[column] = tuple(sorted(set(values)))
+            value_to_code = {value: code for code, value in enumerate(vocabularies[column])}
+            codes[column] = np.array([value_to_code[value] for value in values], dtype=np.int32)
+        self._set_columns(headers, vocabularies, codes)
+
+    @classmethod
+    def from_codes(cls, headers: list, vocabularies: dict, codes: dict):
+        # e.g. for code arrays that are memory mapped from a file (see tables.attach_mapping_table)
+        table = cls.__new__(cls)
+        table._set_columns(headers, vocabularies, codes)
+        return table
+
+    def _set_columns(self, headers: list, vocabularies: dict, codes: dict) -> None:
+        self.headers = list(headers)
+        self.vocabularies = {column: tuple(sys.intern(value) for value in vocabularies[column]) for column in self.headers}
+        self.codes = {}
+        self._value_to_code = {}
+        for column in self.headers:
+            self.codes[column] = codes[column]
+            if self.codes[column].flags.writeable:
+                self.codes[column].flags.writeable = False
+            self._value_to_code[column] = {value: code for code, value in enumerate(self.vocabularies[column])}
+        self.n_rows = len(self.codes[self.headers[0]]) if self.headers else 0
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state['codes'] = {column: array_state(codes) for column, codes in self.codes.items()}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state['codes'] = {column: array_from_state(codes) for column, codes in state['codes'].items()}
+        self.__dict__.update(state)
+
+    def encode(self, column: str, values) -> np.ndarray:
+        # exact (not normalized) match against the vocabulary, UNKNOWN_CODE if the value isn't in it
+        value_to_code = self._value_to_code[column]
+        return np.array([value_to_code.get(value, UNKNOWN_CODE) for value in values], dtype=np.int32)
+
+    def decode(self, column: str, codes) -> list:
+        # UNKNOWN_CODE and MULTIPLE_CODE both decode to None
+        labels = np.array(list(self.vocabularies[column]) + [None, None], dtype=object)
+        return labels.take(np.asarray(codes, dtype=np.int32)).tolist()
+
+    def column(self, column: str) -> list:
+        return self.decode(column, self.codes[column])
@@ -0,0 +1,205 @@
+"""
+Typo tolerant matching of place names, for inputs that don't match any municipality or county as they are.
+
+The names of every municipality and county in the mapping table plus the place names in
+mapping_data/norway_place_names.txt are put in a trigram index (built once per process, the first time it's used).
+A query only has to compute the edit distance to the names sharing enough trigrams with it, which keeps it well
+under a millisecond. The place names can't be mapped to a dialect on their own, but they stop a correctly spelled
+village from being "corrected" into a municipality with a similar name.
+
+Switch it on with mapper_methods.enable_fuzzy_matching() or use a fuzzy_matcher directly.
+"""
+
+from collections import namedtuple
+try:
+    import importlib.resources as pkg_resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as pkg_resources
+
+import numpy as np
+
+from . import cache
+from . import mapping_data
+from . import tables
+from .normalize import canonical_key
+
+place_names_file = 'norway_place_names.txt'
+
+# a name within max_distance edits of the query. resolvable is whether it is a municipality or county
+fuzzy_candidate = namedtuple('fuzzy_candidate', ['name', 'key', 'distance', 'resolvable'])
+
+def _trigrams(key: str) -> set:
+    padded = '$$' + key + '$$'
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def _pattern_bits(pattern: str) -> dict:
+    # for every character of pattern, a bit mask of the positions it is at (see edit_distance)
+    pattern_bits = {}
+    for position, char in enumerate(pattern):
+        pattern_bits[char] = pattern_bits.get(char, 0) | (1 << position)
+    return pattern_bits
+
+def edit_distance(pattern: str, text: str, pattern_bits=None) -> int:
+    # Levenshtein distance using Myers' bit-parallel algorithm (as in Hyyrö 2001): one column of the usual dynamic
+    # programming table is kept as the bits of two ints, so the cost is a handful of int operations per character of text.
+    # Pass pattern_bits (from _pattern_bits()) when comparing the same pattern against many texts
+    if not pattern:
+        return len(text)
+    if pattern_bits is None:
+        pattern_bits = _pattern_bits(pattern)
+    all_ones = (1 << len(pattern)) - 1
+    last_bit = 1 << (len(pattern) - 1)
+    positive_vertical = all_ones
+    negative_vertical = 0
+    distance = len(pattern)
+    for char in text:
+        equal = pattern_bits.get(char, 0)
+        vertical = equal | negative_vertical
+        horizontal = (((equal & positive_vertical) + positive_vertical) ^ positive_vertical) | equal
+        positive_horizontal = negative_vertical | (~(horizontal | positive_vertical) & all_ones)
+        negative_horizontal = positive_vertical & horizontal
+        if positive_horizontal & last_bit:
+            distance += 1
+        elif negative_horizontal & last_bit:
+            distance -= 1
+        positive_horizontal = ((positive_horizontal << 1) | 1) & all_ones
+        negative_horizontal = (negative_horizontal << 1) & all_ones
+        positive_vertical = negative_horizontal | (~(vertical | positive_horizontal) & all_ones)
+        negative_vertical = positive_horizontal & vertical
+    return distance
+
+class fuzzy_index:
+    '''
+    The canonical keys of all of the names (with a display name each) and, for every trigram, the names that have it
+    '''
+    def __init__(self, names: dict, resolvable: set) -> None:
+        # names: canonical key -> name
+        self.names_by_key = dict(names)
+        self.keys = sorted(names)
+        self.names = [names[key] for key in self.keys]
+        self.resolvable = [key in resolvable for key in self.keys]
+        postings = {}
+        for key_index, key in enumerate(self.keys):
+            for trigram in _trigrams(key):
+                postings.setdefault(trigram, []).append(key_index)
+        self.postings = {trigram: np.array(key_indexes, dtype=np.int32) for trigram, key_indexes in postings.items()}
+        self.trigram_counts = np.array([len(_trigrams(key)) for key in self.keys], dtype=np.int32)
+        self.lengths = np.array([len(key) for key in self.keys], dtype=np.int32)
+        # how often each character is in each name. Edits can change these counts by at most one each
+        self.alphabet = {char: char_index for char_index, char in enumerate(sorted(set(''.join(self.keys))))}
+        self.char_counts = np.zeros((len(self.keys), len(self.alphabet)), dtype=np.int16)
+        for key_index, key in enumerate(self.keys):
+            for char in key:
+                self.char_counts[key_index, self.alphabet[char]] += 1
+
+    def candidates(self, key: str, max_distance: int) -> list:
+        # every name within max_distance edits of key, closest first
+        query_trigrams = _trigrams(key)
+        postings = [self.postings[trigram] for trigram in query_trigrams if trigram in self.postings]
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.keys)) if postings else np.zeros(len(self.keys), dtype=np.int64)
+        # every edit changes at most 3 trigrams, so names sharing fewer than this can't be close enough.
+        # nor can names whose length is more than max_distance off. For short names the bound is 0 or less, so
+        # those are kept even if they share no trigram with the query and only the length and character filters apply
+        close = (
+            (shared >= np.maximum(self.trigram_counts, len(query_trigrams)) - 3 * max_distance) &
+            (np.abs(self.lengths - len(key)) <= max_distance)
+        )
+        close = np.flatnonzero(close)
+        # a name with n more (or fewer) of some characters than the query is at least n edits away
+        query_counts = np.zeros(len(self.alphabet), dtype=np.int16)
+        unknown_chars = 0
+        for char in key:
+            if char in self.alphabet:
+                query_counts[self.alphabet[char]] += 1
+            else:
+                unknown_chars += 1
+        difference = self.char_counts[close] - query_counts
+        close = close[np.maximum(np.clip(difference, 0, None).sum(axis=1), np.clip(-difference, 0, None).sum(axis=1) + unknown_chars) <= max_distance]
+
+        pattern_bits = _pattern_bits(key)
+        candidates = []
+        for key_index in close.tolist():
+            distance = edit_distance(key, self.keys[key_index], pattern_bits)
+            if distance <= max_distance:
+                candidates.append(fuzzy_candidate(self.names[key_index], self.keys[key_index], distance, self.resolvable[key_index]))
+        # prefer municipalities/counties over other places at the same distance
+        return sorted(candidates, key=lambda candidate: (candidate.distance, not candidate.resolvable, candidate.key))
+
+def _load_fuzzy_index() -> fuzzy_index:
+    mapping_table = tables.get_mapping_table()
+    names = {}
+    resolvable = set()
+    for lookup_column in tables.lookup_columns:
+        for value in mapping_table.table.vocabularies[lookup_column]:
+            key = canonical_key(value)
+            if key != '':
+                names.setdefault(key, value)
+                resolvable.add(key)
+    for line in pkg_resources.read_text(mapping_data, place_names_file).splitlines():
+        key = canonical_key(line)
+        if key != '':
+            names.setdefault(key, line.strip())
+    return fuzzy_index(names, resolvable)
+
+def get_fuzzy_index() -> fuzzy_index:
+    return tables._get_shared('fuzzy_index', _load_fuzzy_index)
+
+class fuzzy_matcher:
+    '''
+    Finds the municipality or county a misspelled place name most likely means. Answers are cached (see cache.py)
+    '''
+    def __init__(self, max_distance=2, cache_size=4096) -> None:
+        self.max_distance = max_distance
+        self._cache = cache.resolution_cache(cache_size)
+
+    def candidates(self, name: str, max_distance=None) -> list:
+        """ All of the known names within max_distance edits of name
+
+        Args:
+            name (str): A (misspelled) place name
+            max_distance (int, optional): The most edits allowed. Defaults to the matcher's max_distance.
+
+        Returns:
+            list: fuzzy_candidates, closest first
+        """
+        if max_distance is None:
+            max_distance = self.max_distance
+        return get_fuzzy_index().candidates(canonical_key(name), max_distance)
+
+    def match_key(self, key: str):
+        # the canonical key of the municipality/county key (a canonical key) most likely means. None if there
+        # is no clear answer: nothing is close enough, it is closer to a place that isn't a municipality/county,
+        # or it is as close to more than one municipality/county
+        match = self._cache.get(key)
+        if match is not cache.missing:
+            return match
+        match = None
+        candidates = get_fuzzy_index().candidates(key, self.max_distance)
+        if candidates and candidates[0].resolvable:
+            closest = [candidate for candidate in candidates if candidate.distance == candidates[0].distance]
+            if len(closest) == 1 or not closest[1].resolvable:
+                match = candidates[0].key
+        self._cache.put(key, match)
+        return match
+
+    def match(self, name: str):
+        # the name of the municipality/county name most likely means, None if there's no clear answer (see match_key)
+        key = self.match_key(canonical_key(name))
+        if key is None:
+            return None
+        return get_fuzzy_index().names_by_key[key]
+
+    def match_many(self, names) -> list:
+        # batch version of match(), each distinct name is only matched once
+        matched = {}
+        matches = []
+        for name in names:
+            key = canonical_key(name)
+            if key not in matched:
+                matched[key] = self.match(name)
+            matches.append(matched[key])
+        return matches
+
+    def cache_info(self) -> cache.cache_info:
+        return self._cache.info()
@@ -0,0 +1,130 @@
+"""
+A cache of the projected (and rotated) shapely geometries of the plotter's map layers
+
+Projecting a layer only depends on the layer, the size of the map, and the split_norway/rotate_norway options, not on the
+colors, so maps that only differ in their colors can all reuse the same projected geometries. The cache lives in memory
+and, if it's given a directory, is also kept on disk so other processes (and later runs) don't have to project the layers again
+"""
+
+import os
+import pickle
+import threading
+import warnings
+from collections import namedtuple
+
+# bump this whenever projected_layer (or how the plotter projects the layers) changes so old files are ignored
+GEOMETRY_CACHE_FORMAT = 1
+
+# region_names are the names used to color the regions (the Herøys are already told apart), multipolygons the projected
+# geometries in the same order, and bounds the (min_x, min_y, width, height) of the whole layer
+projected_layer = namedtuple('projected_layer', ['region_names', 'multipolygons', 'bounds'])
+
+# (layer, final_width, final_height, split_norway, rotate_norway)
+geometry_key = namedtuple('geometry_key', ['layer', 'final_width', 'final_height', 'split_norway', 'rotate_norway'])
+
+class geometry_cache:
+    '''
+    Projected layers by geometry_key. If cache_dir is given, every layer is also pickled there (one file per key) together
+    with a digest of the data it was projected from, so the file is only used while that data stays the same
+    '''
+    def __init__(self, cache_dir=None) -> None:
+        self.cache_dir = cache_dir
+        self._layers = {}
+        # (geometry_key, stroke_width) -> the layer's SVG templates (see plotter_methods._build_svg_templates)
+        self._svg_templates = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: geometry_key) -> str:
+        return os.path.join(self.cache_dir, '{}_{:g}x{:g}{}{}.pickle'.format(
+            key.layer, key.final_width, key.final_height, '_split' if key.split_norway else '', '_rotate' if key.rotate_norway else ''
+        ))
+
+    def _read(self, key: geometry_key, source_digest: str):
+        # the pickled layer if there is one for the key that was built from the same data, otherwise None
+        try:
+            with open(self._path(key), 'rb') as open_f:
+                stored = pickle.load(open_f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            warnings.warn('Could not read the cached geometry {} ({}). Projecting it again'.format(self._path(key), e))
+            return None
+        if stored.get('format') != GEOMETRY_CACHE_FORMAT or stored.get('key') != tuple(key) or stored.get('source') != source_digest:
+            return None
+        return stored['layer']
+
+    def _write(self, key: geometry_key, source_digest: str, layer: projected_layer) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # write to a temporary file first so other processes never see half a file
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as open_f:
+            pickle.dump({'format': GEOMETRY_CACHE_FORMAT, 'key': tuple(key), 'source': source_digest, 'layer': layer}, open_f, protocol=4)
+        os.replace(tmp_path, path)
+
+    def get(self, key: geometry_key, source_digest: str, build) -> projected_layer:
+        """ The projected layer for the key, calling build() (once) if it isn't cached yet
+
+        Args:
+            key (geometry_key): The layer and the options it's projected with
+            source_digest (str): Identifies the data the layer is projected from (see plotter_methods._source_digest)
+            build (callable): Projects the layer, returning a projected_layer
+
+        Returns:
+            projected_layer: The projected region geometries and the bounds of the layer
+        """
+        with self._lock:
+            layer = self._layers.get(key)
+            if layer is not None and layer[0] == source_digest:
+                self.hits += 1
+                return layer[1]
+            self.misses += 1
+            layer = self._read(key, source_digest) if self.cache_dir is not None else None
+            if layer is None:
+                layer = build()
+                if self.cache_dir is not None:
+                    self._write(key, source_digest, layer)
+            self._layers[key] = (source_digest, layer)
+            return layer
+
+    def get_svg_templates(self, key: geometry_key, source_digest: str, stroke_width: float, build) -> tuple:
+        # like get(), for the SVG templates of a layer drawn with the given stroke width. These are only kept in memory
+        # (but can be handed to another cache with add_svg_templates())
+        with self._lock:
+            templates = self._svg_templates.get((key, stroke_width))
+            if templates is not None and templates[0] == source_digest:
+                return templates[1]
+            templates = build()
+            self._svg_templates[(key, stroke_width)] = (source_digest, templates)
+            return templates
+
+    def add_svg_templates(self, svg_templates: dict) -> None:
+        # (geometry_key, stroke_width) -> (source digest, templates), e.g. the templates a worker process is started with
+        with self._lock:
+            self._svg_templates.update(svg_templates)
+
+    def save(self, cache_dir=None, keys=None) -> None:
+        # write every layer in memory (or only those with one of keys) to cache_dir (defaults to this cache's directory),
+        # e.g. so worker processes can load them
+        cache_dir = self.cache_dir if cache_dir is None else cache_dir
+        if cache_dir is None:
+            raise Exception('The geometry cache does not have a directory to save to')
+        with self._lock:
+            layers = [(key, layer) for key, layer in self._layers.items() if keys is None or key in keys]
+        directory_cache = geometry_cache(cache_dir)
+        for key, (source_digest, layer) in layers:
+            directory_cache._write(key, source_digest, layer)
+
+    def clear(self) -> None:
+        # only empties the in-memory cache, files in cache_dir are kept
+        with self._lock:
+            self._layers.clear()
+            self._svg_templates.clear()
+
+    def __len__(self) -> int:
+        return len(self._layers)
+
+# shared by every plotter_methods that isn't given a cache of its own
+default_geometry_cache = geometry_cache()
@@ -0,0 +1,122 @@
+"""
+Optional instrumentation of mapper_methods: calls and timings per resolver, which lookup column (tier) matched,
+how ambigious municipalities were resolved, and how often the corrections changed an input.
+
+Nothing here runs unless mapper_methods.enable_instrumentation() is called. Enabling it puts timed/counting
+wrappers of the hot methods on the instance (shadowing the class methods), disabling it deletes them again, so an
+uninstrumented mapper runs exactly the same code as before.
+"""
+
+import bisect
+import functools
+import threading
+import time
+
+# upper bounds (in seconds) of the timing histogram buckets, the last one catches everything else
+timing_buckets = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 1e-2, 1e-1, float('inf'))
+
+# the public methods that are counted and timed
+instrumented_methods = [
+    'get_named_dialect', 'get_numeric_dialect', 'get_cardinal_four', 'get_cardinal_five', 'resolve',
+    'get_named_dialect_many', 'get_numeric_dialect_many', 'get_cardinal_four_many', 'get_cardinal_five_many', 'resolve_many',
+    'map_dataframe',
+]
+
+class lookup_stats:
+    '''
+    The counters and histograms. One can be shared by several mappers (see mapper_methods.enable_instrumentation)
+    '''
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = {}
+            self.seconds = {}
+            self.histograms = {}
+            # lookup column -> how often it matched, plus 'unresolved'. Answers served from the
+            # resolution cache (see cache.py) are not resolved again so they aren't counted here
+            self.tiers = {}
+            # 'new', 'old', or 'unknown' (an unknown resolve_ambigious) -> count
+            self.ambiguities = {}
+            self.corrections = 0
+            self.correction_hits = 0
+
+    def record_call(self, method: str, seconds: float) -> None:
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.seconds[method] = self.seconds.get(method, 0.0) + seconds
+            if method not in self.histograms:
+                self.histograms[method] = [0] * len(timing_buckets)
+            self.histograms[method][bisect.bisect_left(timing_buckets, seconds)] += 1
+
+    def record_tier(self, lookup_column) -> None:
+        lookup_column = 'unresolved' if lookup_column is None else lookup_column
+        with self._lock:
+            self.tiers[lookup_column] = self.tiers.get(lookup_column, 0) + 1
+
+    def record_ambiguity(self, resolved_by: str) -> None:
+        with self._lock:
+            self.ambiguities[resolved_by] = self.ambiguities.get(resolved_by, 0) + 1
+
+    def record_correction(self, hit: bool) -> None:
+        with self._lock:
+            self.corrections += 1
+            if hit:
+                self.correction_hits += 1
+
+    def snapshot(self) -> dict:
+        # a copy of everything as plain dicts/lists/numbers (e.g. to serve as JSON)
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'seconds': dict(self.seconds),
+                'histograms': {
+                    method: {'buckets': list(timing_buckets), 'counts': list(counts)} for method, counts in self.histograms.items()
+                },
+                'tiers': dict(self.tiers),
+                'ambiguities': dict(self.ambiguities),
+                'corrections': self.corrections,
+                'correction_hits': self.correction_hits,
+            }
+
+def _timed(stats: lookup_stats, name: str, method):
+    perf_counter = time.perf_counter
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats.record_call(name, perf_counter() - start)
+    return timed
+
+def instrument(mapper, stats: lookup_stats) -> None:
+    mapper_class = type(mapper)
+    for name in instrumented_methods:
+        setattr(mapper, name, _timed(stats, name, getattr(mapper_class, name).__get__(mapper)))
+
+    resolve_tier = mapper_class._resolve_tier.__get__(mapper)
+    def counted_resolve_tier(lookup_by, resolve_ambigious='new'):
+        tier = resolve_tier(lookup_by, resolve_ambigious)
+        stats.record_tier(None if tier is None else tier[0])
+        return tier
+    mapper._resolve_tier = counted_resolve_tier
+
+    resolve_key_tier = mapper_class._resolve_key_tier.__get__(mapper)
+    def counted_resolve_key_tier(key, lookup_by, resolve_ambigious, stats=stats):
+        # _resolve_key_tier reports how ambigious municipalities are resolved to stats itself
+        return resolve_key_tier(key, lookup_by, resolve_ambigious, stats=stats)
+    mapper._resolve_key_tier = counted_resolve_key_tier
+
+    get_corrections = mapper_class._get_corrections.__get__(mapper)
+    def counted_get_corrections(lookup_by):
+        corrected = get_corrections(lookup_by)
+        stats.record_correction(corrected != lookup_by)
+        return corrected
+    mapper._get_corrections = counted_get_corrections
+
+def uninstrument(mapper) -> None:
+    for name in instrumented_methods + ['_resolve_tier', '_resolve_key_tier', '_get_corrections']:
+        mapper.__dict__.pop(name, None)
@@ -2,21 +2,17 @@
 A class to help mapping between Norsk kommuner and dialekt names
 """
 
-import csv
-import sys
-if sys.version_info[0] < 3: 
-    from StringIO import StringIO
-else:
-    from io import StringIO
-try:
-    import importlib.resources as pkg_resources
-except ImportError:
-    # Try backported to PY<37 `importlib_resources`.
-    import importlib_resources as pkg_resources
-
-from . import mapping_data
+import types
+
+from . import cache
+from . import misses
+from . import speakers
+from . import tables
+from .columnar import UNKNOWN_CODE
+from .normalize import UNMATCHABLE_KEY, canonical_key
 
 from collections import namedtuple
+import numpy as np
 
 # A bunch of methods that makes querying dialectal relationships easier
 # Code created by Phoebe Parsons on Jan 14 2022
@@ -27,7 +23,28 @@ from collections import namedtuple
 # Many of these methods could be improved via the use of Pandas. But, I 
 # didn't want to force any other potential users to install Pandas as well
 
+# all of the dialect labels for a single place, as returned by mapper_methods.resolve()
+dialect_resolution = namedtuple('dialect_resolution', ['named_dialect', 'numeric_dialect', 'cardinal_four', 'cardinal_five'])
+
+# what the *_corrections attributes hold while a correction set is switched off
+_no_corrections = types.MappingProxyType({})
+
+def _copy_answer(answer):
+    # a copy of the lists in an answer (a label, a list of labels, or a dialect_resolution) so callers can't change shared answers
+    if isinstance(answer, list):
+        return list(answer)
+    if isinstance(answer, dialect_resolution):
+        return answer._replace(**{field: list(value) for field, value in answer._asdict().items() if isinstance(value, list)})
+    return answer
+
 class mapper_methods:
+    # the columns a place name can be looked up by (in the order get_*_dialect tries them)
+    # and the dialect columns a lookup can return
+    lookup_columns = tables.lookup_columns
+    dialect_columns = tables.dialect_columns
+    # short names accepted by map_dataframe() and the column each one adds
+    dataframe_outputs = {'named': 'named_dialect', 'numeric': 'numeric_dialect', 'card4': 'cardinal_four', 'card5': 'cardinal_five'}
+
     # ----------------- Disambiguation methods -----------------
     def is_ambiguious_municipality(self, municipality: str) -> bool:
         # ensure we don't have municipalities with the same name but different dialects
@@ -52,6 +69,122 @@ class mapper_methods:
             dialects = dialects[0]
         return dialects
 
+    # ----------------- Combined dialect methods -----------------
+    def resolve(self, lookup_by: str, resolve_ambigious='new'):
+        """ Look up the named, numeric, and both cardinal dialects for a place in one go.
+            The match (old municipality, new municipality, old county, new county, 2024 county)
+            is only decided once, so this is cheaper than calling each get_*_dialect method.
+            Each label follows the same rules as the matching get_*_dialect method
+
+        Args:
+            lookup_by (str): A municipality or county name
+            resolve_ambigious (str, optional): Whether to use the 'new' or 'old' municipality if the name is ambigious. Defaults to 'new'.
+
+        Returns:
+            dialect_resolution: The named_dialect, numeric_dialect, cardinal_four, and cardinal_five labels. None if the place cannot be found
+        """
+        tier = self._resolve_tier(lookup_by, resolve_ambigious)
+        if tier is None:
+            self._record_unresolved(lookup_by, resolve_ambigious)
+            return None
+        return self._format_resolution(*tier)
+
+    def _record_unresolved(self, lookup_by: str, resolve_ambigious: str) -> None:
+        self.misses.record(
+            misses.NOT_FOUND, lookup_by, "ERROR: cannot find dialect for: {}".format(lookup_by),
+            {'method': 'resolve', 'resolve_ambigious': resolve_ambigious}
+        )
+
+    def resolve_many(self, lookups, resolve_ambigious='new') -> list:
+        # batch version of resolve(), see _map_many()
+        return self._map_many(self.resolve, lookups, resolve_ambigious, lambda lookup_by: self._record_unresolved(lookup_by, resolve_ambigious))
+
+    def _map_many(self, resolver, lookups, resolve_ambigious, record_miss) -> list:
+        # Corpora repeat the same places over and over. Every lookup only depends on the canonical key of the
+        # input (see _key()) so we resolve each distinct key once and scatter the answers back in input order.
+        # record_miss(lookup_by) records a place that can't be found, so that repeats of it are counted just
+        # like repeated single lookups are. Every row gets its own copy of list answers
+        if not (isinstance(resolve_ambigious, str) and resolve_ambigious.lower().strip() in ['new', 'old']):
+            # unknown ways of resolving are warned about on every lookup (see _get_dialect()), so nothing is shared
+            return [resolver(lookup_by, resolve_ambigious) for lookup_by in lookups]
+        resolved = {}
+        results = []
+        for lookup_by in lookups:
+            key = self._key(lookup_by)
+            if key in resolved:
+                answer = resolved[key]
+                if answer is None:
+                    record_miss(lookup_by)
+            else:
+                answer = resolved[key] = resolver(lookup_by, resolve_ambigious)
+            results.append(_copy_answer(answer))
+        return results
+
+    def _not_found_recorder(self, dialect_column: str, resolve_ambigious: str, error_name: str):
+        # record_miss for _map_many() over one of the get_*_dialect methods
+        return lambda lookup_by: self._record_not_found(dialect_column, lookup_by, resolve_ambigious, error_name)
+
+    def _get_dialect(self, dialect_column: str, lookup_by: str, resolve_ambigious: str, error_name: str):
+        # The answers of the get_*_dialect methods only depend on the normalized input, how ambigious names are
+        # resolved, the corrections, and the collapse, so they are kept in an LRU cache (see cache.py)
+        cache_key = None
+        if self._resolution_cache.maxsize and isinstance(resolve_ambigious, str) and resolve_ambigious.lower().strip() in ['new', 'old']:
+            # (unknown ways of resolving aren't cached so their warning is printed every time)
+            cache_key = (dialect_column, self._key(lookup_by), resolve_ambigious.lower().strip(), self._cache_state())
+            dialects = self._resolution_cache.get(cache_key)
+            if dialects is not cache.missing:
+                if dialects is None:
+                    self._record_not_found(dialect_column, lookup_by, resolve_ambigious, error_name)
+                # hand out copies of lists so callers can't modify the cached answer
+                return list(dialects) if isinstance(dialects, list) else dialects
+
+        tier = self._resolve_tier(lookup_by, resolve_ambigious)
+        if tier is None:
+            self._record_not_found(dialect_column, lookup_by, resolve_ambigious, error_name)
+            dialects = None
+        else:
+            dialects = self.format_dialect_response(self._lookup(tier[0], dialect_column, tier[1]))
+        if cache_key is not None:
+            self._resolution_cache.put(cache_key, list(dialects) if isinstance(dialects, list) else dialects)
+        return dialects
+
+    def _record_not_found(self, dialect_column: str, lookup_by: str, resolve_ambigious: str, error_name: str) -> None:
+        self.misses.record(
+            misses.NOT_FOUND, lookup_by, "ERROR: cannot find {} for: {}".format(error_name, lookup_by),
+            {'method': 'get_' + dialect_column, 'resolve_ambigious': resolve_ambigious}
+        )
+
+    def set_miss_mode(self, mode: str) -> None:
+        # what to do with places that can't be found: 'print' (the default), 'silent', 'logging', or 'collect' (see misses.py)
+        self.misses.set_mode(mode)
+
+    def _cache_state(self) -> tuple:
+        # everything besides the input that changes what the get_*_dialect methods return
+        return (
+            self._active_corrections, self._nbtale_ignore_herøy, self.collapse_fine_grained_dialects,
+            None if self._fuzzy_matcher is None else self._fuzzy_matcher.max_distance
+        )
+
+    def _check_cache_state(self) -> None:
+        # empty the cache when the corrections or the collapse are switched on/off
+        state = self._cache_state()
+        if state != self._cached_state:
+            self._resolution_cache.clear()
+            self._cached_state = state
+
+    def resolution_cache_info(self) -> cache.cache_info:
+        # hits, misses, evictions, invalidations, maxsize, and currsize of the get_*_dialect cache
+        return self._resolution_cache.info()
+
+    def clear_resolution_cache(self) -> None:
+        self._resolution_cache.clear()
+        self._resolution_cache.reset_counters()
+
+    def _format_resolution(self, lookup_column: str, key: str) -> dialect_resolution:
+        return dialect_resolution(
+            *[self.format_dialect_response(self._lookup(lookup_column, dialect_column, key)) for dialect_column in self.dialect_columns]
+        )
+
     # ----------------- CARDINAL dialect methods -----------------
     def get_cardinal_dialect(self, input_str: str) -> str:
         # we'll allow the input to either be a dialect region or a kommune/fylke
@@ -83,195 +216,119 @@ class mapper_methods:
             #     named_dialect = self.get
 
     # ----------------- CARDINAL dialect methods -----------------
+    def get_old_municipalities_from_cardinal_four(self, cardinal_four: str) -> list:
+        return self._reverse_lookup('cardinal_four', 'old_muni', cardinal_four.lower().strip())
+    def get_new_municipalities_from_cardinal_four(self, cardinal_four: str) -> list:
+        return self._reverse_lookup('cardinal_four', 'new_muni', cardinal_four.lower().strip())
+    def get_old_counties_from_cardinal_four(self, cardinal_four: str) -> list:
+        return self._reverse_lookup('cardinal_four', 'old_county', cardinal_four.lower().strip())
+    def get_new_counties_from_cardinal_four(self, cardinal_four: str) -> list:
+        return self._reverse_lookup('cardinal_four', 'new_county', cardinal_four.lower().strip())
+    def get_new_counties_2024_from_cardinal_four(self, cardinal_four: str) -> list:
+        return self._reverse_lookup('cardinal_four', 'new_county_2024', cardinal_four.lower().strip())
+
     def get_cardinal_four_by_old_municipality(self, old_municipality) -> list:
-        old_municipality = old_municipality.lower().strip()
+        old_municipality = self._key(old_municipality)
         old_municipality = self._get_corrections(old_municipality)
         # if old_municipality is not a Norwegian muni then it will be none
         # which causes problems b/c in the csv data old_muni being empty means there isn't an old muni corresponding to the new muni
         # thus we want to ignore old_munis being none instead of returning all the new munis w/o an old 
         if old_municipality == '':
             return []
-        return sorted(list(set([x.cardinal_four for x in self.csv_tuples if x.old_muni.lower().strip() == old_municipality])))
+        return self._lookup('old_muni', 'cardinal_four', old_municipality)
     def get_cardinal_four_by_new_municipality(self, new_municipality) -> list:
-        new_municipality = new_municipality.lower().strip()
+        new_municipality = self._key(new_municipality)
         new_municipality = self._get_corrections(new_municipality)
-        return sorted(list(set([x.cardinal_four for x in self.csv_tuples if x.new_muni.lower().strip() == new_municipality])))
+        return self._lookup('new_muni', 'cardinal_four', new_municipality)
     def get_cardinal_four_by_old_county(self, old_county) -> list:
-        return sorted(list(set([x.cardinal_four for x in self.csv_tuples if x.old_county.lower().strip() == old_county.lower().strip()])))
+        return self._lookup('old_county', 'cardinal_four', self._key(old_county))
     def get_cardinal_four_by_new_county(self, new_county) -> list:
-        return sorted(list(set([x.cardinal_four for x in self.csv_tuples if x.new_county.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county', 'cardinal_four', self._key(new_county))
     def get_cardinal_four_by_new_county_2024(self, new_county) -> list:
-        return sorted(list(set([x.cardinal_four for x in self.csv_tuples if x.new_county_2024.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county_2024', 'cardinal_four', self._key(new_county))
     
     def get_cardinal_four(self, lookup_by: str, resolve_ambigious='new'):
-        if self.is_ambiguious_municipality(lookup_by):
-            resolve_ambigious = resolve_ambigious.lower().strip()
-            if resolve_ambigious in ['new', 'old']:
-                if resolve_ambigious == 'new':
-                    dialects = self.get_cardinal_four_by_new_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_cardinal_four_by_old_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-            else:
-                print("Unknown way of resolving ambigious municipality for {}. Using new municipality.".format(lookup_by))
+        return self._get_dialect('cardinal_four', lookup_by, resolve_ambigious, 'named dialect')
+
+    def get_cardinal_four_many(self, lookups, resolve_ambigious='new') -> list:
+        # batch version of get_cardinal_four(), see _map_many()
+        return self._map_many(self.get_cardinal_four, lookups, resolve_ambigious, self._not_found_recorder('cardinal_four', resolve_ambigious, 'named dialect'))
+
+    def get_old_municipalities_from_cardinal_five(self, cardinal_five: str) -> list:
+        return self._reverse_lookup('cardinal_five', 'old_muni', cardinal_five.lower().strip())
+    def get_new_municipalities_from_cardinal_five(self, cardinal_five: str) -> list:
+        return self._reverse_lookup('cardinal_five', 'new_muni', cardinal_five.lower().strip())
+    def get_old_counties_from_cardinal_five(self, cardinal_five: str) -> list:
+        return self._reverse_lookup('cardinal_five', 'old_county', cardinal_five.lower().strip())
+    def get_new_counties_from_cardinal_five(self, cardinal_five: str) -> list:
+        return self._reverse_lookup('cardinal_five', 'new_county', cardinal_five.lower().strip())
+    def get_new_counties_2024_from_cardinal_five(self, cardinal_five: str) -> list:
+        return self._reverse_lookup('cardinal_five', 'new_county_2024', cardinal_five.lower().strip())
 
-        # by looking up by old municipality first we're prioritizing it. I don't have a super strong arguement as to the why,
-        # presumably old municipalities will have fewer one to many mappings. But, if we feel like going with the new municipalities
-        # is better this can easily be changed                
-        dialects = self.get_cardinal_four_by_old_municipality(lookup_by)
-        if len(dialects) > 0:
-            return self.format_dialect_response(dialects)
-        else:
-            dialects = self.get_cardinal_four_by_new_municipality(lookup_by)
-            if len(dialects) > 0:
-                return self.format_dialect_response(dialects)
-            else:
-                dialects = self.get_cardinal_four_by_old_county(lookup_by)
-                if len(dialects) > 0:
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_cardinal_four_by_new_county(lookup_by)
-                    if len(dialects) > 0:
-                        return self.format_dialect_response(dialects)
-                    else:
-                        dialects = self.get_cardinal_four_by_new_county_2024(lookup_by)
-                        if len(dialects) > 0:
-                            return self.format_dialect_response(dialects)
-                        else:
-                            print("ERROR: cannot find named dialect for: {}".format(lookup_by))
-                            return None
-                        
     def get_cardinal_five_by_old_municipality(self, old_municipality) -> list:
-        old_municipality = old_municipality.lower().strip()
+        old_municipality = self._key(old_municipality)
         old_municipality = self._get_corrections(old_municipality)
         # if old_municipality is not a Norwegian muni then it will be none
         # which causes problems b/c in the csv data old_muni being empty means there isn't an old muni corresponding to the new muni
         # thus we want to ignore old_munis being none instead of returning all the new munis w/o an old 
         if old_municipality == '':
             return []
-        return sorted(list(set([x.cardinal_five for x in self.csv_tuples if x.old_muni.lower().strip() == old_municipality])))
+        return self._lookup('old_muni', 'cardinal_five', old_municipality)
     def get_cardinal_five_by_new_municipality(self, new_municipality) -> list:
-        new_municipality = new_municipality.lower().strip()
+        new_municipality = self._key(new_municipality)
         new_municipality = self._get_corrections(new_municipality)
-        return sorted(list(set([x.cardinal_five for x in self.csv_tuples if x.new_muni.lower().strip() == new_municipality])))
+        return self._lookup('new_muni', 'cardinal_five', new_municipality)
     def get_cardinal_five_by_old_county(self, old_county) -> list:
-        return sorted(list(set([x.cardinal_five for x in self.csv_tuples if x.old_county.lower().strip() == old_county.lower().strip()])))
+        return self._lookup('old_county', 'cardinal_five', self._key(old_county))
     def get_cardinal_five_by_new_county(self, new_county) -> list:
-        return sorted(list(set([x.cardinal_five for x in self.csv_tuples if x.new_county.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county', 'cardinal_five', self._key(new_county))
     def get_cardinal_five_by_new_county_2024(self, new_county) -> list:
-        return sorted(list(set([x.cardinal_five for x in self.csv_tuples if x.new_county_2024.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county_2024', 'cardinal_five', self._key(new_county))
     
     def get_cardinal_five(self, lookup_by: str, resolve_ambigious='new'):
-        if self.is_ambiguious_municipality(lookup_by):
-            resolve_ambigious = resolve_ambigious.lower().strip()
-            if resolve_ambigious in ['new', 'old']:
-                if resolve_ambigious == 'new':
-                    dialects = self.get_cardinal_five_by_new_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_cardinal_five_by_old_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-            else:
-                print("Unknown way of resolving ambigious municipality for {}. Using new municipality.".format(lookup_by))
+        return self._get_dialect('cardinal_five', lookup_by, resolve_ambigious, 'named dialect')
+
+    def get_cardinal_five_many(self, lookups, resolve_ambigious='new') -> list:
+        # batch version of get_cardinal_five(), see _map_many()
+        return self._map_many(self.get_cardinal_five, lookups, resolve_ambigious, self._not_found_recorder('cardinal_five', resolve_ambigious, 'named dialect'))
 
-        # by looking up by old municipality first we're prioritizing it. I don't have a super strong arguement as to the why,
-        # presumably old municipalities will have fewer one to many mappings. But, if we feel like going with the new municipalities
-        # is better this can easily be changed                
-        dialects = self.get_cardinal_five_by_old_municipality(lookup_by)
-        if len(dialects) > 0:
-            return self.format_dialect_response(dialects)
-        else:
-            dialects = self.get_cardinal_five_by_new_municipality(lookup_by)
-            if len(dialects) > 0:
-                return self.format_dialect_response(dialects)
-            else:
-                dialects = self.get_cardinal_five_by_old_county(lookup_by)
-                if len(dialects) > 0:
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_cardinal_five_by_new_county(lookup_by)
-                    if len(dialects) > 0:
-                        return self.format_dialect_response(dialects)
-                    else:
-                        dialects = self.get_cardinal_five_by_new_county_2024(lookup_by)
-                        if len(dialects) > 0:
-                            return self.format_dialect_response(dialects)
-                        else:
-                            print("ERROR: cannot find named dialect for: {}".format(lookup_by))
-                            return None
-
-
-    # ----------------- NAMED dialect methods -----------------
     def get_old_municipalities_from_named_dialect(self, named_dialect: str) -> list:
-        return sorted(list(set([x.old_muni for x in self.csv_tuples if x.named_dialect.lower().strip() == named_dialect.lower().strip()])))
+        return self._reverse_lookup('named_dialect', 'old_muni', named_dialect.lower().strip())
     def get_new_municipalities_from_named_dialect(self, named_dialect: str) -> list:
-        return sorted(list(set([x.new_muni for x in self.csv_tuples if x.named_dialect.lower().strip() == named_dialect.lower().strip()])))
+        return self._reverse_lookup('named_dialect', 'new_muni', named_dialect.lower().strip())
     def get_old_counties_from_named_dialect(self, named_dialect: str) -> list:
-        return sorted(list(set([x.old_county for x in self.csv_tuples if x.named_dialect.lower().strip() == named_dialect.lower().strip()])))
+        return self._reverse_lookup('named_dialect', 'old_county', named_dialect.lower().strip())
     def get_new_counties_from_named_dialect(self, named_dialect: str) -> list:
-        return sorted(list(set([x.new_county for x in self.csv_tuples if x.named_dialect.lower().strip() == named_dialect.lower().strip()])))
+        return self._reverse_lookup('named_dialect', 'new_county', named_dialect.lower().strip())
     def get_new_counties_2024_from_named_dialect(self, named_dialect: str) -> list:
-        return sorted(list(set([x.new_county_2024 for x in self.csv_tuples if x.named_dialect.lower().strip() == named_dialect.lower().strip()])))
+        return self._reverse_lookup('named_dialect', 'new_county_2024', named_dialect.lower().strip())
 
     def get_named_dialect_by_old_municipality(self, old_municipality) -> list:
-        old_municipality = old_municipality.lower().strip()
+        old_municipality = self._key(old_municipality)
         old_municipality = self._get_corrections(old_municipality)
         # if old_municipality is not a Norwegian muni then it will be none
         # which causes problems b/c in the csv data old_muni being empty means there isn't an old muni corresponding to the new muni
         # thus we want to ignore old_munis being none instead of returning all the new munis w/o an old 
         if old_municipality == '':
             return []
-        return sorted(list(set([x.named_dialect for x in self.csv_tuples if x.old_muni.lower().strip() == old_municipality])))
+        return self._lookup('old_muni', 'named_dialect', old_municipality)
     def get_named_dialect_by_new_municipality(self, new_municipality) -> list:
-        new_municipality = new_municipality.lower().strip()
+        new_municipality = self._key(new_municipality)
         new_municipality = self._get_corrections(new_municipality)
-        return sorted(list(set([x.named_dialect for x in self.csv_tuples if x.new_muni.lower().strip() == new_municipality])))
+        return self._lookup('new_muni', 'named_dialect', new_municipality)
     def get_named_dialect_by_old_county(self, old_county) -> list:
-        return sorted(list(set([x.named_dialect for x in self.csv_tuples if x.old_county.lower().strip() == old_county.lower().strip()])))
+        return self._lookup('old_county', 'named_dialect', self._key(old_county))
     def get_named_dialect_by_new_county(self, new_county) -> list:
-        return sorted(list(set([x.named_dialect for x in self.csv_tuples if x.new_county.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county', 'named_dialect', self._key(new_county))
     def get_named_dialect_by_new_county_2024(self, new_county) -> list:
-        return sorted(list(set([x.named_dialect for x in self.csv_tuples if x.new_county_2024.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county_2024', 'named_dialect', self._key(new_county))
     
     def get_named_dialect(self, lookup_by: str, resolve_ambigious='new'):
-        if self.is_ambiguious_municipality(lookup_by):
-            resolve_ambigious = resolve_ambigious.lower().strip()
-            if resolve_ambigious in ['new', 'old']:
-                if resolve_ambigious == 'new':
-                    dialects = self.get_named_dialect_by_new_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_named_dialect_by_old_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-            else:
-                print("Unknown way of resolving ambigious municipality for {}. Using new municipality.".format(lookup_by))
+        return self._get_dialect('named_dialect', lookup_by, resolve_ambigious, 'named dialect')
 
-        # by looking up by old municipality first we're prioritizing it. I don't have a super strong arguement as to the why,
-        # presumably old municipalities will have fewer one to many mappings. But, if we feel like going with the new municipalities
-        # is better this can easily be changed                
-        dialects = self.get_named_dialect_by_old_municipality(lookup_by)
-        if len(dialects) > 0:
-            return self.format_dialect_response(dialects)
-        else:
-            dialects = self.get_named_dialect_by_new_municipality(lookup_by)
-            if len(dialects) > 0:
-                return self.format_dialect_response(dialects)
-            else:
-                dialects = self.get_named_dialect_by_old_county(lookup_by)
-                if len(dialects) > 0:
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_named_dialect_by_new_county(lookup_by)
-                    if len(dialects) > 0:
-                        return self.format_dialect_response(dialects)
-                    else:
-                        dialects = self.get_named_dialect_by_new_county_2024(lookup_by)
-                        if len(dialects) > 0:
-                            return self.format_dialect_response(dialects)
-                        else:
-                            print("ERROR: cannot find named dialect for: {}".format(lookup_by))
-                            return None
+    def get_named_dialect_many(self, lookups, resolve_ambigious='new') -> list:
+        # batch version of get_named_dialect(), see _map_many()
+        return self._map_many(self.get_named_dialect, lookups, resolve_ambigious, self._not_found_recorder('named_dialect', resolve_ambigious, 'named dialect'))
 
     def get_nbtale_named_dialect_from_id(self, speaker_id: str):
         """ Manual work was done to create a speaker ID to dialect mapping for NB Tale speakers
@@ -285,197 +342,319 @@ class mapper_methods:
         Returns:
             str: The name of the dialect region for that speaker
         """
-        if len(self.nbtale_speakers_to_named_dialects) == 0:
-            for module_number in ['1', '2', '3']:
-                c_reader = csv.reader(
-                    StringIO(
-                        pkg_resources.read_text(
-                            mapping_data, 
-                            f'NB_Tale_Informantdata_module_{module_number}_updated.csv'
-                        )
-                    )
-                )
-                for row in c_reader:
-                    csv_speaker_id = row[0]
-                    if csv_speaker_id != 'Informant-ID':
-                        # NOTE this will break if the format of the file changes!
-                        # (e.g. if another column is added)
-                        self.nbtale_speakers_to_named_dialects[csv_speaker_id] = row[-1]
         if speaker_id in self.nbtale_speakers_to_named_dialects:
             return self.nbtale_speakers_to_named_dialects[speaker_id]
         return ''
 
+    def get_nbtale_named_dialects_from_ids(self, speaker_ids) -> list:
+        # bulk version of get_nbtale_named_dialect_from_id()
+        return speakers.lookup('nbtale', speaker_ids, 'named_dialect', default='')
+
+    def get_speaker_metadata(self, corpus: str, speaker_ids, column: str, default=None) -> list:
+        """ Look speakers up in a registered speaker corpus (see speakers.register_speaker_corpus)
+
+        Args:
+            corpus (str): The name of the corpus (e.g. "nbtale")
+            speaker_ids (list): The speaker IDs to look up
+            column (str): The metadata column to return (e.g. "named_dialect" or "municipality" for "nbtale")
+            default (optional): Returned for speakers that aren't in the corpus. Defaults to None.
+
+        Returns:
+            list: The column's value for each of the speakers
+        """
+        return speakers.lookup(corpus, speaker_ids, column, default)
+
     # ----------------- NUMERIC dialect methods -----------------
     def get_old_municipalities_from_numeric_dialect(self, numeric_dialect: str) -> list:
-        return sorted(list(set([x.old_muni for x in self.csv_tuples if int(x.numeric_dialect) == int(numeric_dialect)])))
+        return self._reverse_lookup('numeric_dialect', 'old_muni', int(numeric_dialect))
     def get_new_municipalities_from_numeric_dialect(self, numeric_dialect: str) -> list:
-        return sorted(list(set([x.new_muni for x in self.csv_tuples if int(x.numeric_dialect) == int(numeric_dialect)])))
+        return self._reverse_lookup('numeric_dialect', 'new_muni', int(numeric_dialect))
     def get_old_counties_from_numeric_dialect(self, numeric_dialect: str) -> list:
-        return sorted(list(set([x.old_county for x in self.csv_tuples if int(x.numeric_dialect) == int(numeric_dialect)])))
+        return self._reverse_lookup('numeric_dialect', 'old_county', int(numeric_dialect))
     def get_new_counties_from_numeric_dialect(self, numeric_dialect: str) -> list:
-        return sorted(list(set([x.new_county for x in self.csv_tuples if int(x.numeric_dialect) == int(numeric_dialect)])))
+        return self._reverse_lookup('numeric_dialect', 'new_county', int(numeric_dialect))
+    def get_new_counties_2024_from_numeric_dialect(self, numeric_dialect: str) -> list:
+        return self._reverse_lookup('numeric_dialect', 'new_county_2024', int(numeric_dialect))
 
     def get_numeric_dialect_by_old_municipality(self, old_municipality) -> list:
-        old_municipality = old_municipality.lower().strip()
+        old_municipality = self._key(old_municipality)
         old_municipality = self._get_corrections(old_municipality)
         # if old_municipality is not a Norwegian muni then it will be none
         # which causes problems b/c in the csv data old_muni being empty means there isn't an old muni corresponding to the new muni
         # thus we want to ignore old_munis being none instead of returning all the new munis w/o an old 
         if old_municipality == '':
             return []
-        return sorted(list(set([x.numeric_dialect for x in self.csv_tuples if x.old_muni.lower().strip() == old_municipality])))
+        return self._lookup('old_muni', 'numeric_dialect', old_municipality)
     def get_numeric_dialect_by_new_municipality(self, new_municipality) -> list:
-        new_municipality = new_municipality.lower().strip()
+        new_municipality = self._key(new_municipality)
         new_municipality = self._get_corrections(new_municipality)
-        return sorted(list(set([x.numeric_dialect for x in self.csv_tuples if x.new_muni.lower().strip() == new_municipality])))
+        return self._lookup('new_muni', 'numeric_dialect', new_municipality)
     def get_numeric_dialect_by_old_county(self, old_county) -> list:
-        return sorted(list(set([x.numeric_dialect for x in self.csv_tuples if x.old_county.lower().strip() == old_county.lower().strip()])))
+        return self._lookup('old_county', 'numeric_dialect', self._key(old_county))
     def get_numeric_dialect_by_new_county(self, new_county) -> list:
-        return sorted(list(set([x.numeric_dialect for x in self.csv_tuples if x.new_county.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county', 'numeric_dialect', self._key(new_county))
     def get_numeric_dialect_by_new_county_2024(self, new_county) -> list:
-        return sorted(list(set([x.numeric_dialect for x in self.csv_tuples if x.new_county_2024.lower().strip() == new_county.lower().strip()])))
+        return self._lookup('new_county_2024', 'numeric_dialect', self._key(new_county))
     
     def get_numeric_dialect(self, lookup_by: str, resolve_ambigious='new'):
-        if self.is_ambiguious_municipality(lookup_by):
-            resolve_ambigious = resolve_ambigious.lower().strip()
-            if resolve_ambigious in ['new', 'old']:
-                if resolve_ambigious == 'new':
-                    dialects = self.get_numeric_dialect_by_new_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_numeric_dialect_by_old_municipality(lookup_by)
-                    return self.format_dialect_response(dialects)
-            else:
-                print("Unknown way of resolving ambigious municipality for {}. Using new municipality.".format(lookup_by))
+        return self._get_dialect('numeric_dialect', lookup_by, resolve_ambigious, 'numeric dialect')
+
+    def get_numeric_dialect_many(self, lookups, resolve_ambigious='new') -> list:
+        # batch version of get_numeric_dialect(), see _map_many()
+        return self._map_many(self.get_numeric_dialect, lookups, resolve_ambigious, self._not_found_recorder('numeric_dialect', resolve_ambigious, 'numeric dialect'))
+
+    # ----------------- Vectorized (integer coded) methods -----------------
+    def encode_places(self, lookups, lookup_column='new_muni') -> np.ndarray:
+        # turn place names into codes into self.table.vocabularies[lookup_column]
+        # names are normalized (and corrected for municipalities) the same way as the get_*_by_* methods
+        # unknown places get UNKNOWN_CODE
+        place_codes = self._place_codes[lookup_column]
+        correct = lookup_column in ['old_muni', 'new_muni']
+        codes = []
+        for lookup_by in lookups:
+            key = self._key(lookup_by)
+            if correct:
+                key = self._get_corrections(key)
+            codes.append(place_codes.get(key, UNKNOWN_CODE))
+        return np.array(codes, dtype=np.int32)
+
+    def get_dialect_codes(self, place_codes, lookup_column='new_muni', dialect_column='named_dialect') -> np.ndarray:
+        """ Map a whole array of place codes to dialect codes with a single numpy take()
 
-        # by looking up by old municipality first we're prioritizing it. I don't have a super strong arguement as to the why,
-        # presumably old municipalities will have fewer one to many mappings. But, if we feel like going with the new municipalities
-        # is better this can easily be changed
-        dialects = self.get_numeric_dialect_by_old_municipality(lookup_by)
-        if len(dialects) > 0:
-            return self.format_dialect_response(dialects)
-        else:
-            dialects = self.get_numeric_dialect_by_new_municipality(lookup_by)
-            if len(dialects) > 0:
-                return self.format_dialect_response(dialects)
-            else:
-                dialects = self.get_numeric_dialect_by_old_county(lookup_by)
-                if len(dialects) > 0:
-                    return self.format_dialect_response(dialects)
-                else:
-                    dialects = self.get_numeric_dialect_by_new_county(lookup_by)
-                    if len(dialects) > 0:
-                        return self.format_dialect_response(dialects)
-                    else:
-                        dialects = self.get_numeric_dialect_by_new_county_2024(lookup_by)
-                        if len(dialects) > 0:
-                            return self.format_dialect_response(dialects)
-                        else:
-                            print("ERROR: cannot find numeric dialect for: {}".format(lookup_by))
-                            return None
+        Args:
+            place_codes (array-like): Codes into self.table.vocabularies[lookup_column], e.g. from encode_places() or self.table.codes
+            lookup_column (str, optional): One of lookup_columns. Defaults to 'new_muni'.
+            dialect_column (str, optional): One of dialect_columns. Defaults to 'named_dialect'.
+
+        Returns:
+            np.ndarray: Codes into self.table.vocabularies[dialect_column]. UNKNOWN_CODE for unknown places and
+                MULTIPLE_CODE for places that map to more than one dialect
+        """
+        return self._code_maps[(lookup_column, dialect_column)].take(np.asarray(place_codes, dtype=np.int32))
+
+    def decode_dialects(self, dialect_codes, dialect_column='named_dialect') -> list:
+        # turn dialect codes back into labels (None for UNKNOWN_CODE/MULTIPLE_CODE), collapsing them if enabled
+        dialects = self.table.decode(dialect_column, dialect_codes)
+        if self.collapse_fine_grained_dialects:
+            dialects = [self._collapse_fine_granded_dialects(d) for d in dialects]
+        return dialects
+
+    # ----------------- pandas methods -----------------
+    def map_dataframe(self, df, column: str, outputs=('named', 'numeric', 'card4', 'card5'), resolve_ambigious='new'):
+        """ Add dialect columns to a pandas DataFrame. Rather than looking up every row the place column is
+            factorized, each distinct place is resolved once, and the answers are joined back onto the rows.
+            Places that cannot be found (or aren't strings) are left as nulls and nothing is printed
+
+        Args:
+            df (pandas.DataFrame): The data to annotate
+            column (str): The column holding the municipality/county names
+            outputs (tuple, optional): Any of 'named', 'numeric', 'card4', and 'card5'. Defaults to all of them.
+            resolve_ambigious (str, optional): Whether to use the 'new' or 'old' municipality if a name is ambigious. Defaults to 'new'.
+
+        Returns:
+            pandas.DataFrame: A copy of df with named_dialect, numeric_dialect, cardinal_four, and/or cardinal_five columns added
+        """
+        try:
+            import pandas as pd
+        except ImportError:
+            raise ImportError('map_dataframe() requires pandas. Install it with `pip install dialect_mapper[pandas]`')
+        for output in outputs:
+            if output not in self.dataframe_outputs:
+                raise Exception('Unknown output {}. Please use one or more of {}'.format(output, list(self.dataframe_outputs)))
+
+        # nulls get the code -1
+        place_codes, places = pd.factorize(df[column])
+        resolved = {}
+        place_resolutions = []
+        for place in places:
+            resolution = None
+            if isinstance(place, str):
+                key = self._key(place)
+                if key not in resolved:
+                    tier = self._resolve_tier(place, resolve_ambigious)
+                    resolved[key] = None if tier is None else self._format_resolution(*tier)
+                resolution = resolved[key]
+            place_resolutions.append(resolution)
+
+        annotated = df.copy()
+        for output in outputs:
+            dialect_column = self.dataframe_outputs[output]
+            # one extra null on the end for the rows pandas gave the code -1
+            labels = np.empty(len(places) + 1, dtype=object)
+            for place_index, resolution in enumerate(place_resolutions):
+                if resolution is not None:
+                    labels[place_index] = getattr(resolution, dialect_column)
+            column_labels = labels.take(place_codes)
+            if any(isinstance(label, list) for label in labels):
+                # rows of the same place get their own copy of list answers
+                for row_index, label in enumerate(column_labels):
+                    if isinstance(label, list):
+                        column_labels[row_index] = list(label)
+            annotated[dialect_column] = column_labels
+        return annotated
 
     def enable_nbtale_corrections(self, ignore_herøy=True) -> None:
         # NBTale has some human errors in the kommune names. I've created a mapping from the NB Tale names to what they should be
-        # this method will switch the flag so later queries use the corrected mapping and load the mapping data
+        # this method will switch the flag so later queries use the corrected mapping (loaded the first time it's used)
         # NOTE: this will only correct the input. Presumably the resource table has the correct names
         # HERØY ADDITION: There are 2 kommuner with this name. We cannot reasonably tell them apart. We can ignore the 1 speaker from here
-        self.use_nbtale_corrections = True
-        cReader = csv.reader(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'nbtale_transform.csv'
-                )
-            )
-        )
-        for row in cReader:
-            self.nbtale_corrections[row[0]] = row[1]
-        if ignore_herøy:
-            self.nbtale_corrections['herøy'] = ''
+        self._nbtale_ignore_herøy = ignore_herøy
+        self.enable_corrections('nbtale')
 
     def enable_npsc_corrections(self) -> None:
         # There are some place_of_birth's in NPSC that are either cities/towns instead of communes or are places outside of Norway
-        # this method will switch the flag so later queries use the corrected mapping and load the mapping data
+        # this method will switch the flag so later queries use the corrected mapping (loaded the first time it's used)
         # NOTE: this will only correct the input. Presumably the resource table has the correct names
-        self.use_npsc_corrections = True
-        cReader = csv.reader(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'npsc_transform.csv'
-                )
-            )
-        )
-        for row in cReader:
-            self.npsc_corrections[row[0]] = row[1]
+        self.enable_corrections('npsc')
 
     def enable_stortinget_corrections(self) -> None:
         # There are some birth_kommunes from the Stortinget API that are either cities/towns instead of kommunes or have a typo ("opdal" looking at you)
-        # this method will switch the flag so later queries use the corrected mapping and load the mapping data
+        # this method will switch the flag so later queries use the corrected mapping (loaded the first time it's used)
         # NOTE: this will only correct the input. Presumably the resource table has the correct names
-        self.use_stortinget_corrections = True
-        cReader = csv.reader(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'stortinget_transform.csv'
-                )
-            )
-        )
-        for row in cReader:
-            self.stortinget_corrections[row[0]] = row[1]
+        self.enable_corrections('stortinget')
 
     def enable_ndc_corrections(self) -> None:
         # There are some birth_kommunes from the Stortinget API that are either cities/towns instead of kommunes or have a typo ("opdal" looking at you)
-        # this method will switch the flag so later queries use the corrected mapping and load the mapping data
+        # this method will switch the flag so later queries use the corrected mapping (loaded the first time it's used)
         # NOTE: this will only correct the input. Presumably the resource table has the correct names
-        self.use_ndc_corrections = True
-        cReader = csv.reader(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'ndc_transform.csv'
-                )
-            )
-        )
-        for row in cReader:
-            self.ndc_corrections[row[0].lower()] = row[1].lower()
-
-    def _get_nbtale_correction(self, lookup_by: str) -> str:
-        if lookup_by in self.nbtale_corrections:
-            lookup_by = self.nbtale_corrections[lookup_by]
-        return lookup_by
-
-    def _get_npsc_correction(self, lookup_by: str) -> str:
-        if lookup_by in self.npsc_corrections:
-            lookup_by = self.npsc_corrections[lookup_by]
-        return lookup_by
-    
-    def _get_stortinget_correction(self, lookup_by: str) -> str:
-        if lookup_by in self.stortinget_corrections:
-            lookup_by = self.stortinget_corrections[lookup_by]
-        return lookup_by
-    
-    def _get_ndc_corrections(self, lookup_by: str) -> str:
-        if lookup_by in self.ndc_corrections:
-            lookup_by = self.ndc_corrections[lookup_by]
-        return lookup_by
+        self.enable_corrections('ndc')
+
+    def enable_corrections(self, *correction_sets) -> None:
+        # switch on any of the shipped correction sets or ones added with dialect_mapper.tables.register_corrections()
+        # whatever order they're enabled in, they're applied in priority order
+        tables.sorted_correction_sets(correction_sets)
+        self._enabled_corrections = self._enabled_corrections | set(correction_sets)
+        self._update_corrections()
+
+    def disable_corrections(self, *correction_sets) -> None:
+        self._enabled_corrections = self._enabled_corrections - set(correction_sets)
+        self._update_corrections()
+
+    @property
+    def active_corrections(self) -> tuple:
+        # the enabled correction sets in the order they are applied
+        return self._active_corrections
+
+    def _update_corrections(self) -> None:
+        # compile the enabled sets into one dict (shared by every instance with the same sets enabled)
+        self._active_corrections = tables.sorted_correction_sets(self._enabled_corrections)
+        self._corrections = tables.compose_corrections(self._active_corrections, self._nbtale_ignore_herøy)
+        self._check_cache_state()
 
     def _get_corrections(self, lookup_by: str) -> str:
-        if self.use_nbtale_corrections:
-            lookup_by = self._get_nbtale_correction(lookup_by)
-        if self.use_npsc_corrections:
-            lookup_by = self._get_npsc_correction(lookup_by)
-        if self.use_stortinget_corrections:
-            lookup_by = self._get_stortinget_correction(lookup_by)
-        if self.use_ndc_corrections:
-            lookup_by = self._get_ndc_corrections(lookup_by)
-        return lookup_by
+        # all of the enabled correction sets, applied in order, in one lookup (see _update_corrections)
+        return self._corrections.get(lookup_by, lookup_by)
+
+    def _key(self, lookup_by: str) -> str:
+        # the canonical key (see normalize.py) the indexes are built on. The spellings in the mapping CSV are
+        # looked up in a precomputed alias table, anything else is normalized (and remembered) by canonical_key()
+        try:
+            return self._key_aliases[lookup_by]
+        except KeyError:
+            key = canonical_key(lookup_by)
+        # only blank input (as before canonical keys) finds the rows with a blank column, not e.g. "-" or "_"
+        if key == '' and lookup_by.strip() != '':
+            return UNMATCHABLE_KEY
+        return key
+
+    def _lookup(self, lookup_column: str, dialect_column: str, key: str) -> list:
+        # key must already be normalized (see _key(), and corrected if needed)
+        # a new list is returned so callers can't modify the index
+        return list(self._lookup_indexes[(lookup_column, dialect_column)].get(key, ()))
+
+    def _reverse_lookup(self, dialect_column: str, lookup_column: str, dialect) -> list:
+        # the places (in lookup_column) with a dialect, see mapping_table._build_reverse_indexes() for how dialect is keyed
+        # a new list is returned so callers can't modify the index
+        return list(self._reverse_indexes[(dialect_column, lookup_column)].get(dialect, ()))
+
+    def _resolve_tier(self, lookup_by: str, resolve_ambigious='new'):
+        # Work out which lookup column an input matches and the normalized key to use with it.
+        # Every row has all of the dialect columns filled in, so the matching column is the same
+        # whichever dialect is asked for. Returns None if nothing matches
+        key = self._key(lookup_by)
+        tier = self._resolve_key_tier(key, lookup_by, resolve_ambigious)
+        if tier is None and self._fuzzy_matcher is not None and key != UNMATCHABLE_KEY:
+            # (opt in) try the municipality/county the input is most likely a misspelling of
+            fuzzy_key = self._fuzzy_matcher.match_key(self._get_corrections(key))
+            if fuzzy_key is not None:
+                tier = self._resolve_key_tier(fuzzy_key, lookup_by, resolve_ambigious)
+        return tier
+
+    def _resolve_key_tier(self, key: str, lookup_by: str, resolve_ambigious: str, stats=None):
+        # see _resolve_tier(), key is the canonical key of lookup_by. stats (an instrumentation.lookup_stats,
+        # only passed when instrumented) is told how ambigious municipalities are resolved
+        muni_key = self._get_corrections(key)
+        # see get_*_by_old_municipality for why an empty old municipality never matches
+        old_dialects = self._lookup_indexes[('old_muni', 'named_dialect')].get(muni_key, ()) if muni_key != '' else ()
+        new_dialects = self._lookup_indexes[('new_muni', 'named_dialect')].get(muni_key, ())
+
+        # same check as is_ambiguious_municipality()
+        if old_dialects and new_dialects and old_dialects != new_dialects:
+            resolve_ambigious = resolve_ambigious.lower().strip()
+            if stats is not None:
+                stats.record_ambiguity(resolve_ambigious if resolve_ambigious in ['new', 'old'] else 'unknown')
+            if resolve_ambigious in ['new', 'old']:
+                if resolve_ambigious == 'new':
+                    return ('new_muni', muni_key)
+                else:
+                    return ('old_muni', muni_key)
+            else:
+                self.misses.record(
+                    misses.UNKNOWN_RESOLVE_AMBIGIOUS, lookup_by,
+                    "Unknown way of resolving ambigious municipality for {}. Using new municipality.".format(lookup_by),
+                    {'resolve_ambigious': resolve_ambigious}
+                )
+
+        # by looking up by old municipality first we're prioritizing it. I don't have a super strong arguement as to the why,
+        # presumably old municipalities will have fewer one to many mappings. But, if we feel like going with the new municipalities
+        # is better this can easily be changed
+        if old_dialects:
+            return ('old_muni', muni_key)
+        if new_dialects:
+            return ('new_muni', muni_key)
+        # counties are never corrected
+        for lookup_column in ['old_county', 'new_county', 'new_county_2024']:
+            if key in self._lookup_indexes[(lookup_column, 'named_dialect')]:
+                return (lookup_column, key)
+        return None
+
+    def enable_fuzzy_matching(self, max_distance=2) -> None:
+        # match inputs that aren't found as they are to the municipality/county they're most likely a misspelling of
+        # (at most max_distance edits away, see fuzzy.py)
+        from .fuzzy import fuzzy_matcher
+        self._fuzzy_matcher = fuzzy_matcher(max_distance)
+        self._check_cache_state()
+    def disable_fuzzy_matching(self) -> None:
+        self._fuzzy_matcher = None
+        self._check_cache_state()
+
+    def enable_instrumentation(self, stats=None):
+        """ Count and time the lookups of this mapper (see instrumentation.py). Until this is called
+            there is no instrumentation overhead at all
+
+        Args:
+            stats (instrumentation.lookup_stats, optional): Where to record. Pass the same one to several mappers to add them up. Defaults to a new one.
+
+        Returns:
+            instrumentation.lookup_stats: The stats, also available as self.instrumentation. Use snapshot() and reset() on it
+        """
+        from . import instrumentation
+        if self.instrumentation is not None:
+            instrumentation.uninstrument(self)
+        self.instrumentation = instrumentation.lookup_stats() if stats is None else stats
+        instrumentation.instrument(self, self.instrumentation)
+        return self.instrumentation
+    def disable_instrumentation(self):
+        from . import instrumentation
+        instrumentation.uninstrument(self)
+        self.instrumentation = None
 
     def enable_fine_grained_dialect_collapse(self):
         self.collapse_fine_grained_dialects = True
+        self._check_cache_state()
     def disable_fine_grained_dialect_collapse(self):
         self.collapse_fine_grained_dialects = False
+        self._check_cache_state()
 
     def _collapse_fine_granded_dialects(self, dialect):
         if dialect in ['Østtrøndsk', 'Namdalsk', 'Uttrøndersk']:
@@ -485,30 +664,109 @@ class mapper_methods:
         else:
             return dialect
 
-    def __init__(self) -> None:
-        self.use_nbtale_corrections = False
-        self.use_npsc_corrections = False
-        self.use_stortinget_corrections = False
-        self.use_ndc_corrections = False
-        self.raw_csv_data = []
-        self.nbtale_corrections = {}
-        self.nbtale_speakers_to_named_dialects = {}
-        self.npsc_corrections = {}
-        self.stortinget_corrections = {}
-        self.ndc_corrections = {}
+    # ----------------- Shared data -----------------
+    # The mapping table, its indexes, and the corrections are loaded once per process, the first time they're
+    # used, and shared by every instance (see tables.py). These properties keep the old attribute names working
+    @property
+    def csv_tuples(self) -> tuple:
+        return tables.get_mapping_table().csv_tuples
+    @property
+    def raw_csv_data(self) -> tuple:
+        return tables.get_mapping_table().raw_csv_data
+    @property
+    def table(self):
+        return tables.get_mapping_table().table
+    @property
+    def _lookup_indexes(self) -> dict:
+        return tables.get_mapping_table().lookup_indexes
+    @property
+    def _reverse_indexes(self) -> dict:
+        return tables.get_mapping_table().reverse_indexes
+    @property
+    def _key_aliases(self) -> dict:
+        return tables.get_mapping_table().key_aliases
+    @property
+    def _place_codes(self) -> dict:
+        return tables.get_mapping_table().place_codes
+    @property
+    def _code_maps(self) -> dict:
+        return tables.get_mapping_table().code_maps
+
+    # the old per set flags, kept working on top of enable_corrections()/disable_corrections()
+    @property
+    def use_nbtale_corrections(self) -> bool:
+        return 'nbtale' in self._enabled_corrections
+    @use_nbtale_corrections.setter
+    def use_nbtale_corrections(self, use: bool) -> None:
+        if use:
+            self.enable_corrections('nbtale')
+        else:
+            self.disable_corrections('nbtale')
+    @property
+    def use_npsc_corrections(self) -> bool:
+        return 'npsc' in self._enabled_corrections
+    @use_npsc_corrections.setter
+    def use_npsc_corrections(self, use: bool) -> None:
+        if use:
+            self.enable_corrections('npsc')
+        else:
+            self.disable_corrections('npsc')
+    @property
+    def use_stortinget_corrections(self) -> bool:
+        return 'stortinget' in self._enabled_corrections
+    @use_stortinget_corrections.setter
+    def use_stortinget_corrections(self, use: bool) -> None:
+        if use:
+            self.enable_corrections('stortinget')
+        else:
+            self.disable_corrections('stortinget')
+    @property
+    def use_ndc_corrections(self) -> bool:
+        return 'ndc' in self._enabled_corrections
+    @use_ndc_corrections.setter
+    def use_ndc_corrections(self, use: bool) -> None:
+        if use:
+            self.enable_corrections('ndc')
+        else:
+            self.disable_corrections('ndc')
+    @property
+    def nbtale_ignore_herøy(self) -> bool:
+        return self._nbtale_ignore_herøy
+    @nbtale_ignore_herøy.setter
+    def nbtale_ignore_herøy(self, ignore_herøy: bool) -> None:
+        self._nbtale_ignore_herøy = ignore_herøy
+        self._update_corrections()
+
+    @property
+    def nbtale_corrections(self):
+        if not self.use_nbtale_corrections:
+            return _no_corrections
+        return tables.get_nbtale_corrections(self.nbtale_ignore_herøy)
+    @property
+    def npsc_corrections(self):
+        return tables.get_corrections('npsc') if self.use_npsc_corrections else _no_corrections
+    @property
+    def stortinget_corrections(self):
+        return tables.get_corrections('stortinget') if self.use_stortinget_corrections else _no_corrections
+    @property
+    def ndc_corrections(self):
+        return tables.get_corrections('ndc') if self.use_ndc_corrections else _no_corrections
+    @property
+    def nbtale_speakers_to_named_dialects(self):
+        return tables.get_nbtale_speakers()
+
+    def __init__(self, cache_size=4096) -> None:
+        # only flags (and an empty cache, cache_size=0 turns it off) live on the instance so creating one is cheap
+        self._resolution_cache = cache.resolution_cache(cache_size)
+        # places that can't be found are printed unless the mode is changed (see set_miss_mode)
+        self.misses = misses.miss_collector()
         self.collapse_fine_grained_dialects = False
-
-        cReader = csv.reader(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    # 'muni_county_namedDialect_numericDialect_mapping_manual_additions_renamed_2024.csv'
-                    'muni_county_namedDialect_numericDialect_mapping_manual_additions_renamed_2024_cardinals.csv'
-                )
-            )
-        )
-        for row in cReader:
-            self.raw_csv_data.append(row)
-        headers = self.raw_csv_data.pop(0)
-        csv_row_tuple = namedtuple('csv_row_tuple', headers)
-        self.csv_tuples = [csv_row_tuple(*row) for row in self.raw_csv_data]
+        self._fuzzy_matcher = None
+        # see enable_instrumentation
+        self.instrumentation = None
+        # no corrections enabled (see enable_corrections)
+        self._enabled_corrections = frozenset()
+        self._nbtale_ignore_herøy = True
+        self._active_corrections = ()
+        self._corrections = _no_corrections
+        self._cached_state = self._cache_state()
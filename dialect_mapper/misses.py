@@ -0,0 +1,97 @@
+"""
+What happens to inputs that can't be mapped to a dialect.
+
+mapper_methods used to print an ERROR line for every miss. A miss_collector can instead ignore them,
+send them to the logging module, or collect them: every distinct input (by canonical key, see normalize.py)
+with how often it was seen and the context it was first seen in, ready to be exported as a CSV or a
+correction file template (see tables.register_corrections)
+"""
+
+import csv
+import logging
+import threading
+from collections import namedtuple
+
+from .normalize import canonical_key
+
+logger = logging.getLogger('dialect_mapper')
+
+miss_modes = ['print', 'silent', 'logging', 'collect']
+
+# kinds of misses
+NOT_FOUND = 'not_found'
+UNKNOWN_RESOLVE_AMBIGIOUS = 'unknown_resolve_ambigious'
+
+# one distinct miss. context is a dict describing where it was first seen (e.g. the method and resolve_ambigious)
+miss_record = namedtuple('miss_record', ['kind', 'key', 'input', 'count', 'context'])
+
+class miss_collector:
+    '''
+    Records misses according to mode: 'print' (the old behaviour), 'silent', 'logging' (warnings on the dialect_mapper logger), or 'collect'
+    '''
+    def __init__(self, mode='print') -> None:
+        self.set_mode(mode)
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def set_mode(self, mode: str) -> None:
+        if mode not in miss_modes:
+            raise Exception('Unknown miss mode {}. Please use one of {}'.format(mode, miss_modes))
+        self.mode = mode
+
+    def record(self, kind: str, lookup_by, message: str, context=None) -> None:
+        if self.mode == 'silent':
+            return
+        if self.mode == 'print':
+            print(message)
+            return
+        if self.mode == 'logging':
+            logger.warning(message)
+            return
+        key = (kind, canonical_key(lookup_by) if isinstance(lookup_by, str) else repr(lookup_by))
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                self._records[key] = miss_record(kind, key[1], lookup_by, 1, dict(context or {}))
+            else:
+                self._records[key] = record._replace(count=record.count + 1)
+
+    def merge(self, records) -> None:
+        # add records collected elsewhere (e.g. in another process), keeping the context already seen here
+        with self._lock:
+            for record in records:
+                key = (record.kind, record.key)
+                if key in self._records:
+                    self._records[key] = self._records[key]._replace(count=self._records[key].count + record.count)
+                else:
+                    self._records[key] = record
+
+    @property
+    def records(self) -> list:
+        # most common first
+        with self._lock:
+            records = list(self._records.values())
+        return sorted(records, key=lambda record: (-record.count, record.kind, record.key))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records = {}
+
+    def to_csv(self, out_f) -> None:
+        # kind, input, key, count, and the first seen context (one column per context field)
+        records = self.records
+        context_fields = sorted(set(field for record in records for field in record.context))
+        writer = csv.writer(out_f, lineterminator='\n')
+        writer.writerow(['kind', 'input', 'key', 'count'] + context_fields)
+        for record in records:
+            writer.writerow([record.kind, record.input, record.key, record.count] + [record.context.get(field, '') for field in context_fields])
+
+    def to_corrections_csv(self, out_f) -> None:
+        # the places that weren't found as "wrong name," rows, to be filled in and used with tables.register_corrections()
+        writer = csv.writer(out_f, lineterminator='\n')
+        for record in self.records:
+            if record.kind == NOT_FOUND:
+                writer.writerow([record.input, ''])
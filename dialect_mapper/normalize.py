@@ -0,0 +1,29 @@
+"""
+Canonical keys for place names, so that spelling variants of a name find the same rows.
+
+Corpora write the same place in many ways: "Ålesund" with a precomposed or a combining ring (NFC/NFD),
+"Aalesund", "Hoeyanger" for "Høyanger", "Nord Fron" or "Nord - Fron" for "Nord-Fron", in upper case, and so on.
+canonical_key() maps all of these to the same string. The lookup indexes (see tables.py) are built on these keys.
+"""
+
+import functools
+import unicodedata
+
+# the older/ASCII spellings of æ, ø, and å
+_transliterations = (('aa', 'å'), ('oe', 'ø'), ('ae', 'æ'))
+
+# whitespace and hyphens/dashes are dropped so "Nord-Fron", "Nord Fron", and "Nordfron" are the same key
+_separators = dict.fromkeys(map(ord, ' \t\n\r\f\v   -‐‑‒–—−_'), None)
+
+@functools.lru_cache(maxsize=65536)
+def canonical_key(name: str) -> str:
+    key = unicodedata.normalize('NFC', name).lower()
+    # transliterate before dropping the separators so "Hola Aasen" doesn't become "holåasen"
+    for spelling, letter in _transliterations:
+        if spelling in key:
+            key = key.replace(spelling, letter)
+    return key.translate(_separators)
+
+# never returned by canonical_key() (every hyphen is dropped), so it doesn't match anything in the indexes. Used for
+# input that is nothing but separators, e.g. "-", which would otherwise become the key of the blank rows
+UNMATCHABLE_KEY = '-'
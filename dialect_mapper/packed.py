@@ -0,0 +1,172 @@
+"""
+Read-only dict-like indexes packed into flat numpy arrays.
+
+The lookup structures of the mapping table (see tables.mapping_table) are plain dicts in the process that
+builds them. To share them with worker processes (see tables.share_mapping_table) every index is packed into a
+handful of int32/uint8 arrays, which are written to a file and memory mapped by the workers. packed_index reads
+the mapped arrays in place, so a worker never builds (or holds a private copy of) the dicts.
+"""
+
+import numbers
+import zlib
+from collections.abc import Mapping
+
+import numpy as np
+
+# the arrays making up a packed index and their dtypes. Keys (and the strings in the values) are stored as one
+# utf-8 blob plus the offset of each string in it, values as codes into the strings, ints, or (for tuples)
+# a CSR style offset into the codes. slots is an open addressing hash table (crc32 of the key) of entry numbers
+packed_arrays = [
+    ('key_blob', np.uint8),
+    ('key_offsets', np.int32),
+    ('slots', np.int32),
+    ('values', np.int32),
+    ('value_offsets', np.int32),
+    ('string_blob', np.uint8),
+    ('string_offsets', np.int32),
+]
+# how keys and values are stored, see packed_index.pack()
+key_kinds = ['str', 'int']
+value_kinds = ['str', 'int', 'tuple']
+EMPTY_SLOT = -1
+
+def _pack_strings(strings: list) -> tuple:
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum([len(string) for string in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+class packed_index(Mapping):
+    '''
+    A read-only mapping with str (or int) keys and str, int, or tuple of str values, stored in the arrays listed
+    in packed_arrays. The arrays may be memory mapped, nothing is copied out of them until a key is looked up
+    '''
+    def __init__(self, arrays: dict, key_kind: str, value_kind: str) -> None:
+        if key_kind not in key_kinds or value_kind not in value_kinds:
+            raise Exception('Unknown packed index kind: {}, {}'.format(key_kind, value_kind))
+        self.arrays = arrays
+        self.key_kind = key_kind
+        self.value_kind = value_kind
+        # indexing a (memory mapped) numpy array one element at a time is slow, a memoryview of it isn't
+        # and still reads the same memory
+        views = {name: memoryview(np.ascontiguousarray(arrays[name], dtype=dtype).view(np.ndarray)) for name, dtype in packed_arrays}
+        self._key_blob = views['key_blob']
+        self._key_offsets = views['key_offsets']
+        self._slots = views['slots']
+        self._values = views['values']
+        self._value_offsets = views['value_offsets']
+        self._string_blob = views['string_blob']
+        self._string_offsets = views['string_offsets']
+        self._mask = len(self._slots) - 1
+        self._len = len(self._key_offsets) - 1
+
+    @classmethod
+    def pack(cls, index: dict):
+        """ Pack a dict into arrays
+
+        Args:
+            index (dict): Keys all str or all int, values all str, all int, or all tuples of str
+
+        Returns:
+            packed_index: The packed copy, iterating in the same order as index
+        """
+        keys = list(index)
+        values = list(index.values())
+        if keys and all(isinstance(key, numbers.Integral) for key in keys):
+            key_kind = 'int'
+        elif all(isinstance(key, str) for key in keys):
+            key_kind = 'str'
+        else:
+            raise Exception('The keys of a packed index must all be str or all be int')
+        if values and all(isinstance(value, numbers.Integral) for value in values):
+            value_kind = 'int'
+        elif values and all(isinstance(value, tuple) for value in values):
+            value_kind = 'tuple'
+        elif all(isinstance(value, str) for value in values):
+            value_kind = 'str'
+        else:
+            raise Exception('The values of a packed index must all be str, all be int, or all be tuples of str')
+        arrays = {}
+        encoded_keys = [str(key) for key in keys]
+        arrays['key_blob'], arrays['key_offsets'] = _pack_strings(encoded_keys)
+        # at most half full so probes stay short
+        n_slots = 1
+        while n_slots < 2 * len(keys):
+            n_slots *= 2
+        slots = np.full(n_slots, EMPTY_SLOT, dtype=np.int32)
+        for entry, key in enumerate(encoded_keys):
+            slot = zlib.crc32(key.encode('utf-8')) & (n_slots - 1)
+            while slots[slot] != EMPTY_SLOT:
+                slot = (slot + 1) & (n_slots - 1)
+            slots[slot] = entry
+        arrays['slots'] = slots
+        arrays['value_offsets'] = np.zeros(0, dtype=np.int32)
+        if value_kind == 'int':
+            arrays['values'] = np.array(values, dtype=np.int32)
+            strings = []
+        else:
+            if value_kind == 'str':
+                values = [(value,) for value in values]
+            else:
+                arrays['value_offsets'] = np.zeros(len(values) + 1, dtype=np.int32)
+                arrays['value_offsets'][1:] = np.cumsum([len(value) for value in values], dtype=np.int64)
+            strings = sorted(set([string for value in values for string in value]))
+            string_codes = {string: code for code, string in enumerate(strings)}
+            arrays['values'] = np.array([string_codes[string] for value in values for string in value], dtype=np.int32)
+        arrays['string_blob'], arrays['string_offsets'] = _pack_strings(strings)
+        for name, dtype in packed_arrays:
+            arrays[name] = np.ascontiguousarray(arrays[name], dtype=dtype)
+            arrays[name].flags.writeable = False
+        return cls(arrays, key_kind, value_kind)
+
+    def _key_bytes(self, entry: int) -> memoryview:
+        return self._key_blob[self._key_offsets[entry]:self._key_offsets[entry + 1]]
+
+    def _string(self, code: int) -> str:
+        return self._string_blob[self._string_offsets[code]:self._string_offsets[code + 1]].tobytes().decode('utf-8')
+
+    def _find(self, key) -> int:
+        # the entry number of key, or EMPTY_SLOT if it isn't in the index
+        if self.key_kind == 'int':
+            # bools are ints to a dict but shouldn't find anything here
+            if not isinstance(key, numbers.Integral) or isinstance(key, bool):
+                return EMPTY_SLOT
+            key = str(int(key))
+        elif not isinstance(key, str):
+            return EMPTY_SLOT
+        encoded = key.encode('utf-8')
+        slot = zlib.crc32(encoded) & self._mask
+        while True:
+            entry = self._slots[slot]
+            if entry == EMPTY_SLOT or self._key_bytes(entry) == encoded:
+                return entry
+            slot = (slot + 1) & self._mask
+
+    def _value(self, entry: int):
+        if self.value_kind == 'int':
+            return int(self._values[entry])
+        if self.value_kind == 'str':
+            return self._string(self._values[entry])
+        codes = self._values[self._value_offsets[entry]:self._value_offsets[entry + 1]]
+        return tuple(self._string(code) for code in codes)
+
+    def __getitem__(self, key):
+        entry = self._find(key)
+        if entry == EMPTY_SLOT:
+            raise KeyError(key)
+        return self._value(entry)
+
+    def get(self, key, default=None):
+        entry = self._find(key)
+        return default if entry == EMPTY_SLOT else self._value(entry)
+
+    def __contains__(self, key) -> bool:
+        return self._find(key) != EMPTY_SLOT
+
+    def __iter__(self):
+        for entry in range(self._len):
+            key = self._key_bytes(entry).tobytes().decode('utf-8')
+            yield int(key) if self.key_kind == 'int' else key
+
+    def __len__(self) -> int:
+        return self._len
@@ -1,14 +1,16 @@
+import concurrent.futures
+import hashlib
 import json
 import matplotlib as mpl
 import matplotlib.colors as mpl_colors
 import os
 import re
-from shapely import Polygon, MultiPolygon, affinity
+import shapely
+import tempfile
+from collections import deque, namedtuple
+from shapely import affinity
 
-import math
-from numpy import log as ln
-
-import cairosvg
+import numpy as np
 
 import sys
 if sys.version_info[0] < 3: 
@@ -22,6 +24,90 @@ except ImportError:
     import importlib_resources as pkg_resources
 
 from . import mapping_data
+from .geometry_cache import default_geometry_cache, geometry_cache, geometry_key, projected_layer
+
+# the map layers that can be plotted: layer -> (the plotter_methods attribute holding its geoJSON, the file it's read from)
+layers = {
+    'dialekter': ('dialekter_json', 'dialekter_geojson.json'),
+    'card4': ('card4_dialekter_json', 'card4_region_geojson.json'),
+    'card5': ('card5_dialekter_json', 'card5_region_geojson.json'),
+    'kommuner': ('kommuner_json', 'kommuner_komprimert.json'),
+    'rundkast': ('region_json', 'rundkast_regions_geojson.json'),
+}
+
+# the layers' geoJSON is only read the first time a plotter_methods needs it (see plotter_methods.__getattr__):
+# attribute -> file
+_geojson_files = {attribute: file_name for attribute, file_name in layers.values()}
+
+# stands in for the fill color in the SVG templates (see plotter_methods._build_svg_templates)
+_fill_placeholder = '{fill_color}'
+
+output_formats = ('svg', 'png', 'pdf')
+
+def _output_format(output_path) -> str:
+    # plot_* methods save PNG or PDF files if the path ends in .png or .pdf, otherwise SVG
+    output_path = str(output_path)
+    if output_path[-4:] == '.png':
+        return 'png'
+    if output_path[-4:] == '.pdf':
+        return 'pdf'
+    return 'svg'
+
+# file name -> sha256 of the file in mapping_data (render workers are given the parent's, see _init_render_worker)
+_file_digests = {}
+
+def _file_digest(file_name: str) -> str:
+    if file_name not in _file_digests:
+        _file_digests[file_name] = hashlib.sha256(pkg_resources.read_binary(mapping_data, file_name)).hexdigest()
+    return _file_digests[file_name]
+
+# ----------------- batch rendering (see plotter_methods.render_batch) -----------------
+# output is a path, a file-like object, or None (return the bytes). style holds the keyword arguments of the layer's
+# render_* method (e.g. color_map_name, final_width, or output_format)
+render_job = namedtuple('render_job', ['layer', 'values', 'output', 'style'])
+
+layer_render_methods = {
+    'dialekter': 'render_dialect_regions',
+    'card4': 'render_card4_dialect_regions',
+    'card5': 'render_card5_dialect_regions',
+    'kommuner': 'render_kommune_regions',
+    'rundkast': 'render_rundkast_regions',
+}
+
+def _layer_geometry(layer, style) -> tuple:
+    # the (layer, final_width, final_height, split_norway, rotate_norway, stroke_width) the layer's render_* method
+    # projects the layer and builds its SVG templates with, given the job's style
+    style = style or {}
+    final_width = float(style.get('final_width', '500'))
+    final_height = float(style.get('final_height', '500'))
+    if layer == 'rundkast':
+        return (layer, final_width, final_height, style.get('split_norway', False), style.get('rotate_norway', False), style.get('stroke_width', 0.025))
+    if layer in ['kommuner', 'card4', 'card5']:
+        # these have always been projected with the width and height the other way around
+        return (layer, final_height, final_width, False, False, 0.025)
+    return (layer, final_width, final_height, False, False, 0.025)
+
+def _render_job(plotter, layer, values, output, style):
+    # output is a path or None here, file-like outputs are written by the caller
+    style = dict(style or {})
+    if output is not None:
+        style.setdefault('output_format', _output_format(output))
+    return getattr(plotter, layer_render_methods[layer])(values, write_to=output, **style)
+
+_worker_plotter = None
+
+def _init_render_worker(cache_dir, svg_templates, file_digests, latitude_southern_adjustment, longitude_southern_adjustment) -> None:
+    # one plotter per worker process, loading the projected layers the parent saved to cache_dir and starting with the
+    # parent's SVG templates and file digests, so the worker never reads (or parses) the geoJSON files itself
+    global _worker_plotter
+    _file_digests.update(file_digests)
+    _worker_plotter = plotter_methods(geometry_cache(cache_dir))
+    _worker_plotter.geometry_cache.add_svg_templates(svg_templates)
+    _worker_plotter.latitude_southern_adjustment = latitude_southern_adjustment
+    _worker_plotter.longitude_southern_adjustment = longitude_southern_adjustment
+
+def _render_worker_job(layer, values, output, style):
+    return _render_job(_worker_plotter, layer, values, output, style)
 
 class ColorMap():
     '''
@@ -72,6 +158,7 @@ class plotter_methods:
         Therefore we want a way of converting them into a more standard projection
         We're uusing the Mercator projection
         Implementation copied from https://stackoverflow.com/questions/14329691/convert-latitude-longitude-point-to-a-pixels-x-y-on-mercator-projection
+        Works on single values as well as on numpy arrays of latitudes and longitudes
         """
         if move_south:
             latitude = latitude - self.latitude_southern_adjustment
@@ -80,39 +167,47 @@ class plotter_methods:
         x = (longitude + 180) * (mapWidth / 360)
 
         # convert from degrees to radians
-        latRad = (latitude * math.pi) / 180
+        latRad = (latitude * np.pi) / 180
 
         # get y value
-        mercN = ln(math.tan((math.pi / 4) + (latRad / 2)))
-        y     = (mapHeight / 2) - (mapWidth * mercN / (2 * math.pi))
+        mercN = np.log(np.tan((np.pi / 4) + (latRad / 2)))
+        y     = (mapHeight / 2) - (mapWidth * mercN / (2 * np.pi))
         
         return x, y
 
     def _create_poly(self, obj, final_width, final_height, move_south=False):
-        # convert all lat/lon pairs into x and y 
-        obj = [[self._convert_latlon_to_xy(pair[1], pair[0], mapWidth=final_width, mapHeight=final_height, move_south=move_south) for pair in shape] for shape in obj]
-        if len(obj) > 1:
-            return Polygon(obj[0], holes=obj[1:])
-        else:
-            return Polygon(obj[0])
-
-    def _process_features(self, features, get_color, final_width, final_height, split_norway=False, rotate_norway=False, stroke_width=0.025):
-        svg_list = []
-        min_x = None
-        min_y = None
-        max_x = None
-        max_y = None
-        for region_features in features:
-            if split_norway and region_features['properties']['navn'] in self.northern_regions:
-                region_multiPolygon = MultiPolygon(
-                    [self._create_poly(obj, final_width, final_height, move_south=True) for obj in region_features['geometry']['coordinates']]
-                )
-            else:    
-                region_multiPolygon = MultiPolygon(
-                    [self._create_poly(obj, final_width, final_height) for obj in region_features['geometry']['coordinates']]
+        # obj is a GeoJSON polygon: the outer ring followed by any holes, as lon/lat pairs
+        return self._create_multipolygons([[obj]], final_width, final_height, [move_south])[0].geoms[0]
+
+    def _create_multipolygons(self, multipolygon_coordinates, final_width, final_height, move_south):
+        # multipolygon_coordinates is a list of GeoJSON MultiPolygon coordinates and move_south says, for each of them, whether
+        # to shift it south. Every lon/lat pair (of every ring of every polygon) goes into one array that is projected in a single
+        # vectorized step, and the rings, polygons, and multipolygons are then cut out of the projected array by index rather than
+        # being built point by point
+        polygons = [obj for coordinates in multipolygon_coordinates for obj in coordinates]
+        rings = [ring for obj in polygons for ring in obj]
+        multipolygon_sizes = [len(coordinates) for coordinates in multipolygon_coordinates]
+        polygon_sizes = [len(obj) for obj in polygons]
+        ring_sizes = [len(ring) for ring in rings]
+
+        lonlat = np.array([pair[:2] for ring in rings for pair in ring], dtype=np.float64)
+        point_move_south = np.repeat(np.repeat(np.repeat(np.array(move_south, dtype=bool), multipolygon_sizes), polygon_sizes), ring_sizes)
+        x = np.empty(len(lonlat))
+        y = np.empty(len(lonlat))
+        for shift in (False, True):
+            points = point_move_south == shift
+            if points.any():
+                x[points], y[points] = self._convert_latlon_to_xy(
+                    lonlat[points, 1], lonlat[points, 0], mapWidth=final_width, mapHeight=final_height, move_south=shift
                 )
-                if rotate_norway:
-                    region_multiPolygon = affinity.rotate(region_multiPolygon, -30, origin=(0, 9))
+
+        linearrings = shapely.linearrings(np.column_stack((x, y)), indices=np.repeat(np.arange(len(rings)), ring_sizes))
+        polygons = shapely.polygons(linearrings, indices=np.repeat(np.arange(len(polygons)), polygon_sizes))
+        return list(shapely.multipolygons(polygons, indices=np.repeat(np.arange(len(multipolygon_coordinates)), multipolygon_sizes)))
+
+    def _region_names(self, features) -> list:
+        region_names = []
+        for region_features in features:
             region_name = region_features['properties']['navn']
             # ugly way of dealing with our 1 problematic kommune
             if 'Herøy' in region_name:
@@ -120,43 +215,126 @@ class plotter_methods:
                     region_name += '_Helgelandsk'
                 else:
                     region_name += '_Nordvestlandsk'
-            if get_color(region_name):
-                svg_list.append(
-                    self.stroke_width_pat.sub(
-                        'stroke-width="{}"'.format(str(stroke_width)),
-                        region_multiPolygon.svg(fill_color=get_color(region_name), opacity=1)
-                    )   
-                )
-            else:
-                svg_list.append(
-                    self.stroke_width_pat.sub(
-                        'stroke-width="{}"'.format(str(stroke_width)),
-                        region_multiPolygon.svg(fill_color='#ffffff', opacity=1)
-                    )   
-                )
-            mp_bounds = region_multiPolygon.bounds
-            if min_x == None:
-                min_x = mp_bounds[0]
-            if min_y == None:
-                min_y = mp_bounds[1]
-            if max_x == None:
-                max_x = mp_bounds[2]
-            if max_y == None:
-                max_y = mp_bounds[3]
-            
-            if mp_bounds[0] < min_x:
-                min_x = mp_bounds[0]
-            if mp_bounds[1] < min_y:
-                min_y = mp_bounds[1]
-            if mp_bounds[2] > max_x:
-                max_x = mp_bounds[2]
-            if mp_bounds[3] > max_y:
-                max_y = mp_bounds[3]
-
-        width = max_x - min_x
-        height = max_y - min_y
+            region_names.append(region_name)
+        return region_names
+
+    def _project_layer(self, layer, final_width, final_height, split_norway=False, rotate_norway=False) -> projected_layer:
+        features = getattr(self, layers[layer][0])['features']
+        moved_south = [split_norway and region_features['properties']['navn'] in self.northern_regions for region_features in features]
+        # project the whole layer at once (see _create_multipolygons)
+        region_multiPolygons = self._create_multipolygons(
+            [region_features['geometry']['coordinates'] for region_features in features], final_width, final_height, moved_south
+        )
+        if rotate_norway:
+            region_multiPolygons = [
+                region_multiPolygon if moved else affinity.rotate(region_multiPolygon, -30, origin=(0, 9))
+                for region_multiPolygon, moved in zip(region_multiPolygons, moved_south)
+            ]
+        min_x, min_y, max_x, max_y = shapely.total_bounds(region_multiPolygons).tolist()
+        return projected_layer(tuple(self._region_names(features)), tuple(region_multiPolygons), (min_x, min_y, max_x - min_x, max_y - min_y))
+
+    def _source_digest(self, layer, split_norway=False) -> str:
+        # everything the projected geometry of the layer depends on, apart from what's in its geometry_key
+        digest = _file_digest(layers[layer][1])
+        if split_norway:
+            digest += repr((self.latitude_southern_adjustment, self.longitude_southern_adjustment, sorted(self.northern_regions)))
+        return digest
+
+    def get_projected_layer(self, layer, final_width, final_height, split_norway=False, rotate_norway=False) -> projected_layer:
+        """ The projected (and rotated) region geometries of a map layer, from the geometry cache
+
+        Args:
+            layer (str): One of "dialekter", "card4", "card5", "kommuner", or "rundkast"
+            final_width (float): The map width the layer is projected for
+            final_height (float): The map height the layer is projected for
+            split_norway (bool, optional): Move the northern regions south. Defaults to False.
+            rotate_norway (bool, optional): Rotate the (southern) regions. Defaults to False.
+
+        Returns:
+            projected_layer: The region names, their multipolygons, and the (min_x, min_y, width, height) bounds of the layer
+        """
+        if layer not in layers:
+            raise Exception('Unknown layer {}. Please use one of {}'.format(layer, list(layers)))
+        key = geometry_key(layer, float(final_width), float(final_height), bool(split_norway), bool(rotate_norway))
+        return self.geometry_cache.get(
+            key,
+            self._source_digest(layer, split_norway=split_norway),
+            lambda: self._project_layer(*key)
+        )
+
+    def _build_svg_templates(self, projected: projected_layer, stroke_width) -> tuple:
+        # the SVG of every region split at its fill color(s), so coloring a region is just color.join(template)
+        # rather than serializing its geometry again. The placeholder can't be in the SVG otherwise (it's all numbers)
+        templates = []
+        for region_multiPolygon in projected.multipolygons:
+            region_svg = self.stroke_width_pat.sub(
+                'stroke-width="{}"'.format(str(stroke_width)),
+                region_multiPolygon.svg(fill_color=_fill_placeholder, opacity=1)
+            )
+            templates.append(tuple(region_svg.split(_fill_placeholder)))
+        return tuple(templates)
+
+    def get_svg_templates(self, layer, final_width, final_height, split_norway=False, rotate_norway=False, stroke_width=0.025) -> tuple:
+        # the (cached) SVG templates of a layer's regions, in the same order as get_projected_layer()'s region_names
+        projected = self.get_projected_layer(layer, final_width, final_height, split_norway=split_norway, rotate_norway=rotate_norway)
+        key = geometry_key(layer, float(final_width), float(final_height), bool(split_norway), bool(rotate_norway))
+        return self.geometry_cache.get_svg_templates(
+            key,
+            self._source_digest(layer, split_norway=split_norway),
+            stroke_width,
+            lambda: self._build_svg_templates(projected, stroke_width)
+        )
+
+    def _process_features(self, layer, get_color, final_width, final_height, split_norway=False, rotate_norway=False, stroke_width=0.025):
+        projected = self.get_projected_layer(layer, final_width, final_height, split_norway=split_norway, rotate_norway=rotate_norway)
+        templates = self.get_svg_templates(
+            layer, final_width, final_height, split_norway=split_norway, rotate_norway=rotate_norway, stroke_width=stroke_width
+        )
+        # regions without a color are left white
+        svg_list = [(get_color(region_name) or '#ffffff').join(template) for region_name, template in zip(projected.region_names, templates)]
+        min_x, min_y, width, height = projected.bounds
         return svg_list, min_x, min_y, width, height
 
+    def _svg_document(self, final_width, final_height, min_x, min_y, width, height, svg_list: list) -> str:
+        return self.head_bit.format(
+            str(final_width),
+            str(final_height),
+            min_x, 
+            min_y, 
+            width, 
+            height ) + ''.join(svg_list) + self.end_bit
+
+    def _render_output(
+        self,
+        output_format: str,
+        write_to,
+        final_width: int,
+        final_height: int,
+        min_x: float,
+        min_y: float,
+        width: float,
+        height: float,
+        svg_list: list):
+        # the map as SVG, PNG, or PDF bytes, or None if it's written to write_to (a path or a file-like object) instead.
+        # Nothing is written to disk unless write_to is a path
+        if output_format not in output_formats:
+            raise Exception('Unknown output format {}. Please use one of {}'.format(output_format, output_formats))
+        svg_bytes = self._svg_document(final_width, final_height, min_x, min_y, width, height, svg_list).encode('utf-8')
+        if output_format == 'svg':
+            if write_to is None:
+                return svg_bytes
+            if isinstance(write_to, (str, os.PathLike)):
+                with open(write_to, 'wb') as open_f:
+                    open_f.write(svg_bytes)
+            else:
+                write_to.write(svg_bytes)
+            return None
+        # only needed (and only imported) when rasterizing. It also needs the system cairo library
+        import cairosvg
+        if output_format == 'png':
+            return cairosvg.svg2png(bytestring=svg_bytes, write_to=write_to)
+        return cairosvg.svg2pdf(bytestring=svg_bytes, write_to=write_to)
+
     def _save_output(
         self,
         output_path: str,
@@ -167,37 +345,7 @@ class plotter_methods:
         width: float,
         height: float,
         svg_list: list):
-        
-        output_png = False
-        output_pdf = False
-        if output_path[-4:] == ".png":
-            output_svg_filepath = output_path[:-4] + ".svg"
-            output_png = True
-        elif output_path[-4:] == ".pdf":
-            output_svg_filepath = output_path[:-4] + ".svg"
-            output_pdf = True
-        else:
-            output_svg_filepath = output_path
-        
-        with open(output_svg_filepath, 'w') as open_f:
-            open_f.write(
-                self.head_bit.format(
-                    str(final_width),
-                    str(final_height),
-                    min_x, 
-                    min_y, 
-                    width, 
-                    height ) + 
-                ''.join(svg_list) + 
-                self.end_bit
-            )
-        
-        if output_png:
-            cairosvg.svg2png(url=output_svg_filepath, write_to=output_path)
-            os.remove(output_svg_filepath)
-        if output_pdf:
-            cairosvg.svg2pdf(url=output_svg_filepath, write_to=output_path)
-            os.remove(output_svg_filepath)
+        self._render_output(_output_format(output_path), output_path, final_width, final_height, min_x, min_y, width, height, svg_list)
     
     def plot_kommune_regions(
         self, 
@@ -209,6 +357,38 @@ class plotter_methods:
         default_color='#66cc99', 
         final_width='500', 
         final_height='500'):
+        self.render_kommune_regions(
+            kommune_region_to_value=kommune_region_to_value,
+            color_map_name=color_map_name,
+            color_map_levels=color_map_levels,
+            max_region_value=max_region_value,
+            default_color=default_color,
+            final_width=final_width,
+            final_height=final_height,
+            output_format=_output_format(output_svg_filepath),
+            write_to=output_svg_filepath
+        )
+
+    def render_kommune_regions(
+        self, 
+        kommune_region_to_value={}, 
+        color_map_name='Blues', 
+        color_map_levels=50, 
+        max_region_value=30, 
+        default_color='#66cc99', 
+        final_width='500', 
+        final_height='500',
+        output_format='svg',
+        write_to=None):
+        """ Like plot_kommune_regions() but returns the map (or writes it to write_to) instead of saving it to a file path
+
+        Args:
+            output_format (str, optional): "svg", "png", or "pdf". Defaults to "svg".
+            write_to (optional): A file-like object (or path) to write the map to. Defaults to None.
+
+        Returns:
+            bytes: The map, or None if it was written to write_to
+        """
 
         final_width = float(final_width)
         final_height = float(final_height)
@@ -219,13 +399,14 @@ class plotter_methods:
             else:
                 return default_color
         svg_list, min_x, min_y, width, height = self._process_features(
-            self.kommuner_json['features'], 
+            'kommuner',
             get_color,
             final_height,
             final_width
             )
-        self._save_output(
-            output_svg_filepath,
+        return self._render_output(
+            output_format,
+            write_to,
             final_width, 
             final_height,
             min_x, 
@@ -245,6 +426,30 @@ class plotter_methods:
         default_color='#66cc99', 
         final_width='500', 
         final_height='500'):
+        self.render_card4_dialect_regions(
+            dia_region_to_value=dia_region_to_value,
+            color_map_name=color_map_name,
+            color_map_levels=color_map_levels,
+            max_region_value=max_region_value,
+            default_color=default_color,
+            final_width=final_width,
+            final_height=final_height,
+            output_format=_output_format(output_svg_filepath),
+            write_to=output_svg_filepath
+        )
+
+    def render_card4_dialect_regions(
+        self, 
+        dia_region_to_value={}, 
+        color_map_name='Blues', 
+        color_map_levels=50, 
+        max_region_value=30, 
+        default_color='#66cc99', 
+        final_width='500', 
+        final_height='500',
+        output_format='svg',
+        write_to=None):
+        # see render_kommune_regions()
 
         final_width = float(final_width)
         final_height = float(final_height)
@@ -258,13 +463,14 @@ class plotter_methods:
             else:
                 return default_color
         svg_list, min_x, min_y, width, height = self._process_features(
-            self.card4_dialekter_json['features'], 
+            'card4',
             get_color,
             final_height,
             final_width
             )
-        self._save_output(
-            output_svg_filepath,
+        return self._render_output(
+            output_format,
+            write_to,
             final_width, 
             final_height,
             min_x, 
@@ -284,6 +490,30 @@ class plotter_methods:
         default_color='#66cc99', 
         final_width='500', 
         final_height='500'):
+        self.render_card5_dialect_regions(
+            dia_region_to_value=dia_region_to_value,
+            color_map_name=color_map_name,
+            color_map_levels=color_map_levels,
+            max_region_value=max_region_value,
+            default_color=default_color,
+            final_width=final_width,
+            final_height=final_height,
+            output_format=_output_format(output_svg_filepath),
+            write_to=output_svg_filepath
+        )
+
+    def render_card5_dialect_regions(
+        self, 
+        dia_region_to_value={}, 
+        color_map_name='Blues', 
+        color_map_levels=50, 
+        max_region_value=30, 
+        default_color='#66cc99', 
+        final_width='500', 
+        final_height='500',
+        output_format='svg',
+        write_to=None):
+        # see render_kommune_regions()
 
         final_width = float(final_width)
         final_height = float(final_height)
@@ -297,13 +527,14 @@ class plotter_methods:
             else:
                 return default_color
         svg_list, min_x, min_y, width, height = self._process_features(
-            self.card5_dialekter_json['features'], 
+            'card5',
             get_color,
             final_height,
             final_width
             )
-        self._save_output(
-            output_svg_filepath,
+        return self._render_output(
+            output_format,
+            write_to,
             final_width, 
             final_height,
             min_x, 
@@ -323,6 +554,30 @@ class plotter_methods:
         default_color='#66cc99', 
         final_width='500', 
         final_height='500'):
+        self.render_dialect_regions(
+            dialect_region_to_value=dialect_region_to_value,
+            color_map_name=color_map_name,
+            color_map_levels=color_map_levels,
+            max_region_value=max_region_value,
+            default_color=default_color,
+            final_width=final_width,
+            final_height=final_height,
+            output_format=_output_format(output_svg_filepath),
+            write_to=output_svg_filepath
+        )
+
+    def render_dialect_regions(
+        self, 
+        dialect_region_to_value={}, 
+        color_map_name='Blues', 
+        color_map_levels=50, 
+        max_region_value=30, 
+        default_color='#66cc99', 
+        final_width='500', 
+        final_height='500',
+        output_format='svg',
+        write_to=None):
+        # see render_kommune_regions()
 
         cmap = ColorMap(color_map_name, levels=color_map_levels)
         def get_color(dialect_name):
@@ -334,13 +589,14 @@ class plotter_methods:
         final_width = float(final_width)
         final_height = float(final_height)
         svg_list, min_x, min_y, width, height = self._process_features(
-            self.dialekter_json['features'], 
+            'dialekter',
             get_color,
             final_width,
             final_height
         )
-        self._save_output(
-            output_svg_filepath,
+        return self._render_output(
+            output_format,
+            write_to,
             final_width, 
             final_height,
             min_x, 
@@ -364,6 +620,37 @@ class plotter_methods:
         rotate_norway=False,
         stroke_width=0.025
     ):
+        self.render_rundkast_regions(
+            rundkast_region_to_value=rundkast_region_to_value,
+            color_map_name=color_map_name,
+            color_map_levels=color_map_levels,
+            max_region_value=max_region_value,
+            default_color=default_color,
+            final_width=final_width,
+            final_height=final_height,
+            split_norway=split_norway,
+            rotate_norway=rotate_norway,
+            stroke_width=stroke_width,
+            output_format=_output_format(output_svg_filepath),
+            write_to=output_svg_filepath
+        )
+
+    def render_rundkast_regions(
+        self, 
+        rundkast_region_to_value={}, 
+        color_map_name='Blues', 
+        color_map_levels=50, 
+        max_region_value=30, 
+        default_color='#66cc99', 
+        final_width='500', 
+        final_height='500',
+        split_norway=False,
+        rotate_norway=False,
+        stroke_width=0.025,
+        output_format='svg',
+        write_to=None
+    ):
+        # see render_kommune_regions()
 
         cmap = ColorMap(color_map_name, levels=color_map_levels)
         def get_color(region_name):
@@ -375,7 +662,7 @@ class plotter_methods:
         final_width = float(final_width)
         final_height = float(final_height)
         svg_list, min_x, min_y, width, height = self._process_features(
-            self.region_json['features'], 
+            'rundkast',
             get_color,
             final_width,
             final_height,
@@ -383,8 +670,9 @@ class plotter_methods:
             rotate_norway=rotate_norway,
             stroke_width=stroke_width
         )
-        self._save_output(
-            output_svg_filepath,
+        return self._render_output(
+            output_format,
+            write_to,
             final_width, 
             final_height,
             min_x, 
@@ -394,48 +682,92 @@ class plotter_methods:
             svg_list
         )
         
-    def __init__(self) -> None:
-        ### Original geoJSON data from https://github.com/robhop/fylker-og-kommuner-2020
-        self.dialekter_json = json.load(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'dialekter_geojson.json'
-                )
-            )
-        )
-        self.card4_dialekter_json = json.load(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'card4_region_geojson.json'
-                )
-            )
-        )
-        self.card5_dialekter_json = json.load(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'card5_region_geojson.json'
-                )
-            )
-        )
-        self.kommuner_json = json.load(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'kommuner_komprimert.json'
-                )
-            )
-        )
-        self.region_json = json.load(
-            StringIO(
-                pkg_resources.read_text(
-                    mapping_data, 
-                    'rundkast_regions_geojson.json'
-                )
+    def render_batch(self, jobs, workers=None, max_pending=None, progress=None) -> list:
+        """ Render many maps, rasterizing them in a pool of worker processes
+
+        The layers (and their SVG templates) are built once, in this process, and handed to the workers: the projected layers
+        through a directory of the geometry cache (its own directory if it has one, otherwise a temporary one), the templates
+        when the workers start
+
+        Args:
+            jobs (list): render_job(layer, values, output, style) tuples. layer is one of "dialekter", "card4", "card5", "kommuner",
+                or "rundkast", values the region -> value dict, output a path, a file-like object, or None, and style a dict of
+                keyword arguments for the layer's render_* method (or None)
+            workers (int, optional): The number of worker processes, 1 renders in this process. Defaults to the number of CPUs.
+            max_pending (int, optional): The most maps being rendered (or waiting to be written) at once. Defaults to 2 per worker.
+            progress (callable, optional): Called with (maps done, total maps) after every map. Defaults to None.
+
+        Returns:
+            list: For every job, the map's bytes if output was None, otherwise None
+        """
+        jobs = [render_job(*job) for job in jobs]
+        for job in jobs:
+            if job.layer not in layer_render_methods:
+                raise Exception('Unknown layer {}. Please use one of {}'.format(job.layer, list(layer_render_methods)))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        max_pending = max(1, 2 * workers if max_pending is None else max_pending)
+        results = [None] * len(jobs)
+
+        def finish(job_index, rendered):
+            # paths were written by the renderer, file-like outputs get the bytes here
+            output = jobs[job_index].output
+            if output is None:
+                results[job_index] = rendered
+            elif not isinstance(output, (str, os.PathLike)):
+                output.write(rendered)
+            if progress is not None:
+                progress(job_index + 1, len(jobs))
+
+        def finish_oldest(pending):
+            job_index, future = pending.popleft()
+            finish(job_index, future.result())
+
+        def worker_output(output):
+            return output if isinstance(output, (str, os.PathLike)) else None
+
+        if workers <= 1:
+            for job_index, job in enumerate(jobs):
+                finish(job_index, _render_job(self, job.layer, job.values, worker_output(job.output), job.style))
+            return results
+
+        # project every layer (and size/split/rotate) the jobs need, and build its SVG templates, once, here, rather than in every worker
+        svg_templates = {}
+        for layer, final_width, final_height, split_norway, rotate_norway, stroke_width in dict.fromkeys(
+            _layer_geometry(job.layer, job.style) for job in jobs
+        ):
+            key = geometry_key(layer, final_width, final_height, bool(split_norway), bool(rotate_norway))
+            templates = self.get_svg_templates(
+                layer, final_width, final_height, split_norway=split_norway, rotate_norway=rotate_norway, stroke_width=stroke_width
             )
-        )
+            svg_templates[(key, stroke_width)] = (self._source_digest(layer, split_norway=split_norway), templates)
+        file_digests = {layers[layer][1]: _file_digest(layers[layer][1]) for layer in set(job.layer for job in jobs)}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = self.geometry_cache.cache_dir or tmp_dir
+            # only the layers of these jobs, the (shared) cache may hold many more
+            self.geometry_cache.save(cache_dir, keys=set(key for key, _ in svg_templates))
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_render_worker,
+                initargs=(cache_dir, svg_templates, file_digests, self.latitude_southern_adjustment, self.longitude_southern_adjustment)
+            ) as executor:
+                # at most max_pending maps are submitted ahead of the ones being finished (in order), so memory stays
+                # bounded however many jobs there are
+                pending = deque()
+                for job_index, job in enumerate(jobs):
+                    if len(pending) >= max_pending:
+                        finish_oldest(pending)
+                    pending.append((job_index, executor.submit(_render_worker_job, job.layer, job.values, worker_output(job.output), job.style)))
+                while pending:
+                    finish_oldest(pending)
+        return results
+
+    def __init__(self, geometry_cache=None) -> None:
+        # projected geometries are shared by all plotters unless they're given their own geometry_cache.geometry_cache
+        # (e.g. one that is kept on disk)
+        self.geometry_cache = default_geometry_cache if geometry_cache is None else geometry_cache
+        ### Original geoJSON data from https://github.com/robhop/fylker-og-kommuner-2020
+        # (the layers are read when first used, see __getattr__)
         self.northern_regions = json.load(
             StringIO(
                 pkg_resources.read_text(
@@ -450,3 +782,12 @@ class plotter_methods:
         self.stroke_width_pat = re.compile('stroke-width=".*?"')
         self.head_bit = '''<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{}" height="{}" viewBox="{} {} {} {}" preserveAspectRatio="xMinYMin meet">'''
         self.end_bit = '''</svg>'''
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't set: reads a layer's geoJSON (e.g. self.kommuner_json) the first time it's
+        # used, so plotters whose layers come from the geometry cache (e.g. render_batch's workers) never parse the files
+        if name not in _geojson_files:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        geojson = json.load(StringIO(pkg_resources.read_text(mapping_data, _geojson_files[name])))
+        setattr(self, name, geojson)
+        return geojson
@@ -0,0 +1,85 @@
+"""
+A pre-built (pickled) copy of the mapping data so it doesn't have to be parsed on every cold start.
+
+The snapshot holds the mapping table with its lookup indexes, the correction tables, and the speaker
+tables of the corpora shipped in the package (NB Tale). It records a digest of every CSV it was built
+from and is only used if the format matches and the CSVs haven't changed since, otherwise the CSVs are parsed as normal.
+
+Rebuild it after editing any of the CSVs (or the structures in tables.py) with
+
+    python -m dialect_mapper.snapshot
+"""
+
+import hashlib
+import os
+import pickle
+import warnings
+try:
+    import importlib.resources as pkg_resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as pkg_resources
+
+from . import mapping_data
+from . import speakers
+from . import tables
+
+# bump this whenever the pickled structures change so old snapshots are ignored
+SNAPSHOT_FORMAT = 6
+snapshot_file = 'mapping_snapshot.pickle'
+
+def source_files() -> list:
+    return (
+        [tables.mapping_file] +
+        [file_name for file_name, _ in tables.correction_files.values()] +
+        tables.nbtale_speaker_files
+    )
+
+def source_digests() -> dict:
+    return {
+        file_name: hashlib.sha256(pkg_resources.read_binary(mapping_data, file_name)).hexdigest()
+        for file_name in source_files()
+    }
+
+def build_snapshot(path=None) -> str:
+    """ Parse the CSVs, build the lookup structures, and pickle all of it
+
+    Args:
+        path (str, optional): Where to write the snapshot. Defaults to the one shipped in mapping_data.
+
+    Returns:
+        str: The path written to
+    """
+    if path is None:
+        path = os.path.join(os.path.dirname(mapping_data.__file__), snapshot_file)
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'sources': source_digests(),
+        'mapping_table': tables.mapping_table.from_csv(),
+        'corrections': {correction_set: dict(tables.load_corrections(correction_set)) for correction_set in tables.correction_files},
+        'speaker_tables': {
+            name: speakers.parse_speaker_files(corpus) for name, corpus in speakers.speaker_corpora.items() if corpus.in_package
+        },
+    }
+    with open(path, 'wb') as open_f:
+        pickle.dump(snapshot, open_f, protocol=4)
+    return path
+
+def load_snapshot():
+    # the shipped snapshot, or None if it is missing, can't be read, or is stale
+    try:
+        snapshot = pickle.loads(pkg_resources.read_binary(mapping_data, snapshot_file))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        warnings.warn('Could not read the mapping data snapshot ({}). Parsing the CSV files instead'.format(e))
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+        return None
+    if snapshot.get('sources') != source_digests():
+        warnings.warn('The mapping data snapshot is out of date. Parsing the CSV files instead (rebuild it with `python -m dialect_mapper.snapshot`)')
+        return None
+    return snapshot
+
+if __name__ == '__main__':
+    print('wrote {}'.format(build_snapshot()))
@@ -0,0 +1,166 @@
+"""
+Speaker metadata of corpora, indexed by speaker ID.
+
+A corpus is registered with its speaker metadata files, the name of the speaker ID column, and the columns to keep.
+The files are parsed by column name (so the column order doesn't matter) the first time a corpus is used, once per
+process. Corpora outside the package can also be given an index_path: the parsed table is then pickled there the first
+time and only rebuilt when the files change. The NB Tale speakers (see get_nbtale_named_dialect_from_id) are built in.
+
+    from dialect_mapper import speakers
+
+    speakers.register_speaker_corpus('npsc', ['npsc_speakers.csv'], 'speaker_id', ['birthplace'], index_path='npsc_speakers.pickle')
+    birthplaces = speakers.lookup('npsc', speaker_ids, 'birthplace')
+"""
+
+import csv
+import os
+import pickle
+import types
+import warnings
+from collections import namedtuple
+
+from . import tables
+
+# columns: output name -> column name in the files. in_package: whether files are in mapping_data rather than paths
+speaker_corpus = namedtuple('speaker_corpus', ['name', 'files', 'id_column', 'columns', 'in_package', 'index_path'])
+
+class speaker_table:
+    '''
+    The kept columns of a corpus' speaker metadata, by speaker ID. Speakers in more than one file get the values from the last one
+    '''
+    def __init__(self, columns: list, rows: dict) -> None:
+        self.columns = tuple(columns)
+        self.rows = rows
+        self._column_indexes = {column: column_index for column_index, column in enumerate(self.columns)}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, speaker_id) -> bool:
+        return speaker_id in self.rows
+
+    def _column_index(self, column: str) -> int:
+        if column not in self._column_indexes:
+            raise Exception('Unknown column {}. Please use one of {}'.format(column, list(self.columns)))
+        return self._column_indexes[column]
+
+    def get(self, speaker_id: str, column: str, default=None):
+        row = self.rows.get(speaker_id)
+        return default if row is None else row[self._column_index(column)]
+
+    def lookup(self, speaker_ids, column: str, default=None) -> list:
+        # bulk version of get()
+        column_index = self._column_index(column)
+        rows = self.rows
+        return [rows[speaker_id][column_index] if speaker_id in rows else default for speaker_id in speaker_ids]
+
+    def column(self, column: str) -> types.MappingProxyType:
+        # speaker ID -> value
+        column_index = self._column_index(column)
+        return types.MappingProxyType({speaker_id: row[column_index] for speaker_id, row in self.rows.items()})
+
+# ----------------- the registry -----------------
+speaker_corpora = {}
+
+def register_speaker_corpus(name: str, files: list, id_column: str, columns, index_path=None, in_package=False) -> None:
+    """ Make a corpus' speaker metadata available by speaker ID
+
+    Args:
+        name (str): The name to look the speakers up by. Must not already be in use
+        files (list): Paths of the speaker metadata CSV files (with a header)
+        id_column (str): The column holding the speaker IDs
+        columns (list or dict): The columns to keep, or a dict of the names to use -> the columns in the files
+        index_path (str, optional): Where to keep a pickled index of the parsed files. Defaults to None (no index).
+        in_package (bool, optional): Whether files are in dialect_mapper's mapping_data. Defaults to False.
+    """
+    if name in speaker_corpora:
+        raise Exception('There is already a speaker corpus called {}'.format(name))
+    if not isinstance(columns, dict):
+        columns = {column: column for column in columns}
+    speaker_corpora[name] = speaker_corpus(name, list(files), id_column, dict(columns), in_package, index_path)
+
+register_speaker_corpus(
+    'nbtale', tables.nbtale_speaker_files, 'Informant-ID', {'named_dialect': 'Dialekt', 'municipality': 'Kommune'}, in_package=True
+)
+
+def _read_speaker_file(corpus: speaker_corpus, file_name: str) -> list:
+    if corpus.in_package:
+        return tables._read_csv(file_name)
+    with open(file_name, newline='', encoding='utf-8') as open_f:
+        return list(csv.reader(open_f))
+
+def parse_speaker_files(corpus: speaker_corpus) -> speaker_table:
+    rows = {}
+    for file_name in corpus.files:
+        csv_rows = _read_speaker_file(corpus, file_name)
+        if not csv_rows:
+            continue
+        header = csv_rows[0]
+        missing = [column for column in [corpus.id_column] + list(corpus.columns.values()) if column not in header]
+        if missing:
+            raise Exception('{} does not have the column(s) {}'.format(file_name, missing))
+        id_index = header.index(corpus.id_column)
+        column_indexes = [header.index(column) for column in corpus.columns.values()]
+        for row in csv_rows[1:]:
+            if len(row) <= id_index:
+                continue
+            rows[row[id_index]] = tuple(row[column_index] if column_index < len(row) else '' for column_index in column_indexes)
+    return speaker_table(list(corpus.columns), rows)
+
+def _source_stamps(corpus: speaker_corpus) -> list:
+    # enough to tell if the files changed since the index was built
+    stamps = []
+    for file_name in corpus.files:
+        stat = os.stat(file_name)
+        stamps.append((os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns))
+    return stamps
+
+def build_speaker_index(name: str) -> speaker_table:
+    # parse the corpus' files and (re)write its index_path
+    corpus = speaker_corpora[name]
+    table = parse_speaker_files(corpus)
+    index = {'corpus': corpus, 'sources': _source_stamps(corpus), 'speaker_table': table}
+    # write to a temporary file first so other processes never see half an index
+    tmp_path = '{}.{}.tmp'.format(corpus.index_path, os.getpid())
+    with open(tmp_path, 'wb') as open_f:
+        pickle.dump(index, open_f, protocol=4)
+    os.replace(tmp_path, corpus.index_path)
+    return table
+
+def _load_speaker_index(corpus: speaker_corpus):
+    # the pickled table if it is there and was built from the same files (and settings), otherwise None
+    try:
+        with open(corpus.index_path, 'rb') as open_f:
+            index = pickle.load(open_f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        warnings.warn('Could not read the speaker index {} ({}). Rebuilding it'.format(corpus.index_path, e))
+        return None
+    if index.get('corpus') != corpus or index.get('sources') != _source_stamps(corpus):
+        return None
+    return index['speaker_table']
+
+def _load_speaker_table(name: str) -> speaker_table:
+    corpus = speaker_corpora[name]
+    if corpus.in_package:
+        # the shipped corpora are in the snapshot (see snapshot.py)
+        snapshot = tables._get_snapshot()
+        if snapshot is not None and name in snapshot['speaker_tables']:
+            return snapshot['speaker_tables'][name]
+        return parse_speaker_files(corpus)
+    if corpus.index_path is None:
+        return parse_speaker_files(corpus)
+    table = _load_speaker_index(corpus)
+    if table is None:
+        table = build_speaker_index(name)
+    return table
+
+def get_speaker_table(name: str) -> speaker_table:
+    if name not in speaker_corpora:
+        raise Exception('Unknown speaker corpus {}. Please use one of {}'.format(name, list(speaker_corpora)))
+    return tables._get_shared('speakers_' + name, lambda: _load_speaker_table(name))
+
+def lookup(name: str, speaker_ids, column: str, default=None) -> list:
+    # the column's value for each of the speaker IDs (default for unknown IDs)
+    return get_speaker_table(name).lookup(speaker_ids, column, default)
@@ -0,0 +1,414 @@
+"""
+The mapping data used by mapper_methods.
+
+The mapping CSV, the lookup indexes built from it, and the correction tables are parsed once per
+process, the first time they're needed, and then shared (read-only) by every mapper_methods instance.
+"""
+
+import csv
+import os
+import sys
+import tempfile
+import threading
+import types
+if sys.version_info[0] < 3:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+try:
+    import importlib.resources as pkg_resources
+except ImportError:
+    # Try backported to PY<37 `importlib_resources`.
+    import importlib_resources as pkg_resources
+
+from . import mapping_data
+from .columnar import columnar_table, array_state, array_from_state, UNKNOWN_CODE, MULTIPLE_CODE
+from .normalize import canonical_key
+from .packed import packed_index, packed_arrays
+
+from collections import namedtuple
+import numpy as np
+
+mapping_file = 'muni_county_namedDialect_numericDialect_mapping_manual_additions_renamed_2024_cardinals.csv'
+
+# the columns a place name can be looked up by (in the order get_*_dialect tries them)
+# and the dialect columns a lookup can return
+lookup_columns = ['old_muni', 'new_muni', 'old_county', 'new_county', 'new_county_2024']
+dialect_columns = ['named_dialect', 'numeric_dialect', 'cardinal_four', 'cardinal_five']
+
+# the correction files and whether their keys/values need lowering
+correction_files = {
+    'nbtale': ('nbtale_transform.csv', False),
+    'npsc': ('npsc_transform.csv', False),
+    'stortinget': ('stortinget_transform.csv', False),
+    'ndc': ('ndc_transform.csv', True),
+}
+# the order the correction sets are applied in when more than one is enabled (lowest first, see register_corrections)
+correction_priorities = {'nbtale': 10, 'npsc': 20, 'stortinget': 30, 'ndc': 40}
+nbtale_speaker_files = ['NB_Tale_Informantdata_module_{}_updated.csv'.format(module_number) for module_number in ['1', '2', '3']]
+
+def _read_csv(file_name: str) -> list:
+    return list(csv.reader(StringIO(pkg_resources.read_text(mapping_data, file_name))))
+
+# the lookup structures of a mapping_table, each a dict of dicts except key_aliases
+index_names = ['lookup_indexes', 'reverse_indexes', 'key_aliases', 'place_codes']
+
+class mapping_table:
+    '''
+    The mapping CSV (stored column by column, see columnar_table) and the read-only lookup structures built from it
+    '''
+    def __init__(self, table: columnar_table, code_maps=None, indexes=None) -> None:
+        self.table = table
+        self.headers = list(table.headers)
+        # the rows are only turned back into tuples of strings if somebody asks for them
+        self._raw_csv_data = None
+        self._csv_tuples = None
+        if indexes is not None:
+            # already built (and packed, see attach_mapping_table), together with the code maps
+            for name in index_names:
+                setattr(self, name, indexes[name])
+            self.code_maps = code_maps
+            return
+        self._build_lookup_indexes()
+        self._build_reverse_indexes()
+        if code_maps is None:
+            self._build_code_maps()
+        else:
+            self.place_codes = self._build_place_codes()
+            self.code_maps = code_maps
+
+    @classmethod
+    def from_csv(cls, file_name=mapping_file):
+        rows = _read_csv(file_name)
+        return cls(columnar_table(rows[0], rows[1:]))
+
+    @property
+    def raw_csv_data(self) -> tuple:
+        if self._raw_csv_data is None:
+            self._raw_csv_data = tuple(zip(*[self.table.column(column) for column in self.headers]))
+        return self._raw_csv_data
+
+    @property
+    def csv_tuples(self) -> tuple:
+        if self._csv_tuples is None:
+            csv_row_tuple = namedtuple('csv_row_tuple', self.headers)
+            self._csv_tuples = tuple(csv_row_tuple(*row) for row in self.raw_csv_data)
+        return self._csv_tuples
+
+    # the namedtuple class is made on the fly so it can't be pickled (see snapshot.py), the rows are rebuilt instead.
+    # The code maps are pickled as bytes, see columnar.array_state()
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state['_raw_csv_data'] = None
+        state['_csv_tuples'] = None
+        state['code_maps'] = {key: array_state(code_map) for key, code_map in self.code_maps.items()}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        state['code_maps'] = {key: array_from_state(code_map) for key, code_map in state['code_maps'].items()}
+        self.__dict__.update(state)
+
+    def _build_lookup_indexes(self) -> None:
+        # Scanning every row (and lower/stripping every cell) on every lookup is slow when mapping whole corpora.
+        # Instead we group the rows by the canonical key (see normalize.py) of each lookup column once and keep the
+        # sorted, de-duplicated dialects for every key. A lookup is then a single dict hit
+        self.lookup_indexes = {}
+        # the spellings used in the CSV (as is, lowered, and upper cased) and their canonical keys, so the common
+        # inputs don't have to be normalized at all
+        self.key_aliases = {}
+        dialect_values = {dialect_column: self.table.column(dialect_column) for dialect_column in dialect_columns}
+        for lookup_column in lookup_columns:
+            rows_by_key = {}
+            for value in self.table.vocabularies[lookup_column]:
+                for spelling in [value, value.lower(), value.upper()]:
+                    self.key_aliases[spelling] = canonical_key(spelling)
+            for row_index, value in enumerate(self.table.column(lookup_column)):
+                rows_by_key.setdefault(canonical_key(value), []).append(row_index)
+            for dialect_column in dialect_columns:
+                values = dialect_values[dialect_column]
+                self.lookup_indexes[(lookup_column, dialect_column)] = {
+                    key: tuple(sorted(set([values[row_index] for row_index in row_indexes])))
+                    for key, row_indexes in rows_by_key.items()
+                }
+
+    def _build_reverse_indexes(self) -> None:
+        # The other way around: for each dialect scheme and lookup column, the sorted (distinct) places with each dialect.
+        # Dialects are keyed the way the get_*_from_*_dialect methods compare them: numeric dialects as ints, the rest lowered and stripped
+        self.reverse_indexes = {}
+        lookup_values = {lookup_column: self.table.column(lookup_column) for lookup_column in lookup_columns}
+        for dialect_column in dialect_columns:
+            rows_by_dialect = {}
+            for row_index, dialect in enumerate(self.table.column(dialect_column)):
+                dialect = int(dialect) if dialect_column == 'numeric_dialect' else dialect.lower().strip()
+                rows_by_dialect.setdefault(dialect, []).append(row_index)
+            for lookup_column in lookup_columns:
+                values = lookup_values[lookup_column]
+                self.reverse_indexes[(dialect_column, lookup_column)] = {
+                    dialect: tuple(sorted(set([values[row_index] for row_index in row_indexes])))
+                    for dialect, row_indexes in rows_by_dialect.items()
+                }
+
+    def _build_place_codes(self) -> dict:
+        # the code of each normalized place name, per lookup column
+        place_codes = {}
+        for lookup_column in lookup_columns:
+            place_codes[lookup_column] = {}
+            for code, value in enumerate(self.table.vocabularies[lookup_column]):
+                key = canonical_key(value)
+                # an empty old municipality never matches anything (see get_*_by_old_municipality)
+                if lookup_column == 'old_muni' and key == '':
+                    continue
+                place_codes[lookup_column].setdefault(key, code)
+        return place_codes
+
+    def _build_code_maps(self) -> None:
+        # For every lookup column and dialect column keep an array taking a place code to the code of its dialect.
+        # Two sentinels are appended to the end of the arrays so that UNKNOWN_CODE (-1) and MULTIPLE_CODE (-2) map to themselves
+        self.place_codes = self._build_place_codes()
+        self.code_maps = {}
+        for lookup_column in lookup_columns:
+            place_codes = self.place_codes[lookup_column]
+            vocabulary = self.table.vocabularies[lookup_column]
+            for dialect_column in dialect_columns:
+                code_map = []
+                for value in vocabulary:
+                    key = canonical_key(value)
+                    dialects = self.lookup_indexes[(lookup_column, dialect_column)].get(key, ())
+                    if key not in place_codes or len(dialects) == 0:
+                        code_map.append(UNKNOWN_CODE)
+                    elif len(dialects) > 1:
+                        code_map.append(MULTIPLE_CODE)
+                    else:
+                        code_map.append(self.table.encode(dialect_column, dialects)[0])
+                code_map += [MULTIPLE_CODE, UNKNOWN_CODE]
+                code_map = np.array(code_map, dtype=np.int32)
+                code_map.flags.writeable = False
+                self.code_maps[(lookup_column, dialect_column)] = code_map
+
+def load_corrections(correction_set: str) -> types.MappingProxyType:
+    file_name, lower = correction_files[correction_set]
+    corrections = {}
+    for row in _read_csv(file_name):
+        if lower:
+            corrections[row[0].lower()] = row[1].lower()
+        else:
+            corrections[row[0]] = row[1]
+    return types.MappingProxyType(corrections)
+
+# ----------------- process-wide shared data -----------------
+_shared_data = {}
+# re-entrant as some loaders build on other shared data
+_shared_data_lock = threading.RLock()
+
+def _get_shared(name: str, loader):
+    try:
+        return _shared_data[name]
+    except KeyError:
+        with _shared_data_lock:
+            if name not in _shared_data:
+                _shared_data[name] = loader()
+            return _shared_data[name]
+
+# Everything is taken from the pre-built snapshot (see snapshot.py) when there's an up to date one
+# and parsed from the CSVs otherwise
+def _get_snapshot():
+    from . import snapshot
+    return _get_shared('snapshot', snapshot.load_snapshot)
+
+def _load_mapping_table() -> mapping_table:
+    snapshot = _get_snapshot()
+    if snapshot is not None:
+        return snapshot['mapping_table']
+    return mapping_table.from_csv()
+
+def _load_corrections(correction_set: str) -> types.MappingProxyType:
+    snapshot = _get_snapshot()
+    if snapshot is not None:
+        return types.MappingProxyType(snapshot['corrections'][correction_set])
+    return load_corrections(correction_set)
+
+def _load_nbtale_speakers() -> types.MappingProxyType:
+    # Manual work was done to create a speaker ID to dialect mapping for NB Tale speakers (see get_nbtale_named_dialect_from_id).
+    # It's the named_dialect column of the nbtale speaker corpus (see speakers.py)
+    from . import speakers
+    return speakers.get_speaker_table('nbtale').column('named_dialect')
+
+def get_mapping_table() -> mapping_table:
+    return _get_shared('mapping_table', _load_mapping_table)
+
+def get_corrections(correction_set: str) -> types.MappingProxyType:
+    if correction_set not in correction_files:
+        return _get_registered_corrections(correction_set)
+    return _get_shared('corrections_' + correction_set, lambda: _load_corrections(correction_set))
+
+def get_nbtale_corrections(ignore_herøy=True) -> types.MappingProxyType:
+    # HERØY: There are 2 kommuner with this name. We cannot reasonably tell them apart so by default it is mapped to nothing
+    if not ignore_herøy:
+        return get_corrections('nbtale')
+    return _get_shared(
+        'corrections_nbtale_ignore_herøy',
+        lambda: types.MappingProxyType({**get_corrections('nbtale'), 'herøy': ''})
+    )
+
+def get_nbtale_speakers() -> types.MappingProxyType:
+    return _get_shared('nbtale_speakers', _load_nbtale_speakers)
+
+# ----------------- sharing the mapping table with worker processes -----------------
+# Every worker in a pool (e.g. torch DataLoader workers) would otherwise load its own copy of the mapping table.
+# share_mapping_table() writes the arrays of the table (the row codes and the code maps) and its lookup indexes,
+# packed into arrays (see packed.py), to a single file once, in the parent, and attach_mapping_table() memory maps
+# that file read-only in a worker. The pages are then shared by every process through the OS page cache rather
+# than copied, and the indexes are read in place rather than rebuilt. Only the small per-column vocabularies
+# travel in the (picklable) handle
+shared_mapping_handle = namedtuple('shared_mapping_handle', ['path', 'headers', 'vocabularies', 'layout', 'indexes'])
+
+def _packed_indexes(table: mapping_table) -> list:
+    # (index name, key in the index dict or None, packed index) of every lookup index of table
+    indexes = [('key_aliases', None, packed_index.pack(table.key_aliases))]
+    for name in ['lookup_indexes', 'reverse_indexes', 'place_codes']:
+        indexes += [(name, key, packed_index.pack(index)) for key, index in getattr(table, name).items()]
+    return indexes
+
+def share_mapping_table(path=None) -> shared_mapping_handle:
+    # layout: (array name, dtype, offset, length) of every array in the file, the offsets in bytes
+    # indexes: (index name, key in the index dict or None, key kind, value kind) of every packed index, its
+    # arrays are named ('index', number in indexes, array name) in the layout
+    table = get_mapping_table()
+    arrays = [(('codes', column), table.table.codes[column]) for column in table.headers]
+    arrays += [(('code_map',) + key, code_map) for key, code_map in table.code_maps.items()]
+    indexes = []
+    for index_number, (name, key, index) in enumerate(_packed_indexes(table)):
+        indexes.append((name, key, index.key_kind, index.value_kind))
+        arrays += [(('index', index_number, array_name), index.arrays[array_name]) for array_name, _ in packed_arrays]
+    if path is None:
+        open_fd, path = tempfile.mkstemp(prefix='dialect_mapper_', suffix='.bin')
+        os.close(open_fd)
+    layout = []
+    offset = 0
+    with open(path, 'wb') as open_f:
+        for name, array in arrays:
+            array = np.ascontiguousarray(array)
+            # keep every array aligned to 8 bytes
+            padding = -offset % 8
+            open_f.write(b'\0' * padding)
+            offset += padding
+            open_f.write(array.tobytes())
+            layout.append((name, array.dtype.str, offset, len(array)))
+            offset += array.nbytes
+    vocabularies = {column: table.table.vocabularies[column] for column in table.headers}
+    return shared_mapping_handle(path, tuple(table.headers), vocabularies, tuple(layout), tuple(indexes))
+
+def attach_mapping_table(handle: shared_mapping_handle) -> mapping_table:
+    # makes the memory mapped table the one used by every mapper_methods instance in this process
+    buffer = np.memmap(handle.path, dtype=np.uint8, mode='r')
+    codes = {}
+    code_maps = {}
+    index_arrays = [{} for _ in handle.indexes]
+    for name, dtype, offset, length in handle.layout:
+        dtype = np.dtype(dtype)
+        array = buffer[offset:offset + length * dtype.itemsize].view(dtype)
+        if name[0] == 'codes':
+            codes[name[1]] = array
+        elif name[0] == 'code_map':
+            code_maps[name[1:]] = array
+        else:
+            index_arrays[name[1]][name[2]] = array
+    indexes = {name: {} for name in index_names}
+    for arrays, (name, key, key_kind, value_kind) in zip(index_arrays, handle.indexes):
+        index = packed_index(arrays, key_kind, value_kind)
+        if key is None:
+            indexes[name] = index
+        else:
+            indexes[name][key] = index
+    attached = mapping_table(columnar_table.from_codes(handle.headers, handle.vocabularies, codes), code_maps=code_maps, indexes=indexes)
+    with _shared_data_lock:
+        _shared_data['mapping_table'] = attached
+    return attached
+
+def release_shared_mapping_table(handle: shared_mapping_handle) -> None:
+    # removes the file once the workers are done with it (processes that still have it mapped keep working)
+    if os.path.exists(handle.path):
+        os.remove(handle.path)
+
+# ----------------- correction registry -----------------
+# Besides the shipped correction sets, users can register their own (a dict or a two column CSV file of
+# wrong name -> right name). Enabled sets are applied in priority order and the result of applying all of
+# them is compiled into a single dict, so correcting a name is one lookup however many sets are enabled
+_registered_corrections = {}
+_no_corrections = types.MappingProxyType({})
+
+def register_corrections(name: str, corrections, priority=None, lower=True) -> None:
+    """ Make a correction set available to mapper_methods.enable_corrections()
+
+    Args:
+        name (str): The name to enable it by. Must not already be in use
+        corrections (dict or str): A dict of wrong name -> right name, or the path of a CSV file with those two columns (and no header)
+        priority (int, optional): Sets with a lower priority are applied first. Defaults to after every set registered so far.
+        lower (bool, optional): Whether to lower (and strip) the names. Lookups are done on lowered names. Defaults to True.
+    """
+    with _shared_data_lock:
+        if name in correction_priorities:
+            raise Exception('There is already a correction set called {}'.format(name))
+        if priority is None:
+            priority = max(correction_priorities.values()) + 10
+        if isinstance(corrections, dict):
+            corrections = dict(corrections)
+        _registered_corrections[name] = (corrections, lower)
+        correction_priorities[name] = priority
+
+def unregister_corrections(name: str) -> None:
+    # undo register_corrections(). Mappers that already have the set enabled keep using it until their corrections change
+    with _shared_data_lock:
+        if name not in _registered_corrections:
+            raise Exception('{} is not a registered correction set'.format(name))
+        del _registered_corrections[name]
+        del correction_priorities[name]
+        _shared_data.pop('corrections_' + name, None)
+        for key in [key for key in _shared_data if isinstance(key, tuple) and key[0] == 'composed_corrections' and name in key[1]]:
+            del _shared_data[key]
+
+def _load_registered_corrections(name: str) -> types.MappingProxyType:
+    corrections, lower = _registered_corrections[name]
+    if not isinstance(corrections, dict):
+        with open(corrections, newline='', encoding='utf-8') as open_f:
+            corrections = dict((row[0], row[1]) for row in csv.reader(open_f) if row)
+    if lower:
+        corrections = {wrong.lower().strip(): right.lower().strip() for wrong, right in corrections.items()}
+    return types.MappingProxyType(corrections)
+
+def _get_registered_corrections(name: str) -> types.MappingProxyType:
+    if name not in _registered_corrections:
+        raise Exception('Unknown correction set {}. Please use one of {}'.format(name, list(correction_priorities)))
+    return _get_shared('corrections_' + name, lambda: _load_registered_corrections(name))
+
+def sorted_correction_sets(correction_sets) -> tuple:
+    # the names in the order the sets are applied in
+    for correction_set in correction_sets:
+        if correction_set not in correction_priorities:
+            raise Exception('Unknown correction set {}. Please use one or more of {}'.format(correction_set, list(correction_priorities)))
+    return tuple(sorted(correction_sets, key=lambda correction_set: (correction_priorities[correction_set], correction_set)))
+
+def compose_corrections(correction_sets, ignore_herøy=True) -> types.MappingProxyType:
+    # one dict giving, for every name any of the (already sorted) sets touches, the name after applying all of them
+    # in order. Names that come out unchanged are left out. Like the lookup indexes it is keyed on canonical keys
+    correction_sets = tuple(correction_sets)
+    if len(correction_sets) == 0:
+        return _no_corrections
+    def _compose():
+        correction_tables = [
+            {canonical_key(wrong): canonical_key(right) for wrong, right in (
+                get_nbtale_corrections(ignore_herøy) if correction_set == 'nbtale' else get_corrections(correction_set)
+            ).items()}
+            for correction_set in correction_sets
+        ]
+        composed = {}
+        for wrong in set().union(*correction_tables):
+            right = wrong
+            for correction_table in correction_tables:
+                right = correction_table.get(right, right)
+            if right != wrong:
+                composed[wrong] = right
+        return types.MappingProxyType(composed)
+    # a tuple rather than a string as registered set names (e.g. file paths) can contain anything
+    key = ('composed_corrections', correction_sets, ignore_herøy if 'nbtale' in correction_sets else None)
+    return _get_shared(key, _compose)
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from dialect_mapper import cli, tables
+
+class AnnotateCommandTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, file_name, content):
+        path = os.path.join(self.tmp_dir.name, file_name)
+        with open(path, 'w', encoding='utf-8') as open_f:
+            open_f.write(content)
+        return path
+
+    def _read(self, path):
+        with open(path, encoding='utf-8') as open_f:
+            return open_f.read()
+
+    def test_annotate_csv(self):
+        input_path = self._write('speakers.csv', 'id,birthplace\n1,Kristiansand\n2,Vestfossen\n3,Seattle\n4,\n')
+        output_path = os.path.join(self.tmp_dir.name, 'out.csv')
+        cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '--corrections', 'npsc', '--outputs', 'named', 'card5', '-q'])
+        self.assertEqual(
+            self._read(output_path),
+            'id,birthplace,named_dialect,cardinal_five\n'
+            '1,Kristiansand,Sørlandsk,south\n'
+            '2,Vestfossen,Østlandsk,east\n'
+            '3,Seattle,,\n'
+            '4,,,\n'
+        )
+
+    def test_annotate_csv_multiple_dialects(self):
+        input_path = self._write('speakers.csv', 'birthplace\nAgder\n')
+        output_path = os.path.join(self.tmp_dir.name, 'out.csv')
+        cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '--outputs', 'numeric', '-q'])
+        self.assertEqual(
+            self._read(output_path),
+            'birthplace,numeric_dialect\nAgder,19|20\n'
+        )
+
+    def test_annotate_csv_corrections_file(self):
+        corrections_path = self._write('corrections.csv', 'Seattle,Bergen\n')
+        # the CLI registers the file (process wide) under its path
+        self.addCleanup(tables.unregister_corrections, corrections_path)
+        input_path = self._write('speakers.csv', 'birthplace\nSeattle\nVestfossen\n')
+        output_path = os.path.join(self.tmp_dir.name, 'out.csv')
+        cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '--corrections', 'npsc', '--corrections-file', corrections_path, '--outputs', 'named', '-q'])
+        self.assertEqual(
+            self._read(output_path),
+            'birthplace,named_dialect\nSeattle,Sørvestlandsk\nVestfossen,Østlandsk\n'
+        )
+
+    def test_json_needs_format(self):
+        input_path = self._write('speakers.json', '{"id": 1, "birthplace": "Songdalen"}\n')
+        output_path = os.path.join(self.tmp_dir.name, 'out.jsonl')
+        with self.assertRaises(Exception):
+            cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '-q'])
+        cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '--format', 'jsonl', '--outputs', 'card5', '-q'])
+        self.assertEqual(json.loads(self._read(output_path))['cardinal_five'], 'south')
+
+    def test_annotate_jsonl(self):
+        input_path = self._write('speakers.jsonl', '{"id": 1, "birthplace": "Songdalen"}\n{"id": 2, "birthplace": null}\n')
+        output_path = os.path.join(self.tmp_dir.name, 'out.jsonl')
+        cli.main(['annotate', input_path, '-o', output_path, '-c', 'birthplace', '-q'])
+        rows = [json.loads(line) for line in self._read(output_path).splitlines()]
+        self.assertEqual(rows[0]['named_dialect'], 'Sørlandsk')
+        self.assertEqual(rows[0]['numeric_dialect'], '19')
+        self.assertEqual(rows[1]['cardinal_four'], None)
+
+    def test_row_annotator_resolves_each_place_once(self):
+        annotator = cli.row_annotator(cli.build_mapper(), 'birthplace', outputs=('named',))
+        output = io.StringIO()
+        cli.annotate_csv(io.StringIO('birthplace\nBergen\nbergen\nBER-GEN\n'), output, annotator)
+        self.assertEqual(annotator.rows, 3)
+        self.assertEqual(len(annotator._resolved), 1)
+
+    def test_row_annotator_rows_dont_share_answers(self):
+        annotator = cli.row_annotator(cli.build_mapper(miss_mode='collect'), 'birthplace', outputs=('numeric',))
+        rows = [annotator.annotate({'birthplace': place}) for place in ['Agder', 'agder', 'Seattle', 'Seattle']]
+        rows[0]['numeric_dialect'].append('99')
+        self.assertNotIn('99', rows[1]['numeric_dialect'])
+        self.assertEqual(annotator.mapper.misses.records[0].count, 2)
+
+    def test_shard_offsets_start_on_lines(self):
+        input_path = self._write('speakers.jsonl', ''.join('{{"id": {}}}\n'.format(i) for i in range(100)))
+        with open(input_path, 'rb') as open_f:
+            content = open_f.read()
+        shards = cli.shard_offsets(input_path, 7)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], len(content))
+        for (start, end), (next_start, _) in zip(shards, shards[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(content[next_start - 1:next_start], b'\n')
+
+    def test_annotate_parallel_matches_sequential(self):
+        places = ['Kristiansand', 'Seattle', 'Agder', 'Bergen', '', 'Vestfossen']
+        input_path = self._write('speakers.csv', 'id,birthplace\n' + ''.join('{},{}\n'.format(i, places[i % len(places)]) for i in range(500)))
+        sequential_path = os.path.join(self.tmp_dir.name, 'sequential.csv')
+        parallel_path = os.path.join(self.tmp_dir.name, 'parallel.csv')
+        cli.main(['annotate', input_path, '-o', sequential_path, '-c', 'birthplace', '--corrections', 'npsc', '-q'])
+        cli.main(['annotate', input_path, '-o', parallel_path, '-c', 'birthplace', '--corrections', 'npsc', '-q', '--workers', '2'])
+        self.assertEqual(self._read(sequential_path), self._read(parallel_path))
+
+    def test_annotate_misses(self):
+        places = ['Bergen', 'Seattle', 'seattle ', 'Tehran', '', 'Seattle']
+        input_path = self._write('speakers.csv', 'id,birthplace\n' + ''.join('{},{}\n'.format(i, places[i % len(places)]) for i in range(60)))
+        for workers in ['1', '2']:
+            misses_path = os.path.join(self.tmp_dir.name, 'misses_{}.csv'.format(workers))
+            cli.main(['annotate', input_path, '-o', os.path.join(self.tmp_dir.name, 'out.csv'), '-c', 'birthplace', '--misses', misses_path, '-q', '--workers', workers])
+            self.assertEqual(
+                self._read(misses_path),
+                'kind,input,key,count,column,row\n'
+                'not_found,Seattle,seattle,30,birthplace,2\n'
+                'not_found,Tehran,tehran,10,birthplace,4\n'
+            )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+import dialect_mapper
+from dialect_mapper import fuzzy
+
+def _slow_edit_distance(first, second):
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+class FuzzyMatcherTests(unittest.TestCase):
+
+    def test_edit_distance(self):
+        rng = random.Random(0)
+        for _ in range(2000):
+            first = ''.join(rng.choice('abø') for _ in range(rng.randint(0, 8)))
+            second = ''.join(rng.choice('abø') for _ in range(rng.randint(0, 8)))
+            self.assertEqual(fuzzy.edit_distance(first, second), _slow_edit_distance(first, second))
+
+    def test_candidates_match_brute_force(self):
+        index = fuzzy.get_fuzzy_index()
+        for query in ['kristiansnd', 'bergn', 'sandnes', 'lillehammar']:
+            expected = set((_slow_edit_distance(query, key), key) for key in index.keys if _slow_edit_distance(query, key) <= 2)
+            self.assertEqual(set((candidate.distance, candidate.key) for candidate in index.candidates(query, 2)), expected)
+
+    def test_short_candidates_without_shared_trigrams(self):
+        index = fuzzy.get_fuzzy_index()
+        # 'xix' is 2 edits from 'eid' but they don't have a trigram in common
+        self.assertFalse(fuzzy._trigrams('xix') & fuzzy._trigrams('eid'))
+        self.assertIn(('eid', 2), [(candidate.key, candidate.distance) for candidate in index.candidates('xix', 2)])
+        rng = random.Random(0)
+        short_keys = [key for key in index.keys if len(key) <= 5]
+        for _ in range(50):
+            query = list(rng.choice(short_keys))
+            for _ in range(2):
+                query[rng.randrange(len(query))] = rng.choice('abcdefghijklmnopqrstuvwxyzæøå')
+            query = ''.join(query)
+            # (edit_distance is checked against _slow_edit_distance above)
+            expected = set((fuzzy.edit_distance(query, key), key) for key in index.keys if fuzzy.edit_distance(query, key) <= 2)
+            self.assertEqual(set((candidate.distance, candidate.key) for candidate in index.candidates(query, 2)), expected)
+
+    def test_match(self):
+        matcher = fuzzy.fuzzy_matcher()
+        self.assertEqual(matcher.match('Trondhiem'), 'Trondheim')
+        self.assertEqual(matcher.match('nord frn'), 'Nord-Fron')
+        # as close to Kristiansand as to Kristiansund
+        self.assertEqual(matcher.match('Kristiansnd'), None)
+        # a real place that isn't a municipality
+        self.assertEqual(matcher.match('Aksdal'), None)
+        self.assertEqual(matcher.match('Xyzzy'), None)
+
+    def test_match_many_is_cached(self):
+        matcher = fuzzy.fuzzy_matcher()
+        self.assertEqual(matcher.match_many(['Stavangr', 'stavangr', 'Lillehammar']), ['Stavanger', 'Stavanger', 'Lillehammer'])
+        matcher.match('Stavangr')
+        self.assertEqual(matcher.cache_info().misses, 2)
+        self.assertEqual(matcher.cache_info().hits, 1)
+
+    def test_mapper_fuzzy_matching(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(mm.get_named_dialect('Trondhiem'), None)
+        mm.enable_fuzzy_matching()
+        self.assertEqual(mm.get_named_dialect('Trondhiem'), mm.get_named_dialect('Trondheim'))
+        self.assertEqual(mm.resolve('Lillehammar'), mm.resolve('Lillehammer'))
+        mm.disable_fuzzy_matching()
+        self.assertEqual(mm.get_named_dialect('Trondhiem'), None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import unittest
+
+import dialect_mapper
+from dialect_mapper import instrumentation
+
+class InstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.mm = dialect_mapper.mapper_methods(cache_size=0)
+        self.mm.set_miss_mode('silent')
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(self.mm.instrumentation)
+        for name in instrumentation.instrumented_methods:
+            self.assertNotIn(name, self.mm.__dict__)
+
+    def test_counts(self):
+        self.mm.enable_npsc_corrections()
+        stats = self.mm.enable_instrumentation()
+        self.mm.get_named_dialect_many(['Bergen', 'Vestfossen', 'Agder', 'Seattle', 'Sande'])
+        self.mm.get_cardinal_five('Sande', resolve_ambigious='old')
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['calls'], {'get_named_dialect_many': 1, 'get_named_dialect': 5, 'get_cardinal_five': 1})
+        self.assertEqual(snapshot['tiers'], {'old_muni': 3, 'new_muni': 1, 'new_county': 1, 'unresolved': 1})
+        self.assertEqual(snapshot['ambiguities'], {'new': 1, 'old': 1})
+        # only Vestfossen is corrected
+        self.assertEqual((snapshot['corrections'], snapshot['correction_hits']), (6, 1))
+        self.assertEqual(sum(snapshot['histograms']['get_named_dialect']['counts']), 5)
+        # the snapshot can be served as is
+        json.dumps(snapshot)
+
+    def test_reset_and_disable(self):
+        stats = self.mm.enable_instrumentation()
+        self.mm.get_named_dialect('Bergen')
+        stats.reset()
+        self.assertEqual(stats.snapshot()['calls'], {})
+        self.mm.disable_instrumentation()
+        self.mm.get_named_dialect('Bergen')
+        self.assertEqual(stats.snapshot()['calls'], {})
+        self.assertNotIn('get_named_dialect', self.mm.__dict__)
+
+    def test_shared_stats(self):
+        stats = instrumentation.lookup_stats()
+        other = dialect_mapper.mapper_methods()
+        self.mm.enable_instrumentation(stats)
+        other.enable_instrumentation(stats)
+        self.mm.resolve('Bergen')
+        other.resolve('Oslo')
+        self.assertEqual(stats.snapshot()['calls'], {'resolve': 2})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+
+# modules that are only needed for plotting and must not be imported just to map dialects. Importing
+# them is what made `import dialect_mapper` slow
+PLOTTING_MODULES = ['dialect_mapper.plotter', 'matplotlib', 'shapely', 'cairosvg']
+
+def _run_fresh(code):
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+
+def _imported_plotting_modules(code):
+    # the PLOTTING_MODULES that are imported after running code in a fresh interpreter
+    result = _run_fresh(code + '\nimport sys\nprint(",".join(m for m in {!r} if m in sys.modules))'.format(PLOTTING_MODULES))
+    return result.stdout.strip()
+
+class LazyImportTests(unittest.TestCase):
+
+    def test_import_does_not_import_plotting_stack(self):
+        self.assertEqual(_imported_plotting_modules('import dialect_mapper'), '')
+
+    def test_mapper_does_not_import_plotting_stack(self):
+        self.assertEqual(
+            _imported_plotting_modules('import dialect_mapper\ndialect_mapper.mapper_methods().get_named_dialect("Bergen")'),
+            ''
+        )
+
+    def test_plotter_is_still_available(self):
+        result = _run_fresh(
+            'import importlib.util, dialect_mapper\n'
+            'if importlib.util.find_spec("shapely") and importlib.util.find_spec("matplotlib"):\n'
+            '    print(dialect_mapper.plotter_methods.__name__)\n'
+            'else:\n'
+            '    print("plotter_methods")'
+        )
+        self.assertEqual(result.stdout.strip(), 'plotter_methods')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,19 @@
+import contextlib
+import io
+import unicodedata
 import unittest
 import dialect_mapper
+from dialect_mapper.columnar import UNKNOWN_CODE
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+try:
+    import pyarrow as pa
+    import dialect_mapper.arrow
+except ImportError:
+    pa = None
 
 # NB: these classes rely on a specific CSV. If the CSV is updated the cases may fail
 
@@ -54,6 +68,40 @@ class DialectMapperTests(unittest.TestCase):
             mm.get_named_dialect_by_new_county('Agder'), 
             ['Sørlandsk', 'Sørvestlandsk']
         )
+    def test_get_named_dialect_by_new_county_normalizes_input(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.get_named_dialect_by_new_county('  AGDER '), 
+            ['Sørlandsk', 'Sørvestlandsk']
+        )
+    def test_get_named_dialect_spelling_variants(self):
+        mm = dialect_mapper.mapper_methods()
+        for variant in ['Nord-Fron', 'nord fron', 'NORD - FRON', 'Nordfron']:
+            self.assertEqual(mm.get_named_dialect(variant), 'Midlandsk')
+        # decomposed å, aa for å, oe for ø, and ae for æ
+        for variant in [unicodedata.normalize('NFD', 'Ålesund'), 'Aalesund', 'ÅLESUND']:
+            self.assertEqual(mm.get_named_dialect(variant), 'Nordvestlandsk')
+        self.assertEqual(mm.get_named_dialect('Hoeyanger'), mm.get_named_dialect('Høyanger'))
+        self.assertEqual(mm.get_named_dialect('Baerum'), mm.get_named_dialect('Bærum'))
+        self.assertEqual(mm.get_named_dialect_by_old_county('soer-troendelag'), mm.get_named_dialect_by_old_county('Sør-Trøndelag'))
+    def test_separators_alone_are_not_blank(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.set_miss_mode('silent')
+        blank = mm.get_named_dialect('')
+        # only blank input finds the rows with a blank column (as it always has), separators alone don't
+        self.assertEqual(mm.get_named_dialect(' '), blank)
+        for separators in ['-', '--', '_', ' - ']:
+            self.assertIsNone(mm.get_named_dialect(separators))
+            self.assertIsNone(mm.get_numeric_dialect(separators))
+            self.assertEqual(mm.get_named_dialect_by_old_county(separators), [])
+            self.assertEqual(mm.encode_places([separators], 'old_county').tolist(), [UNKNOWN_CODE])
+    def test_get_named_dialect_by_new_county_returns_copy(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.get_named_dialect_by_new_county('Agder').append('Østlandsk')
+        self.assertEqual(
+            mm.get_named_dialect_by_new_county('Agder'), 
+            ['Sørlandsk', 'Sørvestlandsk']
+        )
     
     def test_get_named_dialect_test_old_municipality(self):
         mm = dialect_mapper.mapper_methods()
@@ -112,6 +160,24 @@ class DialectMapperTests(unittest.TestCase):
             set(['Vestland'])
         )
 
+    def test_get_new_counties_2024_from_numeric_dialect(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(mm.get_new_counties_2024_from_numeric_dialect(19), ['Agder'])
+        self.assertEqual(mm.get_old_counties_from_numeric_dialect(' 19 '), ['Vest-Agder'])
+    def test_get_counties_from_cardinal_dialects(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(mm.get_new_counties_2024_from_cardinal_four('north'), ['Finnmark', 'Nordland', 'Troms'])
+        self.assertEqual(mm.get_new_counties_from_cardinal_five(' WEST'), ['Agder', 'Møre og Romsdal', 'Rogaland', 'Vestland'])
+        self.assertEqual(mm.get_new_counties_from_cardinal_five('nowhere'), [])
+    def test_get_municipalities_from_cardinal_dialects(self):
+        mm = dialect_mapper.mapper_methods()
+        for municipality in mm.get_new_municipalities_from_cardinal_four('mid'):
+            self.assertIn('mid', mm.get_cardinal_four_by_new_municipality(municipality))
+        self.assertIn('Bergen', mm.get_old_municipalities_from_cardinal_five('west'))
+        # a copy is returned
+        mm.get_old_municipalities_from_cardinal_five('west').append('Seattle')
+        self.assertNotIn('Seattle', mm.get_old_municipalities_from_cardinal_five('west'))
+
     def test_get_numeric_dialect_by_old_municipality(self):
         mm = dialect_mapper.mapper_methods()
         self.assertEqual(
@@ -168,6 +234,234 @@ class DialectMapperTests(unittest.TestCase):
             None
         )
 
+    def test_resolve_municipality(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.resolve('Kristiansand'),
+            ('Sørlandsk', '19', 'west', 'south')
+        )
+    def test_resolve_county(self):
+        mm = dialect_mapper.mapper_methods()
+        resolution = mm.resolve('Agder')
+        self.assertEqual(resolution.named_dialect, ['Sørlandsk', 'Sørvestlandsk'])
+        self.assertEqual(resolution.numeric_dialect, ['19', '20'])
+    def test_resolve_matches_single_lookups(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_fine_grained_dialect_collapse()
+        self.assertEqual(
+            tuple(mm.resolve('Trondheim')),
+            (mm.get_named_dialect('Trondheim'), mm.get_numeric_dialect('Trondheim'), mm.get_cardinal_four('Trondheim'), mm.get_cardinal_five('Trondheim'))
+        )
+    def test_resolve_bad_input(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.resolve('Seattle'),
+            None
+        )
+
+    def test_get_named_dialect_many(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.get_named_dialect_many(['Kristiansand', 'Seattle', ' kristiansand', 'Agder']),
+            ['Sørlandsk', None, 'Sørlandsk', ['Sørlandsk', 'Sørvestlandsk']]
+        )
+    def test_get_numeric_dialect_many(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.get_numeric_dialect_many(iter(['Songdalen', 'Aust-Agder', 'Songdalen'])),
+            ['19', '20', '19']
+        )
+    def test_get_cardinal_many_with_corrections(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_npsc_corrections()
+        self.assertEqual(
+            mm.get_cardinal_five_many(['Vestfossen', 'Tehran']),
+            ['east', None]
+        )
+    def test_resolve_many(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.resolve_many(['Kristiansand', 'KRISTIANSAND']),
+            [mm.resolve('Kristiansand')] * 2
+        )
+
+    def test_columnar_table_round_trip(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.table.column('new_muni'),
+            [x.new_muni for x in mm.csv_tuples]
+        )
+    def test_get_dialect_codes(self):
+        mm = dialect_mapper.mapper_methods()
+        place_codes = mm.encode_places(['Kristiansand', 'Seattle', ' bergen '])
+        dialect_codes = mm.get_dialect_codes(place_codes)
+        self.assertEqual(
+            mm.decode_dialects(dialect_codes),
+            ['Sørlandsk', None, 'Sørvestlandsk']
+        )
+    def test_get_dialect_codes_multiple_dialects(self):
+        mm = dialect_mapper.mapper_methods()
+        place_codes = mm.encode_places(['Agder', 'Aust-Agder'], lookup_column='new_county')
+        self.assertEqual(
+            mm.get_dialect_codes(place_codes, lookup_column='new_county', dialect_column='numeric_dialect').tolist()[0],
+            dialect_mapper.columnar.MULTIPLE_CODE
+        )
+    def test_get_dialect_codes_whole_column(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(
+            mm.decode_dialects(mm.get_dialect_codes(mm.table.codes['new_muni'], dialect_column='cardinal_five'), 'cardinal_five')[:3],
+            ['south', 'south', 'south']
+        )
+
+    @unittest.skipIf(pd is None, 'pandas is not installed')
+    def test_map_dataframe(self):
+        mm = dialect_mapper.mapper_methods()
+        df = pd.DataFrame({'birthplace': ['Kristiansand', 'Seattle', None, 'kristiansand ']})
+        annotated = mm.map_dataframe(df, 'birthplace', outputs=('named', 'card5'))
+        self.assertEqual(
+            annotated['named_dialect'].isna().tolist(),
+            [False, True, True, False]
+        )
+        self.assertEqual(
+            annotated['cardinal_five'].dropna().tolist(),
+            ['south', 'south']
+        )
+        self.assertNotIn('named_dialect', df.columns)
+    @unittest.skipIf(pd is None, 'pandas is not installed')
+    def test_map_dataframe_unknown_output(self):
+        mm = dialect_mapper.mapper_methods()
+        df = pd.DataFrame({'birthplace': ['Kristiansand']})
+        with self.assertRaises(Exception):
+            mm.map_dataframe(df, 'birthplace', outputs=('card6',))
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_map_arrow(self):
+        places = pa.chunked_array([['Kristiansand', None, 'Agder'], ['Seattle', 'Kristiansand']])
+        annotated = dialect_mapper.arrow.map_arrow(places, outputs=('named', 'numeric'))
+        self.assertEqual(
+            annotated['named_dialect'].to_pylist(),
+            ['Sørlandsk', None, 'Sørlandsk|Sørvestlandsk', None, 'Sørlandsk']
+        )
+        self.assertEqual(annotated['numeric_dialect'].num_chunks, 2)
+        self.assertTrue(pa.types.is_dictionary(annotated['numeric_dialect'].type))
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_arrow_annotate_table(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_npsc_corrections()
+        annotator = dialect_mapper.arrow.arrow_annotator(mm, outputs=('card5',))
+        table = annotator.annotate_table(pa.table({'birthplace': ['Vestfossen', 'Tehran']}), 'birthplace')
+        self.assertEqual(
+            table.column('cardinal_five').to_pylist(),
+            ['east', None]
+        )
+
+    def test_instances_share_mapping_table(self):
+        first = dialect_mapper.mapper_methods()
+        second = dialect_mapper.mapper_methods()
+        self.assertIs(first.csv_tuples, second.csv_tuples)
+        self.assertIs(first.table, second.table)
+    def test_corrections_are_per_instance(self):
+        corrected = dialect_mapper.mapper_methods()
+        corrected.enable_npsc_corrections()
+        uncorrected = dialect_mapper.mapper_methods()
+        self.assertEqual(corrected.get_named_dialect('Vestfossen'), 'Østlandsk')
+        self.assertEqual(uncorrected.get_named_dialect('Vestfossen'), None)
+        self.assertEqual(len(uncorrected.npsc_corrections), 0)
+    def test_shared_corrections_are_read_only(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_npsc_corrections()
+        with self.assertRaises(TypeError):
+            mm.npsc_corrections['seattle'] = 'bergen'
+
+    def test_resolution_cache_hits(self):
+        mm = dialect_mapper.mapper_methods(cache_size=2)
+        self.assertEqual(mm.get_named_dialect('Trondheim'), 'Østtrøndsk')
+        self.assertEqual(mm.get_named_dialect(' trondheim '), 'Østtrøndsk')
+        self.assertEqual(mm.get_numeric_dialect('Trondheim'), mm.get_numeric_dialect('TRONDHEIM'))
+        info = mm.resolution_cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (2, 2, 2))
+        mm.get_named_dialect('Bergen')
+        self.assertEqual(mm.resolution_cache_info().evictions, 1)
+        mm.clear_resolution_cache()
+        self.assertEqual(mm.resolution_cache_info(), (0, 0, 0, 0, 2, 0))
+    def test_resolution_cache_is_invalidated(self):
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(mm.get_named_dialect('Trondheim'), 'Østtrøndsk')
+        self.assertEqual(mm.get_named_dialect('Vestfossen'), None)
+        mm.enable_fine_grained_dialect_collapse()
+        self.assertEqual(mm.get_named_dialect('Trondheim'), 'Trøndsk')
+        mm.enable_npsc_corrections()
+        self.assertEqual(mm.get_named_dialect('Vestfossen'), 'Østlandsk')
+        self.assertEqual(mm.resolution_cache_info().invalidations, 2)
+        # switching on what is already on keeps the cache
+        mm.enable_npsc_corrections()
+        self.assertEqual(mm.resolution_cache_info().invalidations, 2)
+    def test_resolution_cache_returns_copies(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.get_named_dialect('Herøy').append('Trøndsk')
+        self.assertEqual(mm.get_named_dialect('Herøy'), ['Helgelandsk', 'Nordvestlandsk'])
+    def test_resolution_cache_off(self):
+        mm = dialect_mapper.mapper_methods(cache_size=0)
+        self.assertEqual(mm.get_named_dialect('Trondheim'), 'Østtrøndsk')
+        self.assertEqual(mm.resolution_cache_info().currsize, 0)
+
+    def test_miss_modes(self):
+        mm = dialect_mapper.mapper_methods()
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            mm.get_named_dialect('Seattle')
+        self.assertEqual(stdout.getvalue(), 'ERROR: cannot find named dialect for: Seattle\n')
+        mm.set_miss_mode('silent')
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            mm.get_named_dialect('Seattle')
+        self.assertEqual(stdout.getvalue(), '')
+        mm.set_miss_mode('logging')
+        with self.assertLogs('dialect_mapper', level='WARNING'):
+            mm.get_numeric_dialect('Seattle')
+        with self.assertRaises(Exception):
+            mm.set_miss_mode('loud')
+    def test_miss_collector(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.set_miss_mode('collect')
+        mm.get_named_dialect_many(['Seattle', 'Bergen', 'SEATTLE'])
+        mm.get_cardinal_four(' seattle')
+        mm.resolve('Tehran')
+        mm.get_named_dialect('Sande', resolve_ambigious='newest')
+        records = mm.misses.records
+        self.assertEqual([(record.kind, record.input, record.count) for record in records], [
+            ('not_found', 'Seattle', 3),
+            ('not_found', 'Tehran', 1),
+            ('unknown_resolve_ambigious', 'Sande', 1),
+        ])
+        self.assertEqual(records[0].context, {'method': 'get_named_dialect', 'resolve_ambigious': 'new'})
+        corrections = io.StringIO()
+        mm.misses.to_corrections_csv(corrections)
+        self.assertEqual(corrections.getvalue(), 'Seattle,\nTehran,\n')
+
+    def test_batch_misses_match_single_lookups(self):
+        places = ['Seattle', 'Bergen', 'Seattle', 'seattle ', 'Bergen', 'Tehran', 'Seattle']
+        batch = dialect_mapper.mapper_methods()
+        batch.set_miss_mode('collect')
+        batch.get_named_dialect_many(places)
+        batch.resolve_many(places)
+        single = dialect_mapper.mapper_methods()
+        single.set_miss_mode('collect')
+        for place in places:
+            single.get_named_dialect(place)
+            single.resolve(place)
+        self.assertEqual(batch.misses.records, single.misses.records)
+        self.assertEqual(batch.misses.records[0].count, 8)
+
+    def test_batch_answers_are_not_shared(self):
+        mm = dialect_mapper.mapper_methods()
+        numeric = mm.get_numeric_dialect_many(['Agder', 'agder', 'Agder'])
+        numeric[0].append('99')
+        self.assertEqual(numeric[1], numeric[2])
+        self.assertNotIn('99', numeric[1])
+        resolutions = mm.resolve_many(['Agder', 'Agder'])
+        resolutions[0].numeric_dialect.append('99')
+        self.assertNotIn('99', resolutions[1].numeric_dialect)
+        self.assertNotIn('99', mm.resolve('Agder').numeric_dialect)
+
     def test_nbtale_mapper_corrections(self):
         mm = dialect_mapper.mapper_methods()
         mm.enable_nbtale_corrections()
@@ -204,6 +498,15 @@ class DialectMapperTests(unittest.TestCase):
             None
         )
     
+    def test_nbtale_mapper_corrections_keep_herøy(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_nbtale_corrections(ignore_herøy=False)
+        named_dialect = mm.get_named_dialect('Herøy')
+        self.assertEqual(
+            named_dialect,
+            'Nordvestlandsk'
+        )
+    
     def test_nbtale_named_dialect_from_id_mod1(self):
         mm = dialect_mapper.mapper_methods()
         named_dialect = mm.get_nbtale_named_dialect_from_id('p1_g02_f2_4')
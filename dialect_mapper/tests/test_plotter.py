@@ -0,0 +1,241 @@
+import concurrent.futures
+import io
+import math
+import os
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+try:
+    from dialect_mapper import plotter
+    from dialect_mapper.plotter import plotter_methods, render_job
+    from dialect_mapper.geometry_cache import geometry_cache
+except ImportError:
+    plotter_methods = None
+
+def _scalar_latlon_to_xy(latitude, longitude, mapWidth, mapHeight):
+    # the original, one point at a time, projection
+    x = (longitude + 180) * (mapWidth / 360)
+    mercN = math.log(math.tan((math.pi / 4) + (latitude * math.pi / 180 / 2)))
+    return x, (mapHeight / 2) - (mapWidth * mercN / (2 * math.pi))
+
+class _in_process_executor:
+    # stands in for ProcessPoolExecutor, starting a single "worker" (and running its jobs) in this process, where it
+    # must not project a layer, build SVG templates, or read the geoJSON
+    # the files in the geometry cache directory the last worker was started with
+    cache_files = None
+
+    def __init__(self, max_workers, initializer, initargs):
+        _in_process_executor.cache_files = sorted(os.listdir(initargs[0]))
+        self.building = mock.Mock(side_effect=AssertionError('the worker built a layer'))
+        with self._no_building():
+            initializer(*initargs)
+
+    def _no_building(self):
+        return mock.patch.multiple(plotter_methods, _project_layer=self.building, _build_svg_templates=self.building)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        with self._no_building():
+            future.set_result(fn(*args))
+        return future
+
+@unittest.skipIf(plotter_methods is None, 'the plotting dependencies are not installed')
+class PlotterTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pm = plotter_methods()
+
+    def test_projection_matches_scalar(self):
+        features = self.pm.kommuner_json['features'][:20]
+        multipolygons = self.pm._create_multipolygons(
+            [feature['geometry']['coordinates'] for feature in features], 400.0, 300.0, [False] * len(features)
+        )
+        for feature, multipolygon in zip(features, multipolygons):
+            coordinates = feature['geometry']['coordinates']
+            self.assertEqual(len(multipolygon.geoms), len(coordinates))
+            for obj, polygon in zip(coordinates, multipolygon.geoms):
+                self.assertEqual(len(polygon.interiors), len(obj) - 1)
+                expected = [_scalar_latlon_to_xy(pair[1], pair[0], 400.0, 300.0) for pair in obj[0]]
+                np.testing.assert_allclose(np.asarray(polygon.exterior.coords), expected, rtol=1e-12)
+
+    def test_move_south(self):
+        obj = self.pm.region_json['features'][0]['geometry']['coordinates'][0]
+        moved = self.pm._create_poly(obj, 500.0, 500.0, move_south=True)
+        expected = [
+            _scalar_latlon_to_xy(
+                pair[1] - self.pm.latitude_southern_adjustment, pair[0] - self.pm.longitude_southern_adjustment, 500.0, 500.0
+            ) for pair in obj[0]
+        ]
+        np.testing.assert_allclose(np.asarray(moved.exterior.coords), expected, rtol=1e-12)
+        # only the flagged multipolygons are moved
+        coordinates = [feature['geometry']['coordinates'] for feature in self.pm.region_json['features'][:2]]
+        mixed = self.pm._create_multipolygons(coordinates, 500.0, 500.0, [True, False])
+        self.assertTrue(mixed[0].equals(self.pm._create_multipolygons(coordinates[:1], 500.0, 500.0, [True])[0]))
+        self.assertTrue(mixed[1].equals(self.pm._create_multipolygons(coordinates[1:], 500.0, 500.0, [False])[0]))
+
+    def test_projected_layers_are_cached(self):
+        pm = plotter_methods(geometry_cache())
+        first = pm.get_projected_layer('card5', 500, 500)
+        self.assertIs(pm.get_projected_layer('card5', '500', 500.0), first)
+        self.assertEqual((pm.geometry_cache.hits, pm.geometry_cache.misses), (1, 1))
+        # every option is part of the key
+        self.assertIsNot(pm.get_projected_layer('card5', 400, 500), first)
+        self.assertIsNot(pm.get_projected_layer('card5', 500, 500, rotate_norway=True), first)
+        self.assertEqual(len(pm.geometry_cache), 3)
+        self.assertEqual(len(first.region_names), len(pm.card5_dialekter_json['features']))
+        with self.assertRaises(Exception):
+            pm.get_projected_layer('not a layer', 500, 500)
+
+    def test_plots_reuse_cached_layer(self):
+        pm = plotter_methods(geometry_cache())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pm.plot_dialect_regions(os.path.join(tmp_dir, 'first.svg'), {'Sørvestlandsk': 10})
+            with mock.patch.object(pm, '_project_layer', side_effect=AssertionError('projected again')):
+                pm.plot_dialect_regions(os.path.join(tmp_dir, 'second.svg'), {'Sørvestlandsk': 20})
+
+    def test_geometry_cache_on_disk(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            built = plotter_methods(geometry_cache(tmp_dir)).get_projected_layer('rundkast', 300, 300, split_norway=True, rotate_norway=True)
+            self.assertEqual(len(os.listdir(tmp_dir)), 1)
+            pm = plotter_methods(geometry_cache(tmp_dir))
+            with mock.patch.object(pm, '_project_layer', side_effect=AssertionError('projected again')):
+                loaded = pm.get_projected_layer('rundkast', 300, 300, split_norway=True, rotate_norway=True)
+            self.assertEqual(loaded.region_names, built.region_names)
+            self.assertEqual(loaded.bounds, built.bounds)
+            self.assertTrue(all(a.equals_exact(b, 0) for a, b in zip(loaded.multipolygons, built.multipolygons)))
+            # moving the northern regions elsewhere changes what the layer is projected from
+            pm.latitude_southern_adjustment += 1
+            self.assertNotEqual(pm.get_projected_layer('rundkast', 300, 300, split_norway=True, rotate_norway=True).bounds, built.bounds)
+
+    def test_svg_templates_match_geometry_svg(self):
+        pm = plotter_methods(geometry_cache())
+        projected = pm.get_projected_layer('card4', 500, 500)
+        templates = pm.get_svg_templates('card4', 500, 500, stroke_width=0.5)
+        self.assertIs(pm.get_svg_templates('card4', 500, 500, stroke_width=0.5), templates)
+        for region_multiPolygon, template in zip(projected.multipolygons, templates):
+            self.assertEqual(
+                '#123456'.join(template),
+                pm.stroke_width_pat.sub('stroke-width="0.5"', region_multiPolygon.svg(fill_color='#123456', opacity=1))
+            )
+
+    def test_recoloring_does_not_serialize_geometry(self):
+        pm = plotter_methods(geometry_cache())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pm.plot_card4_dialect_regions(os.path.join(tmp_dir, 'first.svg'), {'north': 10})
+            with mock.patch('shapely.MultiPolygon.svg', side_effect=AssertionError('serialized again')):
+                pm.plot_card4_dialect_regions(os.path.join(tmp_dir, 'second.svg'), {'north': 20, 'west': None})
+            with open(os.path.join(tmp_dir, 'second.svg')) as open_f:
+                svg = open_f.read()
+        # west has no color so (every polygon of) it is white
+        projected = pm.get_projected_layer('card4', 500, 500)
+        west = pm.get_svg_templates('card4', 500, 500)[projected.region_names.index('west')]
+        self.assertEqual(svg.count('fill="#ffffff"'), len(west) - 1)
+        self.assertIn('#ffffff'.join(west), svg)
+        self.assertEqual(svg.count('<g>'), len(pm.card4_dialekter_json['features']))
+
+    def test_render_svg_in_memory(self):
+        pm = plotter_methods()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'map.svg')
+            pm.plot_rundkast_regions(path, {'north': 3}, split_norway=True)
+            with open(path, 'rb') as open_f:
+                saved = open_f.read()
+            rendered = pm.render_rundkast_regions({'north': 3}, split_norway=True)
+            self.assertEqual(rendered, saved)
+            buffer = io.BytesIO()
+            self.assertIsNone(pm.render_rundkast_regions({'north': 3}, split_norway=True, write_to=buffer))
+            self.assertEqual(buffer.getvalue(), saved)
+            self.assertEqual(os.listdir(tmp_dir), ['map.svg'])
+        with self.assertRaises(Exception):
+            pm.render_dialect_regions(output_format='gif')
+
+    def test_render_png_without_temp_files(self):
+        # stands in for cairosvg, which needs the system cairo library
+        fake_cairosvg = types.ModuleType('cairosvg')
+        fake_cairosvg.svg2png = mock.Mock(return_value=b'png bytes')
+        fake_cairosvg.svg2pdf = mock.Mock(return_value=b'pdf bytes')
+        pm = plotter_methods()
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(sys.modules, {'cairosvg': fake_cairosvg}):
+            self.assertEqual(pm.render_card5_dialect_regions({'south': 5}, output_format='png'), b'png bytes')
+            _, kwargs = fake_cairosvg.svg2png.call_args
+            self.assertEqual(kwargs['bytestring'], pm.render_card5_dialect_regions({'south': 5}))
+            self.assertIsNone(kwargs['write_to'])
+            path = os.path.join(tmp_dir, 'map.pdf')
+            pm.plot_card5_dialect_regions(path, {'south': 5})
+            self.assertEqual(fake_cairosvg.svg2pdf.call_args[1]['write_to'], path)
+            # no intermediate SVG file
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_render_batch(self):
+        pm = plotter_methods(geometry_cache())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            buffer = io.BytesIO()
+            jobs = [
+                render_job('card4', {'north': 10}, None, None),
+                render_job('kommuner', {'Bergen': 5}, os.path.join(tmp_dir, 'kommuner.svg'), {'color_map_name': 'Reds'}),
+                ('rundkast', {'north': 3}, buffer, {'split_norway': True, 'rotate_norway': True, 'final_width': 300}),
+                render_job('card5', {}, None, {'output_format': 'svg'}),
+            ]
+            expected = [
+                pm.render_card4_dialect_regions({'north': 10}),
+                pm.render_kommune_regions({'Bergen': 5}, color_map_name='Reds'),
+                pm.render_rundkast_regions({'north': 3}, split_norway=True, rotate_norway=True, final_width=300),
+                pm.render_card5_dialect_regions({}),
+            ]
+            for workers in (1, 2):
+                buffer.seek(0)
+                buffer.truncate()
+                done = []
+                results = pm.render_batch(jobs, workers=workers, max_pending=1, progress=lambda done_maps, total: done.append((done_maps, total)))
+                self.assertEqual(results, [expected[0], None, None, expected[3]])
+                with open(os.path.join(tmp_dir, 'kommuner.svg'), 'rb') as open_f:
+                    self.assertEqual(open_f.read(), expected[1])
+                self.assertEqual(buffer.getvalue(), expected[2])
+                self.assertEqual(done, [(1, 4), (2, 4), (3, 4), (4, 4)])
+        with self.assertRaises(Exception):
+            pm.render_batch([('not a layer', {}, None, None)])
+
+    def test_render_batch_workers_reuse_parent_layers(self):
+        pm = plotter_methods(geometry_cache())
+        self.addCleanup(setattr, plotter, '_worker_plotter', None)
+        jobs = [
+            render_job('kommuner', {'Bergen': 5}, None, {'final_width': 400}),
+            render_job('rundkast', {'north': 3}, None, {'split_norway': True, 'stroke_width': 0.5}),
+            render_job('dialekter', {}, None, None),
+        ]
+        expected = [
+            pm.render_kommune_regions({'Bergen': 5}, final_width=400),
+            pm.render_rundkast_regions({'north': 3}, split_norway=True, stroke_width=0.5),
+            pm.render_dialect_regions({}),
+        ]
+        pm.geometry_cache.clear()
+        # the parent only projects the layers and builds their templates, it doesn't render whole maps to do so
+        with mock.patch.object(plotter.concurrent.futures, 'ProcessPoolExecutor', _in_process_executor), \
+                mock.patch.object(pm, '_render_output', side_effect=AssertionError('rendered a map to warm the cache')):
+            self.assertEqual(pm.render_batch(jobs, workers=2), expected)
+        self.assertFalse(set(plotter._geojson_files) & set(vars(plotter._worker_plotter)))
+
+    def test_render_batch_saves_only_its_layers(self):
+        pm = plotter_methods(geometry_cache())
+        self.addCleanup(setattr, plotter, '_worker_plotter', None)
+        # already in the cache but not needed by the batch
+        pm.get_projected_layer('card5', 500, 500)
+        pm.get_projected_layer('dialekter', 300, 300)
+        with mock.patch.object(plotter.concurrent.futures, 'ProcessPoolExecutor', _in_process_executor):
+            pm.render_batch([render_job('kommuner', {}, None, None), render_job('card4', {}, None, {'final_width': 400})], workers=2)
+        self.assertEqual(_in_process_executor.cache_files, ['card4_500x400.pickle', 'kommuner_500x500.pickle'])
+
+if __name__ == "__main__":
+    unittest.main()
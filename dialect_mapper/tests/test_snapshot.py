@@ -0,0 +1,57 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from dialect_mapper import snapshot, speakers, tables
+
+class SnapshotTests(unittest.TestCase):
+
+    def test_shipped_snapshot_is_up_to_date(self):
+        # if this fails rebuild it with `python -m dialect_mapper.snapshot`
+        self.assertIsNotNone(snapshot.load_snapshot())
+
+    def test_snapshot_matches_csv(self):
+        from_snapshot = snapshot.load_snapshot()
+        from_csv = tables.mapping_table.from_csv()
+        self.assertEqual(from_snapshot['mapping_table'].csv_tuples, from_csv.csv_tuples)
+        self.assertEqual(from_snapshot['mapping_table'].lookup_indexes, from_csv.lookup_indexes)
+        self.assertEqual(from_snapshot['mapping_table'].place_codes, from_csv.place_codes)
+        for correction_set in tables.correction_files:
+            self.assertEqual(from_snapshot['corrections'][correction_set], dict(tables.load_corrections(correction_set)))
+        self.assertEqual(from_snapshot['speaker_tables']['nbtale'].rows, speakers.parse_speaker_files(speakers.speaker_corpora['nbtale']).rows)
+
+    def test_snapshot_does_not_pickle_numpy(self):
+        # numpy arrays pickled under NumPy 2 can't be read by NumPy 1 (see columnar.array_state)
+        shipped = snapshot.pkg_resources.read_binary(snapshot.mapping_data, snapshot.snapshot_file)
+        self.assertNotIn(b'numpy', shipped)
+        table = pickle.loads(shipped)['mapping_table']
+        self.assertFalse(table.table.codes['new_muni'].flags.writeable)
+        self.assertEqual(table.code_maps[('new_muni', 'named_dialect')].dtype, tables.np.int32)
+
+    def test_stale_snapshot_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = snapshot.build_snapshot(os.path.join(tmp_dir, 'snapshot.pickle'))
+            with open(path, 'rb') as open_f:
+                stale = pickle.load(open_f)
+            stale['sources'][tables.mapping_file] = 'not the digest'
+            with mock.patch.object(snapshot.pkg_resources, 'read_binary', side_effect=self._read_binary(pickle.dumps(stale))):
+                with self.assertWarns(UserWarning):
+                    self.assertIsNone(snapshot.load_snapshot())
+
+    def test_old_format_is_ignored(self):
+        old = {'format': snapshot.SNAPSHOT_FORMAT - 1}
+        with mock.patch.object(snapshot.pkg_resources, 'read_binary', side_effect=self._read_binary(pickle.dumps(old))):
+            self.assertIsNone(snapshot.load_snapshot())
+
+    def _read_binary(self, snapshot_bytes):
+        read_binary = snapshot.pkg_resources.read_binary
+        def fake_read_binary(package, file_name):
+            if file_name == snapshot.snapshot_file:
+                return snapshot_bytes
+            return read_binary(package, file_name)
+        return fake_read_binary
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import csv
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import dialect_mapper
+from dialect_mapper import speakers, tables
+
+class SpeakerRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.speaker_file = os.path.join(self.tmp_dir.name, 'speakers.csv')
+        self.index_path = os.path.join(self.tmp_dir.name, 'speakers.pickle')
+        # the ID column doesn't have to come first
+        self._write_speakers([['Sex', 'Birthplace', 'Speaker ID'], ['f', 'Bergen', 's1'], ['m', 'Arendal', 's2']])
+
+    def tearDown(self):
+        for name in ['test_corpus', 'test_corpus_indexed']:
+            speakers.speaker_corpora.pop(name, None)
+            tables._shared_data.pop('speakers_' + name, None)
+        self.tmp_dir.cleanup()
+
+    def _write_speakers(self, rows):
+        with open(self.speaker_file, 'w', newline='', encoding='utf-8') as open_f:
+            csv.writer(open_f).writerows(rows)
+
+    def test_nbtale_speakers_match_mapper(self):
+        mm = dialect_mapper.mapper_methods()
+        speaker_ids = list(tables.get_nbtale_speakers())[:50] + ['not a speaker']
+        self.assertEqual(
+            mm.get_nbtale_named_dialects_from_ids(speaker_ids),
+            [mm.get_nbtale_named_dialect_from_id(speaker_id) for speaker_id in speaker_ids],
+        )
+        self.assertEqual(mm.get_nbtale_named_dialects_from_ids(['not a speaker']), [''])
+
+    def test_columns_by_name(self):
+        speakers.register_speaker_corpus('test_corpus', [self.speaker_file], 'Speaker ID', {'birthplace': 'Birthplace', 'sex': 'Sex'})
+        table = speakers.get_speaker_table('test_corpus')
+        self.assertEqual(len(table), 2)
+        self.assertIn('s1', table)
+        self.assertEqual(table.get('s2', 'birthplace'), 'Arendal')
+        self.assertEqual(speakers.lookup('test_corpus', ['s2', 's3', 's1'], 'sex', default='?'), ['m', '?', 'f'])
+        self.assertEqual(dict(table.column('birthplace')), {'s1': 'Bergen', 's2': 'Arendal'})
+        with self.assertRaises(Exception):
+            table.get('s1', 'age')
+
+    def test_missing_column(self):
+        speakers.register_speaker_corpus('test_corpus', [self.speaker_file], 'Speaker ID', ['Age'])
+        with self.assertRaises(Exception):
+            speakers.get_speaker_table('test_corpus')
+
+    def test_unknown_and_duplicate_corpus(self):
+        with self.assertRaises(Exception):
+            speakers.get_speaker_table('not a corpus')
+        with self.assertRaises(Exception):
+            speakers.register_speaker_corpus('nbtale', [self.speaker_file], 'Speaker ID', ['Sex'])
+
+    def test_index_is_built_once(self):
+        speakers.register_speaker_corpus('test_corpus_indexed', [self.speaker_file], 'Speaker ID', ['Birthplace'], index_path=self.index_path)
+        corpus = speakers.speaker_corpora['test_corpus_indexed']
+        self.assertEqual(speakers._load_speaker_table('test_corpus_indexed').get('s1', 'Birthplace'), 'Bergen')
+        self.assertTrue(os.path.exists(self.index_path))
+        with mock.patch.object(speakers, 'parse_speaker_files', side_effect=AssertionError('parsed again')):
+            self.assertEqual(speakers._load_speaker_table('test_corpus_indexed').get('s2', 'Birthplace'), 'Arendal')
+        # editing the file invalidates the index
+        self._write_speakers([['Speaker ID', 'Birthplace'], ['s1', 'Tromsø', 'extra'], ['s3', 'Bodø']])
+        os.utime(self.speaker_file, ns=(0, os.stat(self.index_path).st_mtime_ns + 1))
+        self.assertIsNone(speakers._load_speaker_index(corpus))
+        table = speakers._load_speaker_table('test_corpus_indexed')
+        self.assertEqual(table.lookup(['s1', 's2', 's3'], 'Birthplace'), ['Tromsø', None, 'Bodø'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import concurrent.futures
+import multiprocessing
+import unittest
+from unittest import mock
+
+import dialect_mapper
+from dialect_mapper import tables
+from dialect_mapper.normalize import canonical_key
+
+def _resolve_in_worker(places):
+    # runs in a (spawned) worker that attached to the shared table in its initializer
+    mapper = dialect_mapper.mapper_methods()
+    return (
+        isinstance(tables.get_mapping_table().table.codes['new_muni'], tables.np.memmap),
+        [mapper.get_named_dialect(place) for place in places],
+        mapper.get_dialect_codes(mapper.encode_places(places)).tolist(),
+    )
+
+class SharedMappingTableTests(unittest.TestCase):
+
+    places = ['Bergen', 'oslo', 'Nordland', 'not a place']
+
+    def setUp(self):
+        self.handle = tables.share_mapping_table()
+        self.addCleanup(tables.release_shared_mapping_table, self.handle)
+
+    def test_attached_table_matches_loaded_table(self):
+        loaded = tables.get_mapping_table()
+        self.addCleanup(tables._shared_data.__setitem__, 'mapping_table', loaded)
+        attached = tables.attach_mapping_table(self.handle)
+        self.assertIs(tables.get_mapping_table(), attached)
+        self.assertEqual(attached.csv_tuples, loaded.csv_tuples)
+        self.assertEqual(attached.lookup_indexes, loaded.lookup_indexes)
+        self.assertEqual(attached.reverse_indexes, loaded.reverse_indexes)
+        self.assertEqual(attached.key_aliases, loaded.key_aliases)
+        self.assertEqual(attached.place_codes, loaded.place_codes)
+        for key, code_map in loaded.code_maps.items():
+            self.assertEqual(attached.code_maps[key].tolist(), code_map.tolist())
+            self.assertFalse(attached.code_maps[key].flags.writeable)
+
+    def test_attach_reads_indexes_in_place(self):
+        loaded = tables.get_mapping_table()
+        self.addCleanup(tables._shared_data.__setitem__, 'mapping_table', loaded)
+        mapper = dialect_mapper.mapper_methods()
+        expected = [mapper.get_named_dialect(place) for place in self.places] + [mapper.get_numeric_dialect('Agder'), mapper.get_new_municipalities_from_numeric_dialect(1), mapper.get_old_counties_from_named_dialect('Vestlandsk')]
+        building = mock.Mock(side_effect=Exception('attach_mapping_table rebuilt an index'))
+        with mock.patch.multiple(
+            tables.mapping_table, _build_lookup_indexes=building, _build_reverse_indexes=building,
+            _build_place_codes=building, _build_code_maps=building
+        ), mock.patch.object(tables, 'canonical_key', building):
+            attached = tables.attach_mapping_table(self.handle)
+        building.assert_not_called()
+        for name in tables.index_names:
+            indexes = getattr(attached, name)
+            for index in ([indexes] if name == 'key_aliases' else indexes.values()):
+                self.assertIsInstance(index, tables.packed_index)
+                self.assertTrue(all(isinstance(array, tables.np.memmap) for array in index.arrays.values() if len(array)))
+        actual = [mapper.get_named_dialect(place) for place in self.places] + [mapper.get_numeric_dialect('Agder'), mapper.get_new_municipalities_from_numeric_dialect(1), mapper.get_old_counties_from_named_dialect('Vestlandsk')]
+        self.assertEqual(actual, expected)
+
+    def test_packed_index(self):
+        index = tables.packed_index.pack({'bergen': ('Vestlandsk',), 'ås': ('Østlandsk', 'Vestlandsk'), '': ()})
+        self.assertEqual(index['ås'], ('Østlandsk', 'Vestlandsk'))
+        self.assertEqual(index.get(''), ())
+        self.assertNotIn('oslo', index)
+        self.assertNotIn(1, index)
+        self.assertEqual(list(index), ['bergen', 'ås', ''])
+        with self.assertRaises(KeyError):
+            index['oslo']
+        by_number = tables.packed_index.pack({1: 'a', 12: 'b'})
+        self.assertEqual((by_number[12], by_number.get(2), by_number.get('1'), True in by_number), ('b', None, None, False))
+        self.assertEqual(dict(tables.packed_index.pack({'a': 3})), {'a': 3})
+
+    def test_workers_attach_to_shared_table(self):
+        mapper = dialect_mapper.mapper_methods()
+        expected = (
+            True,
+            [mapper.get_named_dialect(place) for place in self.places],
+            mapper.get_dialect_codes(mapper.encode_places(self.places)).tolist(),
+        )
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context('spawn'),
+            initializer=tables.attach_mapping_table, initargs=(self.handle,)
+        ) as executor:
+            self.assertEqual(executor.submit(_resolve_in_worker, self.places).result(), expected)
+
+class CorrectionRegistryTests(unittest.TestCase):
+
+    def _register(self, name, corrections, **kwargs):
+        # registered sets are process wide, so take them out again after the test
+        tables.register_corrections(name, corrections, **kwargs)
+        self.addCleanup(tables.unregister_corrections, name)
+
+    def test_registered_corrections(self):
+        self._register('test_registered', {' Seattle ': 'BERGEN'})
+        mm = dialect_mapper.mapper_methods()
+        self.assertEqual(mm.get_named_dialect('Seattle'), None)
+        mm.enable_corrections('test_registered')
+        self.assertEqual(mm.get_named_dialect('Seattle'), 'Sørvestlandsk')
+        mm.disable_corrections('test_registered')
+        self.assertEqual(mm.get_named_dialect('Seattle'), None)
+
+    def test_corrections_are_applied_in_priority_order(self):
+        self._register('test_second', {'tacoma': 'vestfossen'}, priority=1000)
+        self._register('test_first', {'seattle': 'tacoma'}, priority=999)
+        mm = dialect_mapper.mapper_methods()
+        # vestfossen is only corrected by npsc, which comes before both
+        mm.enable_corrections('test_second', 'npsc', 'test_first')
+        self.assertEqual(mm.active_corrections, ('npsc', 'test_first', 'test_second'))
+        self.assertEqual(mm._get_corrections('seattle'), 'vestfossen')
+        self.assertEqual(mm._get_corrections('vestfossen'), canonical_key(mm.npsc_corrections['vestfossen']))
+
+    def test_composed_corrections_match_chained_corrections(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_nbtale_corrections()
+        mm.enable_npsc_corrections()
+        mm.enable_stortinget_corrections()
+        mm.enable_ndc_corrections()
+        correction_tables = [mm.nbtale_corrections, mm.npsc_corrections, mm.stortinget_corrections, mm.ndc_corrections]
+        # the composed table is keyed on canonical keys (see normalize.py)
+        correction_tables = [{canonical_key(k): canonical_key(v) for k, v in table.items()} for table in correction_tables]
+        for wrong in set().union(*correction_tables):
+            right = wrong
+            for correction_table in correction_tables:
+                if right in correction_table:
+                    right = correction_table[right]
+            self.assertEqual(mm._get_corrections(wrong), right)
+
+    def test_old_flags_still_work(self):
+        mm = dialect_mapper.mapper_methods()
+        mm.use_npsc_corrections = True
+        self.assertEqual(mm.active_corrections, ('npsc',))
+        self.assertEqual(mm.get_named_dialect('Vestfossen'), 'Østlandsk')
+        mm.use_npsc_corrections = False
+        self.assertEqual(mm.get_named_dialect('Vestfossen'), None)
+
+    def test_unknown_and_duplicate_correction_sets(self):
+        mm = dialect_mapper.mapper_methods()
+        with self.assertRaises(Exception):
+            mm.enable_corrections('not_a_correction_set')
+        with self.assertRaises(Exception):
+            tables.register_corrections('npsc', {})
+        with self.assertRaises(Exception):
+            tables.unregister_corrections('npsc')
+
+    def test_unregister_corrections(self):
+        tables.register_corrections('test_unregistered', {'seattle': 'bergen'})
+        mm = dialect_mapper.mapper_methods()
+        mm.enable_corrections('test_unregistered')
+        self.assertEqual(mm.get_named_dialect('Seattle'), 'Sørvestlandsk')
+        tables.unregister_corrections('test_unregistered')
+        self.assertNotIn('test_unregistered', tables.correction_priorities)
+        self.assertFalse([key for key in tables._shared_data if 'test_unregistered' in str(key)])
+        with self.assertRaises(Exception):
+            dialect_mapper.mapper_methods().enable_corrections('test_unregistered')
+        # the name can be used again
+        tables.register_corrections('test_unregistered', {'seattle': 'arendal'})
+        tables.unregister_corrections('test_unregistered')
+
+    def test_unregister_corrections_with_any_name(self):
+        # e.g. the file paths the CLI registers --corrections-file sets under
+        for name in ['a|b', 'a_b', 'nbtale_']:
+            tables.register_corrections(name, {'seattle': 'bergen'})
+            mm = dialect_mapper.mapper_methods()
+            mm.enable_corrections(name)
+            self.assertEqual(mm.get_named_dialect('Seattle'), 'Sørvestlandsk')
+            tables.unregister_corrections(name)
+            self.assertFalse([key for key in tables._shared_data if isinstance(key, tuple) and name in key[1]])
+            tables.register_corrections(name, {'seattle': 'arendal'})
+            self.addCleanup(tables.unregister_corrections, name)
+            mm = dialect_mapper.mapper_methods()
+            mm.enable_corrections(name)
+            self.assertEqual(mm.get_named_dialect('Seattle'), mm.get_named_dialect('Arendal'))
+
+if __name__ == "__main__":
+    unittest.main()